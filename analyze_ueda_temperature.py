@@ -29,6 +29,12 @@ except ImportError as e:
     print("Please install dependencies: uv sync", file=sys.stderr)
     sys.exit(1)
 
+# JAXA_EARTH_MODE=record/replayの場合は、MCPサーバーと同じ記録・再生用のHTTPセッションを使用
+if os.environ.get("JAXA_EARTH_MODE", "live").lower() != "live":
+    sys.path.insert(0, str(Path(__file__).parent))
+    import mcp_server
+    mcp_server._install_jaxa_session()
+
 # 位置情報（環境変数または設定ファイルから読み込み）
 def get_coordinates() -> tuple[float, float, float, float]:
     """座標を環境変数または設定ファイルから取得"""
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+複数地域の地形データをまとめてエクスポートするスクリプト
+MCPサーバーのexport_batchツールと同じ処理をコマンドラインから実行します
+
+使い方:
+    python batch_export.py --collection JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global \\
+        --bbox 138.6 35.3 138.8 35.4 --bbox 138.8 35.3 139.0 35.4 --target unity
+    python batch_export.py --collection JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global \\
+        --geojson regions.geojson --keywords Tokyo --target vrchat --workers 4
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import mcp_server
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="JAXA Earth 地形データのバッチエクスポート")
+    parser.add_argument("--collection", required=True, help="コレクション名")
+    parser.add_argument(
+        "--bbox", type=float, nargs=4, action="append", default=[],
+        metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"),
+        help="バウンディングボックス（複数指定可）"
+    )
+    parser.add_argument("--geojson", help="地域を定義するGeoJSON（FeatureCollection）ファイル")
+    parser.add_argument("--keywords", nargs="*", default=None, help="GeoJSONのフィーチャーを絞り込むキーワード")
+    parser.add_argument("--target", choices=mcp_server._BATCH_TARGETS, default="vrchat", help="出力形式")
+    parser.add_argument("--resolution", type=float, default=20.0, help="解像度")
+    parser.add_argument("--date-range", nargs=2, default=None, metavar=("START", "END"), help="日付範囲")
+    parser.add_argument("--output-dir", default=None, help="出力ディレクトリ（デフォルト: temp/batch_export）")
+    parser.add_argument("--workers", type=int, default=None, help="並列プロセス数")
+    parser.add_argument(
+        "--no-shared-height-range", action="store_true",
+        help="地域ごとの最小値・最大値で正規化する（デフォルトは全地域共通の高さ範囲）"
+    )
+    parser.add_argument("--options", default=None, help='各エクスポートツールへの追加引数（JSON、例: \'{"max_polygons": 50000}\'）')
+    args = parser.parse_args()
+
+    regions = mcp_server._batch_regions(args.bbox, args.geojson, args.keywords)
+    if not regions:
+        parser.error("--bboxまたは--geojsonで地域を指定してください")
+
+    manifest = mcp_server._run_batch_export(
+        args.collection,
+        regions,
+        args.target,
+        args.resolution,
+        args.date_range,
+        args.output_dir or str(mcp_server.TEMP_DIR / "batch_export"),
+        args.workers,
+        json.loads(args.options) if args.options else None,
+        not args.no_shared_height_range
+    )
+    print(json.dumps(
+        {"manifest_path": manifest["manifest_path"], "summary": manifest["summary"]},
+        indent=2,
+        ensure_ascii=False
+    ))
+    return 0 if manifest["summary"]["failed"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
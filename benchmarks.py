@@ -0,0 +1,772 @@
+#!/usr/bin/env python3
+"""
+MCPサーバーのベンチマークスクリプト
+ネットワークに接続せず、合成した標高データと模擬的な取得遅延で各処理の性能を計測します
+
+使い方:
+    python benchmarks.py concurrency --calls 8 --latency 0.5
+    python benchmarks.py coalescing --calls 8 --latency 0.5
+    python benchmarks.py startup --budget 2.0
+    python benchmarks.py mesh --size 4097 --polygons 100000
+    python benchmarks.py glb --size 1000 --budget 1.0
+    python benchmarks.py normals --size 4096
+    python benchmarks.py resample --size 4096 --texture-size 2048
+    python benchmarks.py voidfill --size 4096 --void-fraction 0.1
+    python benchmarks.py replay --record   # 初回のみネットワークに接続して応答を記録
+    python benchmarks.py replay --runs 3   # 記録した応答だけで実際の取得処理を計測
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from pathlib import Path
+from typing import Any, Dict, List
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+import numpy as np
+from scipy import ndimage
+
+import mcp_server
+
+
+def synthetic_terrain(bbox: List[float], ppu: float) -> np.ndarray:
+    """富士山のような単峰と起伏を重ねた合成標高データ（float32, 北が上）"""
+    rows = max(1, int(round((bbox[3] - bbox[1]) * ppu)))
+    cols = max(1, int(round((bbox[2] - bbox[0]) * ppu)))
+    lat = bbox[3] - (np.arange(rows, dtype=np.float64) + 0.5) / ppu
+    lon = bbox[0] + (np.arange(cols, dtype=np.float64) + 0.5) / ppu
+    lon_grid, lat_grid = np.meshgrid(lon, lat)
+    center_lon = (bbox[0] + bbox[2]) / 2
+    center_lat = (bbox[1] + bbox[3]) / 2
+    peak = 3776.0 * np.exp(-((lon_grid - center_lon) ** 2 + (lat_grid - center_lat) ** 2) / 0.01)
+    ridges = 150.0 * np.sin(lon_grid * 40.0) * np.cos(lat_grid * 30.0)
+    return (peak + ridges + 200.0).astype(np.float32)
+
+
+def install_synthetic_fetch(latency: float = 0.0, target: str = "_fetch_images") -> List[tuple]:
+    """
+    mcp_server.<target>（_fetch_imagesまたは_fetch_images_uncached）を、
+    遅延latency秒の合成データ取得に置き換える
+
+    Returns:
+        各取得の(開始時刻, 終了時刻)が追記されるリスト
+    """
+    spans: List[tuple] = []
+
+    def fetch(collection, band=None, dlim=None, ppu=None, bbox=None, geoj=None, use_cache=True):
+        start = time.perf_counter()
+        time.sleep(latency)
+        spans.append((start, time.perf_counter()))
+        ppu = ppu or 100.0
+        bbox = bbox or [138.5, 35.2, 139.0, 35.5]
+        raster = types.SimpleNamespace(
+            # raster.imgの形状は[日付, 緯度, 経度, チャンネル]
+            img=synthetic_terrain(bbox, ppu)[np.newaxis, :, :, np.newaxis],
+            latlim=[[bbox[1], bbox[3]]],
+            lonlim=[[bbox[0], bbox[2]]]
+        )
+        # je.ImageProcessが参照する属性を揃える
+        return types.SimpleNamespace(
+            raster=raster,
+            cinfo=None,
+            proj_params=None,
+            _settings=None,
+            stac_collection=types.SimpleNamespace(query=collection),
+            stac_band=types.SimpleNamespace(query=band),
+            stac_date=types.SimpleNamespace(id=list(dlim or []))
+        )
+
+    setattr(mcp_server, target, fetch)
+    return spans
+
+
+def install_synthetic_collection(latency: float = 0.0) -> List[tuple]:
+    """
+    mcp_server._image_collectionを合成データのje.ImageCollectionに置き換える
+
+    get_images()は実際の取得結果と同じく、共有HTTPセッションを保持するje.ImageCollectionを返します。
+    _fetch_images_uncached以降（結果の変換・ディスクキャッシュへの保存）は実際の処理を通ります。
+
+    Returns:
+        各取得の(開始時刻, 終了時刻)が追記されるリスト
+    """
+    from jaxa.earth import je
+    from jaxa.earth.image.collection.stac.select import Stac
+
+    spans: List[tuple] = []
+    session = mcp_server._http_session()
+
+    class SyntheticCollection:
+        def __init__(self, collection):
+            self.query = {"collection": collection}
+
+        def filter_date(self, dlim=None):
+            self.query["dlim"] = dlim
+            return self
+
+        def filter_resolution(self, ppu=None):
+            self.query["ppu"] = ppu
+            return self
+
+        def filter_bounds(self, bbox=None, geoj=None):
+            self.query["bbox"] = bbox
+            return self
+
+        def select(self, band=None):
+            self.query["band"] = band
+            return self
+
+        def get_images(self):
+            start = time.perf_counter()
+            time.sleep(latency)
+            spans.append((start, time.perf_counter()))
+            ppu = self.query.get("ppu") or 100.0
+            bbox = self.query.get("bbox") or [138.5, 35.2, 139.0, 35.5]
+            images = object.__new__(je.ImageCollection)
+            images._session = session
+            images._settings = None
+            images.stac_collection = Stac(session).set_query(self.query["collection"])
+            images.stac_band = Stac(session).set_query(self.query.get("band"))
+            images.stac_date = Stac(session)
+            images.stac_date.id = list(self.query.get("dlim") or [])
+            images.cinfo = None
+            images.proj_params = None
+            images.raster = types.SimpleNamespace(
+                img=synthetic_terrain(bbox, ppu)[np.newaxis, :, :, np.newaxis],
+                latlim=[[bbox[1], bbox[3]]],
+                lonlim=[[bbox[0], bbox[2]]]
+            )
+            return images
+
+    mcp_server._image_collection = SyntheticCollection
+    return spans
+
+
+# ============================================================================
+# 並行実行
+# ============================================================================
+
+def bench_concurrency(calls: int, latency: float) -> Dict[str, Any]:
+    """
+    calc_spatial_statsをcalls件同時に呼び出し、取得処理の実行区間の重なりを計測します。
+
+    イベントループがブロックされていれば取得は直列に実行され（overlap ≒ 1.0）、
+    スレッドプールへ退避できていれば最大JAXA_MCP_WORKERS件が同時に実行されます。
+    呼び出し中にイベントループが応答できるかも、ハートビートの遅れで計測します。
+    """
+    fetch_spans = install_synthetic_fetch(latency)
+    heartbeat_interval = 0.01
+
+    async def one_call(i: int) -> None:
+        bbox = [138.0 + i * 0.1, 35.0, 138.1 + i * 0.1, 35.1]
+        result = await mcp_server.calc_spatial_stats("synthetic", bounds=bbox)
+        if isinstance(result, dict) and "error" in result:
+            raise RuntimeError(result["error"])
+
+    async def heartbeat(done: asyncio.Event) -> float:
+        max_lag = 0.0
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(heartbeat_interval)
+            max_lag = max(max_lag, time.perf_counter() - start - heartbeat_interval)
+        return max_lag
+
+    async def run() -> float:
+        done = asyncio.Event()
+        monitor = asyncio.create_task(heartbeat(done))
+        await asyncio.gather(*(one_call(i) for i in range(calls)))
+        done.set()
+        return await monitor
+
+    wall_start = time.perf_counter()
+    max_lag = asyncio.run(run())
+    wall = time.perf_counter() - wall_start
+
+    # 同時に実行されていた取得の最大数
+    events = sorted([(start, 1) for start, _ in fetch_spans] + [(end, -1) for _, end in fetch_spans])
+    running = peak = 0
+    for _, delta in events:
+        running += delta
+        peak = max(peak, running)
+
+    workers = mcp_server.MCP_EXECUTOR_WORKERS
+    busy = sum(end - start for start, end in fetch_spans)
+    return {
+        "calls": calls,
+        "latency": latency,
+        "workers": workers,
+        "wall_seconds": wall,
+        "serial_seconds": calls * latency,
+        "expected_seconds": -(-calls // workers) * latency,
+        # 1.0なら完全に直列、workersに近いほど並行に処理されている
+        "overlap": busy / wall if wall > 0 else 0.0,
+        "peak_concurrent_fetches": peak,
+        "loop_max_lag_seconds": max_lag,
+        "passed": peak == min(calls, workers) and max_lag < latency / 2
+    }
+
+
+# ============================================================================
+# 同一リクエストの集約
+# ============================================================================
+
+def bench_coalescing(calls: int, latency: float) -> Dict[str, Any]:
+    """
+    同じ条件のcalc_spatial_statsをcalls件同時に呼び出し、実際の取得が1回にまとめられるかを計測します。
+    """
+    # 前回の実行結果がディスクキャッシュに残らないよう、一時ディレクトリのキャッシュを使用
+    cache_dir = tempfile.mkdtemp(prefix="jaxa_bench_cache_")
+    mcp_server._RASTER_CACHE = mcp_server._RasterCache(Path(cache_dir), mcp_server.RASTER_CACHE_MAX_BYTES)
+    mcp_server._FETCH_SINGLE_FLIGHT = mcp_server._SingleFlight()
+    fetch_spans = install_synthetic_collection(latency)
+    bbox = [138.6, 35.3, 138.8, 35.4]
+
+    async def run() -> List[Any]:
+        return await asyncio.gather(*(
+            mcp_server.calc_spatial_stats("synthetic", bounds=bbox) for _ in range(calls)
+        ))
+
+    wall_start = time.perf_counter()
+    results = asyncio.run(run())
+    wall = time.perf_counter() - wall_start
+
+    errors = [r["error"] for r in results if isinstance(r, dict) and "error" in r]
+    single_flight = mcp_server._FETCH_SINGLE_FLIGHT.stats()
+    workers = mcp_server.MCP_EXECUTOR_WORKERS
+    # 取得結果（HTTPセッションを保持するje.ImageCollection）がディスクキャッシュに保存されたか
+    cached_entries = len(list(Path(cache_dir).glob("*.pkl")))
+    return {
+        "calls": calls,
+        "latency": latency,
+        "wall_seconds": wall,
+        "upstream_fetches": len(fetch_spans),
+        "single_flight": single_flight,
+        "cached_entries": cached_entries,
+        "errors": errors,
+        # 同時に実行された呼び出し（最大workers件）は1回の取得にまとめられ、残りはキャッシュから返る
+        "passed": (
+            not errors and len(fetch_spans) == 1 and cached_entries == 1
+            and single_flight["deduplicated"] >= min(calls, workers) - 1
+        )
+    }
+
+
+# ============================================================================
+# 起動時間
+# ============================================================================
+
+# 起動時にimportされてはならない重いライブラリ
+HEAVY_MODULES = ("numpy", "jaxa.earth", "rasterio", "PIL.Image", "scipy.sparse")
+
+_STARTUP_SNIPPET = """
+import sys
+sys.path.insert(0, {root!r})
+import mcp_server
+mcp_server.mcp.run = lambda *args, **kwargs: None
+mcp_server.main()
+print("HEAVY_MODULES=" + ",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def bench_startup(budget: float, runs: int) -> Dict[str, Any]:
+    """
+    新しいPythonプロセスでmcp_serverを読み込み、mcp.run()に到達するまでの時間を計測します。
+
+    python -X importtimeの出力から、読み込みに時間のかかったモジュールも集計します。
+    """
+    root = str(Path(__file__).parent)
+    snippet = _STARTUP_SNIPPET.format(root=root, heavy=HEAVY_MODULES)
+    timings = []
+    import_times: Dict[str, int] = {}
+    loaded_heavy: List[str] = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", snippet],
+            cwd=tempfile.gettempdir(),
+            capture_output=True,
+            text=True
+        )
+        timings.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr)
+        for line in proc.stdout.splitlines():
+            if line.startswith("HEAVY_MODULES="):
+                loaded_heavy = [m for m in line.split("=", 1)[1].split(",") if m]
+        
+        # "import time: self [us] | cumulative | imported package"
+        for line in proc.stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) != 3 or not line.startswith("import time:"):
+                continue
+            try:
+                cumulative = int(parts[1])
+            except ValueError:
+                continue
+            name = parts[2].strip()
+            if "." not in name:
+                import_times[name] = max(import_times.get(name, 0), cumulative)
+
+    slowest = sorted(import_times.items(), key=lambda item: item[1], reverse=True)[:10]
+    best = min(timings)
+    return {
+        "runs": runs,
+        "budget_seconds": budget,
+        "best_seconds": best,
+        "all_seconds": timings,
+        "slowest_top_level_imports_ms": {name: us / 1000 for name, us in slowest},
+        "heavy_modules_loaded": loaded_heavy,
+        "passed": best <= budget and not loaded_heavy
+    }
+
+
+# ============================================================================
+# 適応メッシュ（RTIN）と一様縮小の比較
+# ============================================================================
+
+def _surface_errors(reference: np.ndarray, surface: np.ndarray) -> Dict[str, float]:
+    diff = np.abs(surface - reference)
+    return {"max_error": float(diff.max()), "rmse": float(np.sqrt(np.mean(diff ** 2)))}
+
+
+def bench_mesh(size: int, polygons: int, eval_stride: int) -> Dict[str, Any]:
+    """
+    同じポリゴン数で、RTINの適応メッシュと従来のndimage.zoomによる一様縮小の高さの誤差を比較します。
+
+    誤差は(2^k+1)グリッドのeval_strideごとの格子点で、各メッシュを線形補間した高さとの差です。
+    """
+    from matplotlib.tri import LinearTriInterpolator, Triangulation
+
+    bbox = [138.5, 35.2, 139.0, 35.7]
+    height_data = synthetic_terrain(bbox, (size - 1) / (bbox[3] - bbox[1]))
+    grid = mcp_server._rtin_grid(height_data)
+    n = grid.shape[0]
+    eval_index = np.arange(0, n, eval_stride)
+    eval_y, eval_x = np.meshgrid(eval_index, eval_index, indexing="ij")
+    reference = grid[eval_y, eval_x]
+
+    # RTIN（_build_rtin_mesh全体の時間）
+    start = time.perf_counter()
+    mesh = mcp_server._build_rtin_mesh(height_data, bbox, polygons)
+    rtin_seconds = time.perf_counter() - start
+    width, depth = mesh["size_meters"]
+    positions = mesh["positions"].astype(np.float64)
+    triangulation = Triangulation(
+        positions[:, 0] / width * (n - 1), positions[:, 2] / depth * (n - 1), mesh["faces"].astype(np.int64)
+    )
+    rtin_surface = LinearTriInterpolator(triangulation, positions[:, 1])(
+        eval_x.astype(np.float64), eval_y.astype(np.float64)
+    ).filled(np.nan)
+    rtin_errors = _surface_errors(reference, rtin_surface)
+
+    # 従来の一様縮小（create_vrchat_terrainと同じ縮小率の計算）
+    start = time.perf_counter()
+    scale_factor = np.sqrt(polygons / (n * n * 2))
+    zoomed = ndimage.zoom(grid, scale_factor, order=1)
+    zoom_seconds = time.perf_counter() - start
+    zoom_rows, zoom_cols = zoomed.shape
+    zoom_surface = ndimage.map_coordinates(
+        zoomed,
+        [eval_y * (zoom_rows - 1) / (n - 1), eval_x * (zoom_cols - 1) / (n - 1)],
+        order=1
+    )
+    zoom_errors = _surface_errors(reference, zoom_surface)
+    zoom_triangles = 2 * (zoom_rows - 1) * (zoom_cols - 1)
+
+    return {
+        "grid_size": n,
+        "polygon_budget": polygons,
+        "eval_points": int(reference.size),
+        "rtin": {
+            "triangles": mesh["triangle_count"],
+            "vertices": mesh["vertex_count"],
+            "seconds": rtin_seconds,
+            "error_threshold": mesh["error_threshold"],
+            **rtin_errors
+        },
+        "zoom": {
+            "triangles": zoom_triangles,
+            "shape": [zoom_rows, zoom_cols],
+            "seconds": zoom_seconds,
+            **zoom_errors
+        },
+        # error_thresholdは全格子点での誤差の上限なので、評価点での最大誤差はそれを超えない
+        "passed": (
+            mesh["triangle_count"] <= polygons
+            and rtin_errors["max_error"] <= mesh["error_threshold"] + 1e-3
+            and rtin_errors["max_error"] < zoom_errors["max_error"]
+        )
+    }
+
+
+def bench_glb(size: int, budget: float) -> Dict[str, Any]:
+    """size×size頂点の格子メッシュを作成してGLBに書き出すまでの時間を計測します。"""
+    bbox = [138.5, 35.2, 139.0, 35.7]
+    height_data = synthetic_terrain(bbox, size / (bbox[3] - bbox[1]))[:size, :size]
+    output_path = Path(tempfile.mkdtemp(prefix="jaxa_bench_glb_")) / "terrain.glb"
+
+    start = time.perf_counter()
+    mesh = mcp_server._build_grid_mesh(height_data, bbox)
+    build_seconds = time.perf_counter() - start
+    mcp_server._write_glb(str(output_path), mesh["positions"], mesh["uvs"], mesh["faces"], mesh["normals"])
+    total_seconds = time.perf_counter() - start
+
+    return {
+        "vertices": mesh["vertex_count"],
+        "triangles": mesh["triangle_count"],
+        "build_seconds": build_seconds,
+        "write_seconds": total_seconds - build_seconds,
+        "total_seconds": total_seconds,
+        "file_bytes": output_path.stat().st_size,
+        "budget_seconds": budget,
+        "passed": total_seconds <= budget
+    }
+
+
+# ============================================================================
+# Normalマップ
+# ============================================================================
+
+def legacy_normal_map(height_data: np.ndarray) -> np.ndarray:
+    """比較用: 書き換え前の_generate_normal_map（一時配列を多数確保する実装）"""
+    sobel_x = ndimage.sobel(height_data, axis=1)
+    sobel_y = ndimage.sobel(height_data, axis=0)
+    normal_x = -sobel_x
+    normal_y = -sobel_y
+    normal_z = np.ones_like(height_data)
+    magnitude = np.sqrt(normal_x**2 + normal_y**2 + normal_z**2)
+    normal_x /= magnitude
+    normal_y /= magnitude
+    normal_z /= magnitude
+    return np.stack([
+        ((normal_x + 1) * 127.5).astype(np.uint8),
+        ((normal_y + 1) * 127.5).astype(np.uint8),
+        ((normal_z + 1) * 127.5).astype(np.uint8)
+    ], axis=-1)
+
+
+def _measure(func, *args, **kwargs) -> Dict[str, float]:
+    """実行時間と、実行中に追加で確保されたメモリのピーク（tracemalloc）"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": seconds, "peak_mb": peak / (1024 * 1024)}
+
+
+def bench_normals(size: int) -> Dict[str, Any]:
+    """書き換え前後のNormalマップ生成の時間とピークメモリを比較します。"""
+    bbox = [138.5, 35.2, 139.0, 35.7]
+    height_data = synthetic_terrain(bbox, size / (bbox[3] - bbox[1]))[:size, :size]
+    spacing = mcp_server._pixel_spacing_meters(bbox, height_data.shape)
+    input_mb = height_data.nbytes / (1024 * 1024)
+
+    legacy = _measure(legacy_normal_map, height_data)
+    current = _measure(mcp_server._generate_normal_map, height_data, spacing)
+    output = np.empty((size, size, 3), dtype=np.uint8)
+    preallocated = _measure(mcp_server._generate_normal_map, height_data, spacing, out=output)
+
+    return {
+        "shape": [size, size],
+        "input_mb": input_mb,
+        "output_mb": output.nbytes / (1024 * 1024),
+        "legacy": legacy,
+        "current": current,
+        # 出力先を渡した場合（作業用バッファのみ）
+        "current_preallocated_output": preallocated,
+        "speedup": legacy["seconds"] / current["seconds"] if current["seconds"] > 0 else 0.0,
+        "passed": current["peak_mb"] < legacy["peak_mb"] and current["seconds"] < legacy["seconds"]
+    }
+
+
+# ============================================================================
+# 再サンプリング
+# ============================================================================
+
+def legacy_vrchat_resample(height_data: np.ndarray, max_polygons: int, texture_size: int) -> np.ndarray:
+    """比較用: 書き換え前のcreate_vrchat_terrain（ndimage.zoom → uint16 → PILのLANCZOSで再拡大）"""
+    current_polygons = height_data.shape[0] * height_data.shape[1] * 2
+    if current_polygons > max_polygons:
+        scale_factor = np.sqrt(max_polygons / current_polygons)
+        new_height = int(height_data.shape[0] * scale_factor)
+        new_width = int(height_data.shape[1] * scale_factor)
+        height_data = ndimage.zoom(
+            height_data, (new_height / height_data.shape[0], new_width / height_data.shape[1]), order=1
+        )
+    height_uint16, _, _ = mcp_server._normalize_to_uint16(height_data)
+    image = mcp_server.PILImage.fromarray(height_uint16, mode='I;16')
+    image = image.resize((texture_size, texture_size), mcp_server.PILImage.Resampling.LANCZOS)
+    return np.asarray(image, dtype=np.uint16)
+
+
+def bench_resample(size: int, texture_size: int, max_polygons: int) -> Dict[str, Any]:
+    """
+    書き換え前の2段階の再サンプリングと、共通の再サンプリング（1回）を比較します。
+    誤差は、出力の画素中心で直接計算した合成地形との差（メートル）です。
+    """
+    bbox = [138.5, 35.2, 139.0, 35.7]
+    height_data = synthetic_terrain(bbox, size / (bbox[3] - bbox[1]))[:size, :size]
+    reference = synthetic_terrain(bbox, texture_size / (bbox[3] - bbox[1]))[:texture_size, :texture_size]
+    height_min, height_max = float(height_data.min()), float(height_data.max())
+    step = (height_max - height_min) / 65535.0
+
+    def to_meters(quantized: np.ndarray) -> np.ndarray:
+        return quantized.astype(np.float64) * step + height_min
+
+    def errors(quantized: np.ndarray) -> Dict[str, float]:
+        diff = to_meters(quantized) - reference
+        return {"rmse_m": float(np.sqrt(np.mean(diff ** 2))), "max_m": float(np.abs(diff).max())}
+
+    start = time.perf_counter()
+    legacy = legacy_vrchat_resample(height_data, max_polygons, texture_size)
+    legacy_seconds = time.perf_counter() - start
+    result = {
+        "source_shape": [size, size],
+        "texture_size": texture_size,
+        "legacy": {"seconds": legacy_seconds, **errors(legacy)},
+        "kernels": {}
+    }
+    for kernel in mcp_server._RESAMPLE_KERNELS:
+        start = time.perf_counter()
+        resampled = mcp_server._resample_grid(height_data, texture_size, texture_size, kernel=kernel)
+        quantized, _, _ = mcp_server._normalize_to_uint16(resampled, (height_min, height_max))
+        seconds = time.perf_counter() - start
+        result["kernels"][kernel] = {"seconds": seconds, **errors(quantized)}
+
+    # 欠損の多いデータでも、出力が入力の範囲に収まること（lanczosの負のローブで発散しないこと）
+    rng = np.random.default_rng(0)
+    sparse_data = (rng.random((200, 200)) * 100.0).astype(np.float32)
+    sparse_data[rng.random(sparse_data.shape) < 0.7] = np.nan
+    edge = np.zeros((100, 100), dtype=np.float32)
+    edge[:, 50:] = 100.0
+    edge[:, :25] = np.nan
+    result["sparse"] = {}
+    for kernel in mcp_server._RESAMPLE_KERNELS:
+        outputs = [
+            mcp_server._resample(data, shape, shape, kernel)
+            for data in (sparse_data, edge)
+            for shape in (37, 77, 300)
+        ]
+        result["sparse"][kernel] = {
+            "min": float(min(np.nanmin(output) for output in outputs)),
+            "max": float(max(np.nanmax(output) for output in outputs))
+        }
+    in_range = all(-1e-3 <= stats["min"] and stats["max"] <= 100.0 + 1e-3 for stats in result["sparse"].values())
+    result["passed"] = in_range and result["kernels"]["lanczos"]["rmse_m"] < result["legacy"]["rmse_m"]
+    return result
+
+
+# ============================================================================
+# 欠損値の補間
+# ============================================================================
+
+def synthetic_voids(shape: tuple, fraction: float, seed: int = 0) -> np.ndarray:
+    """大小の矩形の欠損（AW3D30のボイドのような穴）を、全体のfraction程度になるまで配置したマスク"""
+    rng = np.random.default_rng(seed)
+    rows, cols = shape
+    mask = np.zeros(shape, dtype=bool)
+    while mask.mean() < fraction:
+        size = int(rng.integers(2, max(3, min(rows, cols) // 20)))
+        top = int(rng.integers(0, rows))
+        left = int(rng.integers(0, cols))
+        mask[top:top + size, left:left + size] = True
+    return mask
+
+
+def bench_voidfill(size: int, void_fraction: float, max_fraction: float) -> Dict[str, Any]:
+    """
+    欠損値を含む合成標高データでgenerate_heightmapを実行し、補間（_fill_voids）にかかる時間が
+    エクスポート全体に占める割合と、欠損部分の補間誤差を計測します。
+    """
+    bbox = [138.5, 35.2, 139.0, 35.7]
+    ppu = size / (bbox[3] - bbox[1])
+    truth = synthetic_terrain(bbox, ppu)
+    voids = synthetic_voids(truth.shape, void_fraction)
+    install_synthetic_fetch()
+    fetch = mcp_server._fetch_images
+
+    def fetch_with_voids(*args, **kwargs):
+        result = fetch(*args, **kwargs)
+        result.raster.img = np.where(voids, np.nan, truth)[np.newaxis, :, :, np.newaxis]
+        return result
+
+    mcp_server._fetch_images = fetch_with_voids
+    mcp_server._RASTER_STORE = mcp_server._RasterStore(
+        Path(tempfile.mkdtemp(prefix="jaxa_bench_store_")), mcp_server.RASTER_STORE_MAX_BYTES
+    )
+    mcp_server._FETCHED_RASTERS.clear()
+
+    with_voids = np.where(voids, np.nan, truth).astype(np.float32)
+    start = time.perf_counter()
+    filled, void_count = mcp_server._fill_voids(with_voids)
+    fill_seconds = time.perf_counter() - start
+    error = np.abs(filled[voids] - truth[voids])
+
+    output_path = str(Path(tempfile.mkdtemp(prefix="jaxa_bench_out_")) / "heightmap.png")
+    start = time.perf_counter()
+    result = mcp_server.generate_heightmap("synthetic", bbox, ppu, output_path=output_path)
+    export_seconds = time.perf_counter() - start
+    if "error" in result:
+        return {"error": result["error"], "passed": False}
+
+    fraction = fill_seconds / export_seconds if export_seconds > 0 else 0.0
+    return {
+        "shape": list(truth.shape),
+        "void_cells": void_count,
+        "void_fraction": void_count / truth.size,
+        "fill_seconds": fill_seconds,
+        "export_seconds": export_seconds,
+        "fill_share_of_export": fraction,
+        "fill_error_m": {"mean": float(error.mean()), "p99": float(np.percentile(error, 99))},
+        "passed": fraction <= max_fraction
+    }
+
+
+def _isolate_caches() -> None:
+    """取得結果のキャッシュを空の一時ディレクトリに切り替え、毎回HTTPの層まで取得させる"""
+    mcp_server._RASTER_CACHE = mcp_server._RasterCache(
+        Path(tempfile.mkdtemp(prefix="jaxa_bench_cache_")), mcp_server.RASTER_CACHE_MAX_BYTES
+    )
+    mcp_server._RASTER_STORE = mcp_server._RasterStore(
+        Path(tempfile.mkdtemp(prefix="jaxa_bench_store_")), mcp_server.RASTER_STORE_MAX_BYTES
+    )
+    mcp_server._FETCHED_RASTERS.clear()
+    mcp_server._IMAGE_COLLECTIONS.clear()
+
+
+def bench_replay(
+    collection: str,
+    bounds: List[float],
+    resolution: float,
+    runs: int,
+    fixtures_dir: str,
+    record: bool
+) -> Dict[str, Any]:
+    """
+    記録したHTTP応答（JAXA_EARTH_MODE=replay）だけでgenerate_heightmapを実行し、
+    STACの探索・COGの読み込みを含む実際の取得処理の時間を計測します。
+    recordがTrueの場合は先にネットワークから1回取得して応答を記録します。
+    全ての実行で記録漏れがなく、出力が一致すれば合格です。
+    """
+    mcp_server._HTTP_FIXTURES = mcp_server._HTTPFixtures(Path(fixtures_dir))
+    output_dir = Path(tempfile.mkdtemp(prefix="jaxa_bench_out_"))
+    recorded = None
+    if record:
+        mcp_server.JAXA_EARTH_MODE = "record"
+        _isolate_caches()
+        start = time.perf_counter()
+        result = mcp_server.generate_heightmap(collection, bounds, resolution, output_path=str(output_dir / "record.png"))
+        if "error" in result:
+            return {"error": result["error"], "passed": False}
+        recorded = {"seconds": time.perf_counter() - start, **mcp_server._HTTP_FIXTURES.stats()}
+
+    mcp_server.JAXA_EARTH_MODE = "replay"
+    timings = []
+    digests = set()
+    for i in range(runs):
+        _isolate_caches()
+        output_path = output_dir / f"replay_{i}.png"
+        start = time.perf_counter()
+        result = mcp_server.generate_heightmap(collection, bounds, resolution, output_path=str(output_path))
+        timings.append(time.perf_counter() - start)
+        if "error" in result:
+            return {"error": result["error"], "fixtures": mcp_server._HTTP_FIXTURES.stats(), "passed": False}
+        digests.add(hashlib.sha256(output_path.read_bytes()).hexdigest())
+
+    fixtures = mcp_server._HTTP_FIXTURES.stats()
+    return {
+        "collection": collection,
+        "bounds": bounds,
+        "resolution": resolution,
+        "record": recorded,
+        "replay_seconds": timings,
+        "replay_seconds_min": min(timings),
+        "fixtures": fixtures,
+        "deterministic": len(digests) == 1,
+        "passed": fixtures["missing"] == 0 and len(digests) == 1
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="JAXA Earth MCPサーバーのベンチマーク")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    concurrency = subparsers.add_parser("concurrency", help="非同期ツールの並行実行")
+    concurrency.add_argument("--calls", type=int, default=8)
+    concurrency.add_argument("--latency", type=float, default=0.5)
+
+    coalescing = subparsers.add_parser("coalescing", help="同一リクエストの集約（single-flight）")
+    coalescing.add_argument("--calls", type=int, default=8)
+    coalescing.add_argument("--latency", type=float, default=0.5)
+
+    startup = subparsers.add_parser("startup", help="サーバー起動時間（mcp.run()到達まで）")
+    startup.add_argument("--budget", type=float, default=2.0, help="許容する起動時間（秒）")
+    startup.add_argument("--runs", type=int, default=3)
+
+    mesh = subparsers.add_parser("mesh", help="適応メッシュ（RTIN）と一様縮小の誤差比較")
+    mesh.add_argument("--size", type=int, default=4097, help="標高グリッドの1辺のピクセル数")
+    mesh.add_argument("--polygons", type=int, default=100000)
+    mesh.add_argument("--eval-stride", type=int, default=4, help="誤差を評価する格子点の間隔")
+
+    glb = subparsers.add_parser("glb", help="格子メッシュのGLB書き出し")
+    glb.add_argument("--size", type=int, default=1000, help="1辺の頂点数")
+    glb.add_argument("--budget", type=float, default=1.0, help="許容する時間（秒）")
+
+    normals = subparsers.add_parser("normals", help="Normalマップ生成の時間とメモリ")
+    normals.add_argument("--size", type=int, default=4096)
+
+    resample = subparsers.add_parser("resample", help="再サンプリングの時間と誤差（書き換え前との比較）")
+    resample.add_argument("--size", type=int, default=4096, help="元の標高グリッドの1辺のピクセル数")
+    resample.add_argument("--texture-size", type=int, default=2048)
+    resample.add_argument("--polygons", type=int, default=100000)
+
+    voidfill = subparsers.add_parser("voidfill", help="欠損値の補間の時間（エクスポート全体に占める割合）と誤差")
+    voidfill.add_argument("--size", type=int, default=4096, help="標高グリッドの行数")
+    voidfill.add_argument("--void-fraction", type=float, default=0.1, help="欠損の割合")
+    voidfill.add_argument("--max-fraction", type=float, default=0.25, help="許容する補間時間の割合")
+
+    replay = subparsers.add_parser("replay", help="記録したHTTP応答による実際の取得処理の計測（ネットワーク不要）")
+    replay.add_argument("--collection", default="JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global")
+    replay.add_argument("--bbox", type=float, nargs=4, default=[138.7, 35.3, 138.8, 35.4],
+                        metavar=("MIN_LON", "MIN_LAT", "MAX_LON", "MAX_LAT"))
+    replay.add_argument("--resolution", type=float, default=1000.0)
+    replay.add_argument("--runs", type=int, default=3)
+    replay.add_argument("--fixtures-dir", default=str(mcp_server.HTTP_FIXTURES_DIR))
+    replay.add_argument("--record", action="store_true", help="先にネットワークから取得して応答を記録する")
+
+    args = parser.parse_args()
+    if args.benchmark == "concurrency":
+        result = bench_concurrency(args.calls, args.latency)
+    elif args.benchmark == "coalescing":
+        result = bench_coalescing(args.calls, args.latency)
+    elif args.benchmark == "startup":
+        result = bench_startup(args.budget, args.runs)
+    elif args.benchmark == "mesh":
+        result = bench_mesh(args.size, args.polygons, args.eval_stride)
+    elif args.benchmark == "glb":
+        result = bench_glb(args.size, args.budget)
+    elif args.benchmark == "normals":
+        result = bench_normals(args.size)
+    elif args.benchmark == "resample":
+        result = bench_resample(args.size, args.texture_size, args.polygons)
+    elif args.benchmark == "voidfill":
+        result = bench_voidfill(args.size, args.void_fraction, args.max_fraction)
+    elif args.benchmark == "replay":
+        result = bench_replay(args.collection, args.bbox, args.resolution, args.runs, args.fixtures_dir, args.record)
+
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    return 0 if result.get("passed", True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
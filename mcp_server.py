@@ -4,28 +4,78 @@ JAXA Earth API MCP Server
 地球観測データの検索・取得・処理・3D地形生成機能を提供するMCPサーバー
 """
 
+import asyncio
+import copy
+import functools
+import hashlib
+import importlib
+import importlib.util
 import json
+import multiprocessing
 import os
+import pickle
+import re
+import shutil
+import struct
 import sys
+import threading
+import time
+import types
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Union
 import traceback
 
+
+
+class _LazyModule:
+    """
+    属性に最初にアクセスした時点でモジュールをimportするプロキシ。
+    
+    MCPサーバーはIDEから必要なたびに起動されるため、重いライブラリ
+    （jaxa.earth, numpy, rasterio, PIL, scipy）の読み込みは最初に使用するツールまで遅らせます。
+    """
+
+    def __init__(self, module_name: str):
+        self.__dict__["_module_name"] = module_name
+        self.__dict__["_module"] = None
+
+    def _load(self) -> Any:
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_module_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._load(), name)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self.__dict__['_module_name']}'>"
+
+
 try:
     # 標準MCP SDKのFastMCPを使用（公式v0.1.5スタイルに合わせる）
     from mcp.server.fastmcp import FastMCP, Image
-    from jaxa.earth import je
-    import requests
-    import numpy as np
-    import rasterio
-    from rasterio.transform import from_bounds
-    from PIL import Image as PILImage
-    from scipy import ndimage
+    
+    # 重いライブラリは存在だけを確認し、importは最初の使用時に行う
+    for _required in ("jaxa.earth", "requests", "numpy", "rasterio", "PIL", "scipy"):
+        if importlib.util.find_spec(_required) is None:
+            raise ImportError(f"No module named '{_required}'")
 except ImportError as e:
     print(f"Error importing required libraries: {e}", file=sys.stderr)
     print("Please install dependencies: uv sync", file=sys.stderr)
     sys.exit(1)
 
+je = _LazyModule("jaxa.earth.je")
+requests = _LazyModule("requests")
+np = _LazyModule("numpy")
+rasterio = _LazyModule("rasterio")
+PILImage = _LazyModule("PIL.Image")
+sparse = _LazyModule("scipy.sparse")
+
 # FastMCPサーバーのインスタンスを作成（公式ドキュメントv0.1.5に合わせる）
 mcp = FastMCP("JAXA_Earth_API_Assistant")
 
@@ -33,64 +83,3014 @@ mcp = FastMCP("JAXA_Earth_API_Assistant")
 TEMP_DIR = Path("./temp")
 TEMP_DIR.mkdir(exist_ok=True)
 
+# ブロッキング処理（取得・NumPy処理）を実行するスレッドプールのサイズ
+MCP_EXECUTOR_WORKERS = int(os.environ.get("JAXA_MCP_WORKERS", "4"))
+_EXECUTOR = ThreadPoolExecutor(max_workers=MCP_EXECUTOR_WORKERS, thread_name_prefix="jaxa-tool")
+
+# matplotlibによる描画はスレッドセーフではないため直列化する
+_PLOT_LOCK = threading.Lock()
+
+# ラスターキャッシュ設定（環境変数で上書き可能）
+RASTER_CACHE_DIR = Path(os.environ.get("JAXA_RASTER_CACHE_DIR", str(TEMP_DIR / "raster_cache")))
+RASTER_CACHE_MAX_BYTES = int(float(os.environ.get("JAXA_RASTER_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+
+
+async def _run_blocking(func, *args, **kwargs) -> Any:
+    """ブロッキング関数をスレッドプールで実行し、イベントループを止めずに結果を待つ"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_EXECUTOR, functools.partial(func, *args, **kwargs))
+
 
 # ============================================================================
-# データ検索ツール
+# HTTP通信（共有セッション）
 # ============================================================================
 
-@mcp.tool()
-async def search_collections_id() -> str:
+# 接続・読み込みのタイムアウト（秒）
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("JAXA_HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_READ_TIMEOUT = float(os.environ.get("JAXA_HTTP_READ_TIMEOUT", "60"))
+
+# 5xx・429・接続エラー・タイムアウト時の再試行回数と指数バックオフの係数（0.5 → 0.5, 1, 2, 4...秒）
+HTTP_MAX_RETRIES = int(os.environ.get("JAXA_HTTP_RETRIES", "5"))
+HTTP_BACKOFF_FACTOR = float(os.environ.get("JAXA_HTTP_BACKOFF", "0.5"))
+_HTTP_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# ホストごとに保持するkeep-alive接続数（ツール用スレッドプールと再サンプリングの並列数を上回る値）
+HTTP_POOL_SIZE = int(os.environ.get("JAXA_HTTP_POOL_SIZE", "16"))
+
+# トークンバケットによる送信レート制限（1秒あたりのリクエスト数とバースト数。0で無効）
+HTTP_RATE_LIMIT = float(os.environ.get("JAXA_HTTP_RATE_LIMIT", "20"))
+HTTP_RATE_BURST = int(os.environ.get("JAXA_HTTP_RATE_BURST", "40"))
+
+
+class _TokenBucket:
     """
-    JAXA Earth APIで利用可能なデータセットの詳細情報を返します。
-    ユーザーのリクエストに基づいて、適切なデータセットIDとバンドを選択して応答してください。
+    スレッドセーフなトークンバケット。
     
-    返されるテキストは、JAXA Earth APIを通じて利用可能なすべてのデータセットのリストです。
-    各パラメータは以下のように記述されています：
+    rate個/秒でトークンが補充され（最大capacity個）、acquire()はトークンが
+    得られるまで待機します。並列エクスポートのバーストをサーバー側のレート制限に
+    掛からない送信間隔へ平準化します。rateが0以下の場合は何もしません。
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.waited_seconds = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 先にトークンを予約し、不足分が補充されるまでロックの外で待つ
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited_seconds += wait
+        if wait > 0:
+            time.sleep(wait)
+
+
+# 通信モード: live（通常）・record（応答をフィクスチャに記録）・replay（フィクスチャだけで応答し、ネットワークを使わない）
+JAXA_EARTH_MODE = os.environ.get("JAXA_EARTH_MODE", "live").lower()
+_JAXA_EARTH_MODES = ("live", "record", "replay")
+HTTP_FIXTURES_DIR = Path(os.environ.get("JAXA_EARTH_FIXTURES_DIR", str(TEMP_DIR / "fixtures")))
+
+# 再生時には意味を持たない（本文は復号済み）ため保存しないヘッダー
+_FIXTURE_SKIP_HEADERS = ("content-encoding", "transfer-encoding", "connection", "keep-alive")
+
+
+class _HTTPFixtures:
+    """
+    HTTP応答をディスクに記録・再生するフィクスチャ。
     
-    id: データセットを一意に識別するID
-    title: データセットのタイトル
-    description: データセットの説明
-    bands: データセットに含まれるデータのID。複数のIDはカンマ（,）で区切られます。
-    keywords: データセットに関連するキーワード。観測衛星の名前やデータを管理する宇宙機関の名前が含まれます。
-    startDate: ISO8601形式のデータセット期間の開始日時を表す文字列。この日付以降のデータが利用可能であることを示します。
-    endDate: ISO8601形式のデータセット期間の終了日時を表す文字列。"present"という値は、データがまだ毎日更新されていることを示します。
-    各データセットのパラメータの終わりは"---"で示されます。
-    bbox: データセットの地理的範囲（バウンディングボックス）。EPSG:4326の場合、[最小経度、最小緯度、最大経度、最大緯度]を示します。EPSG:3995またはEPSG:3031の場合、[最小X、最小Y、最大X、最大Y]を示します。
-    epsg: データセットの投影方法を示すEPSGコード。
+    キーは(メソッド, URL, Rangeヘッダー)から計算したSHA-256で、応答ごとに
+    {key}.json（URL・ステータス・ヘッダー）と{key}.bin（本文）を保存します。
+    カタログ（catalog.md）・STACのJSON・COGのバイト範囲読み込みはいずれも
+    この単位で記録されるため、同じツール呼び出しはネットワークなしで同じ応答を得られます。
+    """
+
+    def __init__(self, fixtures_dir: Path):
+        self.fixtures_dir = Path(fixtures_dir)
+        self.recorded = 0
+        self.replayed = 0
+        self.missing = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(request: Any) -> str:
+        query = [request.method, request.url, request.headers.get("Range", "")]
+        return hashlib.sha256(json.dumps(query).encode("utf-8")).hexdigest()
+
+    def save(self, request: Any, response: Any) -> None:
+        self.fixtures_dir.mkdir(parents=True, exist_ok=True)
+        key = self._key(request)
+        meta = {
+            "method": request.method,
+            "url": request.url,
+            "range": request.headers.get("Range"),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": {
+                name: value for name, value in response.headers.items()
+                if name.lower() not in _FIXTURE_SKIP_HEADERS
+            },
+            "recorded_at": time.time()
+        }
+        # 本文→メタデータの順に置き換え、メタデータがあれば本文も揃っているようにする
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        for name, payload in ((f"{key}.bin", response.content), (f"{key}.json", json.dumps(meta, indent=2).encode("utf-8"))):
+            path = self.fixtures_dir / name
+            tmp_path = path.with_name(path.name + suffix)
+            tmp_path.write_bytes(payload)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self.recorded += 1
+
+    def load(self, request: Any) -> Optional[Any]:
+        """記録済みの応答をrequests.Responseとして返します。記録がない場合はNoneを返します。"""
+        from requests.models import Response
+        from requests.structures import CaseInsensitiveDict
+        from requests.utils import get_encoding_from_headers
+
+        key = self._key(request)
+        try:
+            with open(self.fixtures_dir / f"{key}.json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            body = (self.fixtures_dir / f"{key}.bin").read_bytes()
+        except (OSError, ValueError):
+            with self._lock:
+                self.missing += 1
+            return None
+        
+        response = Response()
+        response.status_code = meta["status"]
+        response.reason = meta.get("reason")
+        response.headers = CaseInsensitiveDict(meta["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = body
+        response.url = request.url
+        response.request = request
+        with self._lock:
+            self.replayed += 1
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": JAXA_EARTH_MODE,
+                "fixtures_dir": str(self.fixtures_dir),
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "missing": self.missing
+            }
+
+
+_HTTP_RATE_LIMITER = _TokenBucket(HTTP_RATE_LIMIT, HTTP_RATE_BURST)
+_HTTP_FIXTURES = _HTTPFixtures(HTTP_FIXTURES_DIR)
+_HTTP_SESSION: Optional[Any] = None
+_HTTP_SESSION_LOCK = threading.Lock()
+_HTTP_STATS = {"requests": 0, "retried_requests": 0}
+
+
+class _JaxaHTTPAdapter:
+    """
+    requestsのHTTPAdapterに、タイムアウトの既定値・レート制限・フィクスチャの記録と再生を加えるアダプター。
     
-    上記に基づいて、ユーザーのリクエストに最適なデータセットIDとバンドを選択して応答してください。
+    requestsを最初の使用まで読み込まないよう、HTTPAdapterを継承せずに委譲します
+    （Sessionが使うのはsend()とclose()だけです）。モジュールレベルのクラスなので、
+    セッションごとpickle化・複製できます。
     """
-    try:
-        # JAXA Earth APIデータセット情報を読み込む
-        JE_TEXT_PATH = "https://data.earth.jaxa.jp/app/mcp/catalog.md"
-        response = requests.get(JE_TEXT_PATH)
-        je_text = response.text
+
+    def __init__(self, adapter: Any):
+        self._adapter = adapter
+
+    def send(self, request: Any, **kwargs) -> Any:
+        if JAXA_EARTH_MODE == "replay":
+            response = _HTTP_FIXTURES.load(request)
+            if response is None:
+                raise requests.ConnectionError(
+                    f"replayモードで記録されていないリクエストです: {request.method} {request.url}",
+                    request=request
+                )
+            response.connection = self
+            return response
+        # jaxa.earthはタイムアウトを指定しないため、未指定の場合は既定値を使う
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+        _HTTP_RATE_LIMITER.acquire()
+        response = self._adapter.send(request, **kwargs)
+        response.connection = self
+        history = getattr(response.raw, "retries", None)
+        with _HTTP_SESSION_LOCK:
+            _HTTP_STATS["requests"] += 1
+            if history is not None and history.history:
+                _HTTP_STATS["retried_requests"] += 1
+        # 304は保存済みのコピーが前提の応答なので記録しない
+        if JAXA_EARTH_MODE == "record" and response.status_code != 304:
+            _HTTP_FIXTURES.save(request, response)
+        return response
+
+    def close(self) -> None:
+        self._adapter.close()
+
+
+def _create_http_session() -> Any:
+    """
+    接続プール・再試行・タイムアウト・レート制限を設定したrequests.Sessionを作成します。
+    
+    再試行はurllib3.Retryで行い、Retry-Afterヘッダーがあればそれに従います。
+    最後の応答は例外にせずそのまま返すため、呼び出し側のステータス確認
+    （raise_for_status、jaxa.earthのcheck_error）がそのまま機能します。
+    JAXA_EARTH_MODEがrecordの場合は応答をフィクスチャに記録し、
+    replayの場合は送信せずにフィクスチャから応答します。
+    """
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    if JAXA_EARTH_MODE not in _JAXA_EARTH_MODES:
+        raise ValueError(f"JAXA_EARTH_MODEは{', '.join(_JAXA_EARTH_MODES)}のいずれかを指定してください: {JAXA_EARTH_MODE}")
+
+    retry = Retry(
+        total=HTTP_MAX_RETRIES,
+        connect=HTTP_MAX_RETRIES,
+        read=HTTP_MAX_RETRIES,
+        status=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=_HTTP_RETRY_STATUS,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False
+    )
+    adapter = _JaxaHTTPAdapter(
+        HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+    )
+    session = requests.Session()
+    session.verify = True
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def _http_session() -> Any:
+    """
+    全ツールで共有するHTTPセッションを返します（初回呼び出し時に作成）。
+    
+    requests.Sessionは同時リクエストに対して接続プールを共有でき、並列エクスポートでも
+    TCP/TLS接続を再利用します。プロセスごとに1つ作成されるため、
+    バッチエクスポートのワーカープロセスはそれぞれのセッションとレート制限を持ちます。
+    """
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        with _HTTP_SESSION_LOCK:
+            if _HTTP_SESSION is None:
+                _HTTP_SESSION = _create_http_session()
+    return _HTTP_SESSION
+
+
+def _install_jaxa_session() -> None:
+    """
+    jaxa.earthが内部で作成するセッションを共有セッションに置き換えます。
+    
+    je.ImageCollection・je.ImageCollectionListはコンストラクタで毎回
+    requests.Session()を作成するため、jaxa.earth.jeモジュールが参照する
+    requestsを、Sessionだけ共有セッションを返す名前空間に差し替えます。
+    MCPサーバー以外のスクリプトも、これを呼び出せば記録・再生モードで実行できます。
+    """
+    module = importlib.import_module("jaxa.earth.je")
+    if not isinstance(module.requests, _JaxaRequestsShim):
+        module.requests = _JaxaRequestsShim(module.requests)
+
+
+class _JaxaRequestsShim:
+    """Session()で共有セッションを返し、それ以外はrequestsモジュールに委譲する名前空間"""
+
+    def __init__(self, module: Any):
+        self._module = module
+
+    @staticmethod
+    def Session() -> Any:
+        return _http_session()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._module, name)
+
+
+def _http_stats() -> Dict[str, Any]:
+    with _HTTP_SESSION_LOCK:
+        stats = dict(_HTTP_STATS)
+    stats["rate_limit_wait_seconds"] = round(_HTTP_RATE_LIMITER.waited_seconds, 3)
+    stats["fixtures"] = _HTTP_FIXTURES.stats()
+    return stats
+
+
+# ============================================================================
+# ラスター取得キャッシュ
+# ============================================================================
+
+class _FetchedImages:
+    """
+    get_images()の結果から、ツールとje.ImageProcessが参照する属性だけを取り出したもの。
+    
+    je.ImageCollectionは各STACオブジェクトとともにHTTPセッションを保持するため、
+    そのままではディスクキャッシュへの保存（pickle）や複製のたびにセッションごと扱うことになります。
+    取得結果はこの形に変換してからキャッシュ・共有します。
+    """
+
+    def __init__(self, images: Any):
+        self.raster = images.raster
+        self.cinfo = getattr(images, "cinfo", None)
+        self.proj_params = getattr(images, "proj_params", None)
+        self._settings = getattr(images, "_settings", None)
+        self.stac_collection = self._stac(getattr(images, "stac_collection", None), "query")
+        self.stac_band = self._stac(getattr(images, "stac_band", None), "query")
+        self.stac_date = self._stac(getattr(images, "stac_date", None), "id")
+
+    @staticmethod
+    def _stac(stac: Any, name: str) -> Any:
+        if stac is None:
+            return None
+        return types.SimpleNamespace(**{name: getattr(stac, name, None)})
+
+
+class _RasterCache:
+    """
+    get_images()の結果を保存するディスクキャッシュ。
+    
+    キーは(collection, band, dlim, ppu, bbox)から計算したSHA-256で、
+    合計サイズがmax_bytesを超えると最終アクセスの古いエントリから削除します（LRU）。
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pkl"
+
+    def get(self, key: str) -> Any:
+        """キャッシュを読み込みます。存在しない・壊れている場合はNoneを返します。"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except (pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # 壊れたエントリは削除して再取得させる
+            path.unlink(missing_ok=True)
+            with self._lock:
+                self.misses += 1
+            return None
+        
+        # LRU用にアクセス時刻を更新
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return value
+
+    def put(self, key: str, value: Any) -> bool:
+        """結果を保存します。pickle化できないオブジェクトの場合はFalseを返します。"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except (pickle.PicklingError, TypeError, AttributeError, OSError):
+            tmp_path.unlink(missing_ok=True)
+            return False
+        self._evict()
+        return True
+
+    def _entries(self) -> List[tuple]:
+        entries = []
+        for path in self.cache_dir.glob("*.pkl"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _evict(self) -> None:
+        """合計サイズが上限を超えている間、最も古いエントリから削除します。"""
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                self.evictions += 1
+
+    def clear(self) -> int:
+        """全エントリを削除し、削除した件数を返します。"""
+        with self._lock:
+            removed = 0
+            for _, _, path in self._entries():
+                path.unlink(missing_ok=True)
+                removed += 1
+            return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._entries()
+            lookups = self.hits + self.misses
+            return {
+                "cache_dir": str(self.cache_dir),
+                "entries": len(entries),
+                "size_bytes": sum(size for _, size, _ in entries),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+_RASTER_CACHE = _RasterCache(RASTER_CACHE_DIR, RASTER_CACHE_MAX_BYTES)
+
+
+class _SingleFlight:
+    """
+    同じキーで実行中の処理を1回にまとめる（single-flight）。
+    
+    先に到着した呼び出しだけが処理を実行し、実行中に到着した同じキーの呼び出しは
+    その結果（Future）を待って共有します。
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.deduplicated = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, func) -> tuple:
+        """
+        funcを実行して(結果, 共有された結果かどうか)を返します。
+        """
+        with self._lock:
+            self.calls += 1
+            future = self._inflight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                is_leader = False
+            else:
+                future = Future()
+                self._inflight[key] = future
+                is_leader = True
+        
+        if not is_leader:
+            return future.result(), True
+        
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "deduplicated": self.deduplicated,
+                "in_flight": len(self._inflight)
+            }
+
+
+_FETCH_SINGLE_FLIGHT = _SingleFlight()
+
+
+def _raster_query_key(
+    collection: str,
+    band: Optional[str],
+    dlim: Optional[List[str]],
+    ppu: Optional[float],
+    bbox: Optional[List[float]],
+    void_fill: Optional[str] = None
+) -> str:
+    """
+    取得クエリを正規化してキャッシュキー（SHA-256）を計算
+    
+    void_fillを指定した場合は欠損値の埋め方もキーに含めます（埋めた後のデータを保存する
+    _get_fetched_raster用。取得結果そのもののキャッシュでは指定しません）。
+    """
+    query = {
+        "collection": collection,
+        "band": band,
+        "dlim": list(dlim) if dlim else None,
+        "ppu": round(float(ppu), 6) if ppu else None,
+        "bbox": [round(float(v), 8) for v in bbox] if bbox else None
+    }
+    if void_fill is not None:
+        query["void_fill"] = void_fill
+    return hashlib.sha256(json.dumps(query, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _fetch_images(
+    collection: str,
+    band: Optional[str] = None,
+    dlim: Optional[List[str]] = None,
+    ppu: Optional[float] = None,
+    bbox: Optional[List[float]] = None,
+    geoj: Optional[Any] = None,
+    use_cache: bool = True
+) -> Any:
+    """
+    je.ImageCollectionの取得チェーンを組み立ててget_images()を実行する共通ヘルパー。
+    
+    全ツールはこの関数を経由して画像を取得し、同じクエリはディスクキャッシュから返します。
+    同じクエリが同時に実行された場合は1回だけ取得し、呼び出し元にはそれぞれの複製を返します。
+    GeoJSONで範囲を指定した場合はキャッシュを使用しません。
+    """
+    if geoj is not None:
+        return _fetch_images_uncached(collection, band, dlim, ppu, bbox, geoj)
+    
+    key = _raster_query_key(collection, band, dlim, ppu, bbox)
+    
+    def load() -> Any:
+        # recordモードでは応答を記録するため、キャッシュを読まずに必ず取得する
+        if use_cache and JAXA_EARTH_MODE != "record":
+            cached = _RASTER_CACHE.get(key)
+            if cached is not None:
+                return cached
+        result = _fetch_images_uncached(collection, band, dlim, ppu, bbox)
+        if use_cache:
+            _RASTER_CACHE.put(key, result)
+        return result
+    
+    # 同じクエリが実行中であれば、その結果を待って共有する
+    result, _ = _FETCH_SINGLE_FLIGHT.do(key, load)
+    # je.ImageProcessはrasterを書き換えるため、共有した結果には誰も手を加えず、
+    # 最初に取得した呼び出し元も含めて全員に複製を返す
+    return copy.deepcopy(result)
+
+
+_IMAGE_COLLECTIONS: Dict[str, Any] = {}
+_IMAGE_COLLECTIONS_LOCK = threading.Lock()
+
+
+def _image_collection(collection: str) -> Any:
+    """
+    共有HTTPセッションを使うje.ImageCollectionを返します。
+    
+    je.ImageCollectionはコンストラクタでSTACカタログのルートとコレクションのJSONを
+    毎回取得します。コレクションごとにコンストラクタの結果を1つだけ保持し、
+    そのシャローコピーを返すことで、以降の絞り込みと画像取得だけを実行します
+    （各filter_*は新しい属性を代入するだけなので、コピー間で状態は共有されません）。
+    """
+    with _IMAGE_COLLECTIONS_LOCK:
+        template = _IMAGE_COLLECTIONS.get(collection)
+        if template is None:
+            _install_jaxa_session()
+            template = je.ImageCollection(collection=collection, ssl_verify=True)
+            _IMAGE_COLLECTIONS[collection] = template
+    return copy.copy(template)
+
+
+def _fetch_images_uncached(
+    collection: str,
+    band: Optional[str],
+    dlim: Optional[List[str]],
+    ppu: Optional[float],
+    bbox: Optional[List[float]],
+    geoj: Optional[Any] = None
+) -> Any:
+    """je.ImageCollectionの取得チェーンを組み立ててget_images()を実行する"""
+    image_collection = _image_collection(collection)
+    if dlim:
+        image_collection = image_collection.filter_date(dlim=dlim)
+    if ppu:
+        image_collection = image_collection.filter_resolution(ppu=ppu)
+    if geoj is not None:
+        image_collection = image_collection.filter_bounds(geoj=geoj)
+    elif bbox:
+        image_collection = image_collection.filter_bounds(bbox=bbox)
+    if band:
+        image_collection = image_collection.select(band=band)
+    
+    return _FetchedImages(image_collection.get_images())
+
+
+# ============================================================================
+# 取得済みラスター（エクスポートセッション内で共有）
+# ============================================================================
+
+# プロセス内に保持する取得済みラスターの最大数
+FETCHED_RASTER_MAX_ENTRIES = int(os.environ.get("JAXA_FETCHED_RASTER_MAX_ENTRIES", "8"))
+
+# 取得済み高度データ（float32）をメモリマップ可能な.npyとして保存するディレクトリと上限サイズ
+RASTER_STORE_DIR = Path(os.environ.get("JAXA_RASTER_STORE_DIR", str(TEMP_DIR / "rasters")))
+RASTER_STORE_MAX_BYTES = int(float(os.environ.get("JAXA_RASTER_STORE_MAX_MB", "4096")) * 1024 * 1024)
+
+
+class _FetchedRaster:
+    """
+    取得済みの高度ラスター。
+    
+    raster_idはクエリのキャッシュキーと同じ値で、ツールの戻り値に含めることで
+    後続のエクスポートツールが同じラスターを再取得せずに使い回せます。
+    """
+
+    def __init__(
+        self,
+        raster_id: str,
+        collection: str,
+        band: Optional[str],
+        dlim: Optional[List[str]],
+        ppu: Optional[float],
+        bounds: List[float],
+        data: "np.ndarray",
+        latlim: Optional[List[float]] = None,
+        lonlim: Optional[List[float]] = None,
+        height_range: Optional[tuple] = None
+    ):
+        self.raster_id = raster_id
+        self.collection = collection
+        self.band = band
+        self.dlim = dlim
+        self.ppu = ppu
+        self.bounds = bounds
+        self.data = data
+        self.latlim = latlim
+        self.lonlim = lonlim
+        self._height_range = height_range
+
+    @property
+    def shape(self) -> tuple:
+        return tuple(self.data.shape)
+
+    @property
+    def height_range(self) -> tuple:
+        """(最小値, 最大値)。初回のみ計算し、以降は保存した値を返します。"""
+        if self._height_range is None:
+            self._height_range = (float(np.nanmin(self.data)), float(np.nanmax(self.data)))
+        return self._height_range
+
+    def header(self) -> Dict[str, Any]:
+        """メモリマップ保存用のヘッダー（JSON）"""
+        height_min, height_max = self.height_range
+        return {
+            "raster_id": self.raster_id,
+            "collection": self.collection,
+            "band": self.band,
+            "dlim": self.dlim,
+            "ppu": self.ppu,
+            "bounds": self.bounds,
+            "latlim": self.latlim,
+            "lonlim": self.lonlim,
+            "shape": list(self.shape),
+            "dtype": "float32",
+            "height_range": {"min": height_min, "max": height_max}
+        }
+
+
+class _RasterStore:
+    """
+    取得済み高度データをfloat32の.npy（と同名のJSONヘッダー）として保存するストア。
+    
+    読み込みはnp.load(mmap_mode='r')によるメモリマップで行うため、再エクスポートや
+    ビット深度を変えた再量子化、テクスチャ生成で再取得・再デコードが不要になります。
+    合計サイズがmax_bytesを超えると最終アクセスの古いものから削除します。
+    """
+
+    def __init__(self, store_dir: Path, max_bytes: int):
+        self.store_dir = Path(store_dir)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def _paths(self, raster_id: str) -> tuple:
+        return self.store_dir / f"{raster_id}.npy", self.store_dir / f"{raster_id}.json"
+
+    def load(self, raster_id: str) -> Optional[_FetchedRaster]:
+        """保存済みのラスターをメモリマップで開きます。存在しない場合はNoneを返します。"""
+        npy_path, header_path = self._paths(raster_id)
+        try:
+            with open(header_path, 'r', encoding='utf-8') as f:
+                header = json.load(f)
+            data = np.load(npy_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+        
+        try:
+            os.utime(npy_path)
+        except OSError:
+            pass
+        height_range = header.get("height_range") or {}
+        return _FetchedRaster(
+            raster_id=raster_id,
+            collection=header.get("collection"),
+            band=header.get("band"),
+            dlim=header.get("dlim"),
+            ppu=header.get("ppu"),
+            bounds=header.get("bounds"),
+            data=data,
+            latlim=header.get("latlim"),
+            lonlim=header.get("lonlim"),
+            height_range=(height_range["min"], height_range["max"]) if height_range else None
+        )
+
+    def save(self, fetched: _FetchedRaster) -> _FetchedRaster:
+        """ラスターを保存し、メモリマップで開き直したものを返します。"""
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        npy_path, header_path = self._paths(fetched.raster_id)
+        suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        tmp_npy = npy_path.with_name(npy_path.name + suffix)
+        tmp_header = header_path.with_name(header_path.name + suffix)
+        try:
+            with open(tmp_npy, 'wb') as f:
+                np.save(f, np.ascontiguousarray(fetched.data, dtype=np.float32))
+            with open(tmp_header, 'w', encoding='utf-8') as f:
+                json.dump(fetched.header(), f, indent=2, ensure_ascii=False)
+            os.replace(tmp_npy, npy_path)
+            os.replace(tmp_header, header_path)
+        except OSError:
+            tmp_npy.unlink(missing_ok=True)
+            tmp_header.unlink(missing_ok=True)
+            return fetched
+        self._evict()
+        return self.load(fetched.raster_id) or fetched
+
+    def _entries(self) -> List[tuple]:
+        entries = []
+        for npy_path in self.store_dir.glob("*.npy"):
+            try:
+                stat = npy_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, npy_path))
+        return entries
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, npy_path in entries:
+                if total <= self.max_bytes:
+                    break
+                npy_path.unlink(missing_ok=True)
+                npy_path.with_suffix(".json").unlink(missing_ok=True)
+                total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        entries = self._entries()
+        return {
+            "store_dir": str(self.store_dir),
+            "entries": len(entries),
+            "size_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes
+        }
+
+
+_RASTER_STORE = _RasterStore(RASTER_STORE_DIR, RASTER_STORE_MAX_BYTES)
+
+
+_FETCHED_RASTERS: "OrderedDict[str, _FetchedRaster]" = OrderedDict()
+_FETCHED_RASTERS_LOCK = threading.Lock()
+
+
+def _limits_to_list(limits: Any) -> Optional[List[float]]:
+    """raster.latlim/lonlim（numpy配列）をJSONに保存できる[最小, 最大]に変換"""
+    if limits is None:
+        return None
+    return [float(v) for v in np.asarray(limits, dtype=np.float64).reshape(-1)[:2]]
+
+
+def _raster_to_array(raster: Any) -> "np.ndarray":
+    """raster.img（形状: [日付, 緯度, 経度, チャンネル]）の最初の画像・チャンネルを2次元のfloat32配列に変換"""
+    data = np.asarray(raster.img, dtype=np.float32)
+    if data.ndim == 4:
+        data = data[0, :, :, 0]
+    elif data.ndim == 3:
+        data = data[0]
+    return data
+
+
+def _get_fetched_raster(
+    collection: str,
+    bounds: List[float],
+    resolution: Optional[float],
+    date_range: Optional[List[str]] = None,
+    band: str = "DSM",
+    raster_id: Optional[str] = None,
+    fill_voids: bool = True
+) -> _FetchedRaster:
+    """
+    取得済みラスターを返します。
+    
+    プロセス内→メモリマップ保存（_RASTER_STORE）の順に探し、どちらにもない場合のみ
+    _fetch_images()で取得します。raster_idが指定され、見つかる場合はそれを優先します。
+    新しく取得したデータは、fill_voidsがTrueなら保存前に欠損値を埋めます（_fill_voids）。
+    分類データなど補間してはいけないデータではFalseを指定してください。
+    埋め方（fill_voidsがFalseなら"none"、TrueならJAXA_VOID_FILL）はraster_idに含まれるため、
+    埋め方の異なるデータが取り違えられることはありません。
+    """
+    void_fill = VOID_FILL_MODE if fill_voids else "none"
+    key = raster_id or _raster_query_key(collection, band, date_range, resolution, bounds, void_fill)
+    with _FETCHED_RASTERS_LOCK:
+        fetched = _FETCHED_RASTERS.get(key)
+        if fetched is not None:
+            _FETCHED_RASTERS.move_to_end(key)
+            return fetched
+    
+    fetched = _RASTER_STORE.load(key) if JAXA_EARTH_MODE != "record" else None
+    if fetched is not None:
+        _remember_fetched_raster(fetched)
+        return fetched
+    
+    if resolution and len(_split_bbox_grid(bounds, resolution)) > 1:
+        # 広範囲はソースのタイル境界で分割して並列取得
+        data = _fetch_mosaic(collection, band, date_range, resolution, bounds)
+        latlim, lonlim = [bounds[1], bounds[3]], [bounds[0], bounds[2]]
+    else:
+        result = _fetch_images(collection, band=band, dlim=date_range, ppu=resolution, bbox=bounds)
+        raster = result.raster if hasattr(result, 'raster') else None
+        if not raster or not hasattr(raster, 'img'):
+            raise ValueError("高度データの取得に失敗しました")
+        data = _raster_to_array(raster)
+        latlim = _limits_to_list(getattr(raster, 'latlim', None))
+        lonlim = _limits_to_list(getattr(raster, 'lonlim', None))
+    
+    if fill_voids:
+        data = _fill_voids(data)[0]
+    
+    fetched = _FetchedRaster(
+        raster_id=_raster_query_key(collection, band, date_range, resolution, bounds, void_fill),
+        collection=collection,
+        band=band,
+        dlim=date_range,
+        ppu=resolution,
+        bounds=bounds,
+        data=data,
+        latlim=latlim,
+        lonlim=lonlim
+    )
+    # メモリマップ保存し、以降はファイルから直接参照する
+    fetched = _RASTER_STORE.save(fetched)
+    _remember_fetched_raster(fetched)
+    return fetched
+
+
+def _remember_fetched_raster(fetched: _FetchedRaster) -> None:
+    """プロセス内の取得済みラスターに登録（古いものから破棄）"""
+    with _FETCHED_RASTERS_LOCK:
+        _FETCHED_RASTERS[fetched.raster_id] = fetched
+        _FETCHED_RASTERS.move_to_end(fetched.raster_id)
+        while len(_FETCHED_RASTERS) > FETCHED_RASTER_MAX_ENTRIES:
+            _FETCHED_RASTERS.popitem(last=False)
+
+
+def _quantize_heights(
+    height_data: "np.ndarray",
+    bit_depth: int = 16,
+    height_range: Optional[tuple] = None
+) -> tuple:
+    """
+    高度データを指定ビット深度（8または16）の整数に正規化し、(配列, 最小値, 最大値)を返す。
+    
+    height_rangeを指定した場合は最小値・最大値の計算を省略し、その範囲で量子化します
+    （複数タイルで共通の範囲を使う場合、範囲外の値は両端に丸めます）。NaNは0になります。
+    """
+    if bit_depth not in (8, 16):
+        raise ValueError(f"bit_depthは8または16を指定してください: {bit_depth}")
+    if height_range is None:
+        height_range = (float(np.nanmin(height_data)), float(np.nanmax(height_data)))
+    height_min, height_max = float(height_range[0]), float(height_range[1])
+    height_span = height_max - height_min
+    if height_span <= 0:
+        height_span = 1.0
+    max_value = (1 << bit_depth) - 1
+    dtype = np.uint16 if bit_depth == 16 else np.uint8
+    height_normalized = np.subtract(height_data, height_min, dtype=np.float32)
+    height_normalized *= max_value / height_span
+    np.nan_to_num(height_normalized, copy=False, nan=0.0)
+    np.clip(height_normalized, 0, max_value, out=height_normalized)
+    return height_normalized.astype(dtype), height_min, height_max
+
+
+def _normalize_to_uint16(height_data: "np.ndarray", height_range: Optional[tuple] = None) -> tuple:
+    """高度データを0-65535に正規化し、(uint16配列, 最小値, 最大値)を返す"""
+    return _quantize_heights(height_data, 16, height_range)
+
+
+def _resample_grid(
+    height_data: "np.ndarray",
+    rows: int,
+    cols: int,
+    kernel: str = "bilinear"
+) -> "np.ndarray":
+    """高度データを(rows, cols)に再サンプリング（NaNを除外して補間し、残ったNaNは最小値で埋める）"""
+    grid = _resample(height_data, rows, cols, kernel)
+    if np.isnan(grid).any():
+        fill = np.nanmin(grid) if not np.isnan(grid).all() else 0.0
+        np.nan_to_num(grid, copy=False, nan=fill)
+    return grid
+
+
+# ============================================================================
+# 再サンプリング（全エクスポート共通）
+# ============================================================================
+
+# 1回に処理する行数と並列スレッド数
+RESAMPLE_CHUNK_ROWS = int(os.environ.get("JAXA_RESAMPLE_CHUNK_ROWS", "256"))
+RESAMPLE_MAX_WORKERS = int(os.environ.get("JAXA_RESAMPLE_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+_RESAMPLE_KERNELS = ("box", "bilinear", "lanczos", "area")
+# カーネルの半径（出力ピクセル単位ではなく、縮小率を掛ける前の入力ピクセル単位）
+_RESAMPLE_SUPPORT = {"box": 0.5, "bilinear": 1.0, "lanczos": 3.0}
+
+
+def _resample_weights(src: int, dst: int, kernel: str, positive: bool = False) -> tuple:
+    """
+    1軸分の再サンプリングの重みを計算します。
+    
+    出力ピクセルiの中心は入力の(i + 0.5) * src / dstです。縮小時はカーネルを縮小率だけ
+    広げて（アンチエイリアス）、areaは出力ピクセルが覆う入力ピクセルの面積を重みにします。
+    範囲外の入力は端のピクセルを参照します。positiveがTrueなら負の重み（lanczosの
+    負のローブ）を0にしてから正規化します。
+    
+    Returns:
+        (入力インデックス (dst, タップ数), 重み (dst, タップ数) float32)
+    """
+    scale = src / dst
+    centers = (np.arange(dst, dtype=np.float64) + 0.5) * scale
+    if kernel == "area":
+        lo = np.arange(dst, dtype=np.float64) * scale
+        hi = lo + scale
+        taps = int(np.ceil(scale)) + 1
+        index = np.floor(lo).astype(np.intp)[:, None] + np.arange(taps)
+        overlap = np.minimum(hi[:, None], index + 1.0) - np.maximum(lo[:, None], index.astype(np.float64))
+        weights = np.clip(overlap, 0.0, None)
+    else:
+        stretch = max(scale, 1.0)
+        support = _RESAMPLE_SUPPORT[kernel] * stretch
+        taps = int(np.ceil(2.0 * support)) + 1
+        index = np.floor(centers - support).astype(np.intp)[:, None] + np.arange(taps)
+        x = (index + 0.5 - centers[:, None]) / stretch
+        if kernel == "box":
+            weights = ((x >= -0.5) & (x < 0.5)).astype(np.float64)
+        elif kernel == "bilinear":
+            weights = np.clip(1.0 - np.abs(x), 0.0, None)
+        else:
+            weights = np.where(np.abs(x) < 3.0, np.sinc(x) * np.sinc(x / 3.0), 0.0)
+    if positive:
+        weights = np.clip(weights, 0.0, None)
+    weights /= weights.sum(axis=1, keepdims=True)
+    return np.clip(index, 0, src - 1), weights.astype(np.float32)
+
+
+def _resample_matrix(src: int, dst: int, kernel: str, positive: bool = False) -> Any:
+    """1軸分の重みを帯状の疎行列（CSR、dst×src）にまとめる（端で重なるインデックスは合算）"""
+    index, weights = _resample_weights(src, dst, kernel, positive)
+    rows = np.repeat(np.arange(dst), index.shape[1])
+    return sparse.csr_matrix((weights.ravel(), (rows, index.ravel())), shape=(dst, src), dtype=np.float32)
+
+
+def _resample_axis0(data: "np.ndarray", dst: int, kernel: str) -> "np.ndarray":
+    """
+    軸0をdstに再サンプリングします（残りの軸はまとめて列として扱う）。
+    
+    疎行列との積を出力のRESAMPLE_CHUNK_ROWS行ずつに分け、スレッドプールで並列に計算します。
+    NaNがある場合は、NaNを0にした値と有効フラグのそれぞれに重みを掛け、重みの合計で割ります。
+    
+    lanczosは負のローブがあるため、NaNを除いた重みの合計が打ち消し合って0に近づくと値が
+    発散します。入力にNaNを含む出力は負の重みを0にしたカーネル（positive）で計算し直し、
+    さらに全ての出力を、参照した有効な入力の最小値・最大値の範囲に収めます。
+    """
+    src = data.shape[0]
+    raw = np.ascontiguousarray(data, dtype=np.float32).reshape(src, -1)
+    matrix = _resample_matrix(src, dst, kernel)
+    nan_mask = np.isnan(raw)
+    values = raw
+    valid = None
+    positive = None
+    if nan_mask.any():
+        values = np.where(nan_mask, np.float32(0.0), raw)
+        valid = (~nan_mask).astype(np.float32)
+        if kernel == "lanczos":
+            positive = _resample_matrix(src, dst, kernel, positive=True)
+            support = matrix.copy()
+            support.data = (support.data != 0).astype(np.float32)
+            invalid = nan_mask.astype(np.float32)
+    del nan_mask
+    index = _resample_weights(src, dst, kernel)[0] if kernel == "lanczos" else None
+    out = np.empty((dst, values.shape[1]), dtype=np.float32)
+    
+    def run(start: int, stop: int) -> None:
+        block = matrix[start:stop]
+        out[start:stop] = block @ values
+        if valid is not None:
+            total = block @ valid
+            if positive is not None:
+                # NaNを参照する出力だけ、正の重みで計算した値に置き換える
+                touched = (support[start:stop] @ invalid) > 0
+                positive_block = positive[start:stop]
+                out[start:stop][touched] = (positive_block @ values)[touched]
+                total[touched] = (positive_block @ valid)[touched]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                np.divide(out[start:stop], total, out=out[start:stop])
+            out[start:stop][total <= 1e-3] = np.nan
+        if index is not None:
+            # 参照した入力の範囲に収める（リンギングによる行き過ぎを防ぐ）
+            low = np.full((stop - start, values.shape[1]), np.nan, dtype=np.float32)
+            high = low.copy()
+            for tap in range(index.shape[1]):
+                taps = raw[index[start:stop, tap]]
+                np.fmin(low, taps, out=low)
+                np.fmax(high, taps, out=high)
+            with np.errstate(invalid='ignore'):
+                np.clip(out[start:stop], low, high, out=out[start:stop])
+    
+    chunk = max(1, RESAMPLE_CHUNK_ROWS)
+    ranges = [(start, min(dst, start + chunk)) for start in range(0, dst, chunk)]
+    workers = max(1, min(RESAMPLE_MAX_WORKERS, len(ranges)))
+    if workers == 1:
+        for start, stop in ranges:
+            run(start, stop)
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jaxa-resample") as executor:
+            for future in [executor.submit(run, start, stop) for start, stop in ranges]:
+                future.result()
+    return out.reshape((dst,) + data.shape[1:])
+
+
+def _resample(data: "np.ndarray", rows: int, cols: int, kernel: str = "bilinear") -> "np.ndarray":
+    """
+    2次元（または末尾にチャンネルを持つ3次元）の配列を(rows, cols)にfloat32で再サンプリングします。
+    
+    kernelは"box"、"bilinear"、"lanczos"（a=3）、"area"（面積平均）から選びます。
+    縦横に分けて1軸ずつ帯状の疎行列との積で計算し（出力が小さくなる軸を先に処理）、
+    NaNは重みから除外して、有効な入力がない出力ピクセルだけがNaNになります。
+    """
+    if kernel not in _RESAMPLE_KERNELS:
+        raise ValueError(f"未対応の再サンプリングカーネルです: {kernel}（対応: {', '.join(_RESAMPLE_KERNELS)}）")
+    rows, cols = max(1, int(rows)), max(1, int(cols))
+    data = np.asarray(data)
+    src_rows, src_cols = data.shape[:2]
+    
+    def resample_rows(current: "np.ndarray") -> "np.ndarray":
+        if current.shape[0] == rows:
+            return current
+        return _resample_axis0(current, rows, kernel)
+    
+    def resample_cols(current: "np.ndarray") -> "np.ndarray":
+        if current.shape[1] == cols:
+            return current
+        return np.swapaxes(_resample_axis0(np.swapaxes(current, 0, 1), cols, kernel), 0, 1)
+    
+    # 中間結果が小さくなる順に処理
+    if rows * src_cols <= src_rows * cols:
+        result = resample_cols(resample_rows(data))
+    else:
+        result = resample_rows(resample_cols(data))
+    return np.ascontiguousarray(result, dtype=np.float32)
+
+
+def _resample_nearest(data: "np.ndarray", rows: int, cols: int) -> "np.ndarray":
+    """分類データ向けに最近傍で(rows, cols)に再サンプリング"""
+    src_rows, src_cols = data.shape
+    row_index = ((np.arange(rows) + 0.5) * src_rows / rows).astype(np.intp)
+    col_index = ((np.arange(cols) + 0.5) * src_cols / cols).astype(np.intp)
+    return np.asarray(data)[row_index[:, None], col_index[None, :]]
+
+
+def _output_shape(bounds: List[float], longest: int) -> tuple:
+    """範囲の実寸の縦横比を保ち、長い辺がlongestピクセルになる(行数, 列数)"""
+    width, depth = _bounds_size_meters(bounds)
+    if width >= depth:
+        return max(1, int(round(longest * depth / width))), longest
+    return longest, max(1, int(round(longest * width / depth)))
+
+
+# ============================================================================
+# 欠損値（ボイド）の補間
+# ============================================================================
+
+# 量子化前の欠損値の埋め方（"inpaint": ピラミッド補間、"min": 最小値、"none": 埋めない）
+VOID_FILL_MODE = os.environ.get("JAXA_VOID_FILL", "inpaint")
+# ピラミッドの各レベルで欠損部分だけに掛ける平滑化（ヤコビ法）の反復回数
+VOID_FILL_RELAX_ITERATIONS = int(os.environ.get("JAXA_VOID_FILL_RELAX_ITERATIONS", "4"))
+# 帯ごとに埋める際に前後の帯から重ねる行数（のりしろ）
+VOID_FILL_HALO_ROWS = int(os.environ.get("JAXA_VOID_FILL_HALO_ROWS", "128"))
+
+
+def _upsample_at(coarse: "np.ndarray", rows: "np.ndarray", cols: "np.ndarray") -> "np.ndarray":
+    """1/2のレベルcoarseを、細かいレベルの画素(rows, cols)の中心で双線形に補間"""
+    def axis(index: "np.ndarray", size: int) -> tuple:
+        position = (index + 0.5) / 2.0 - 0.5
+        lower = np.floor(position)
+        weight = (position - lower).astype(np.float32)
+        lower = lower.astype(np.intp)
+        return np.clip(lower, 0, size - 1), np.clip(lower + 1, 0, size - 1), weight
+    
+    r0, r1, wr = axis(rows, coarse.shape[0])
+    c0, c1, wc = axis(cols, coarse.shape[1])
+    top = coarse[r0, c0] * (1.0 - wc) + coarse[r0, c1] * wc
+    bottom = coarse[r1, c0] * (1.0 - wc) + coarse[r1, c1] * wc
+    return top * (1.0 - wr) + bottom * wr
+
+
+def _relax_voids(level: "np.ndarray", rows: "np.ndarray", cols: "np.ndarray", iterations: int) -> None:
+    """欠損だった画素だけを上下左右の平均で置き換える（有効な画素は変更しない）"""
+    if iterations <= 0:
+        return
+    height, width = level.shape
+    flat = level.reshape(-1)
+    index = rows * width + cols
+    up = np.maximum(rows - 1, 0) * width + cols
+    down = np.minimum(rows + 1, height - 1) * width + cols
+    left = rows * width + np.maximum(cols - 1, 0)
+    right = rows * width + np.minimum(cols + 1, width - 1)
+    values = np.empty(len(index), dtype=np.float32)
+    for _ in range(iterations):
+        np.take(flat, up, out=values)
+        values += flat[down]
+        values += flat[left]
+        values += flat[right]
+        values *= 0.25
+        flat[index] = values
+
+
+def _fill_voids(
+    data: "np.ndarray",
+    mode: Optional[str] = None,
+    inplace: bool = False
+) -> tuple:
+    """
+    高度データの欠損値（NaN）を量子化の前に埋めます。
+    
+    "inpaint"はプッシュプル法のピラミッド補間です。NaNを除いた2×2平均（_downsample_2x）で
+    欠損がなくなるまで縮小し、粗いレベルから順に、欠損画素だけを1つ粗いレベルの双線形補間で
+    埋めて数回平滑化します。各レベルの処理量は画素数（欠損部分は欠損画素数）に比例するため、
+    全体でもほぼ線形時間です。有効な画素の値は変わりません。
+    
+    inplaceがTrueならdataを直接書き換えます（メモリマップの一時ファイル向け）。
+    
+    Returns:
+        (埋めた配列, 埋めた画素数)
+    """
+    mode = mode or VOID_FILL_MODE
+    if mode not in ("inpaint", "min", "none"):
+        raise ValueError(f"未対応の欠損値の埋め方です: {mode}（対応: inpaint, min, none）")
+    voids = np.isnan(data)
+    void_count = int(voids.sum())
+    if mode == "none" or void_count == 0 or void_count == voids.size:
+        return data, 0
+    
+    filled = data if inplace else np.array(data, dtype=np.float32)
+    if mode == "min":
+        filled[voids] = np.nanmin(data)
+        return filled, void_count
+    del voids
+    
+    levels = [filled]
+    while max(levels[-1].shape) > 1 and np.isnan(levels[-1]).any():
+        levels.append(_downsample_2x(levels[-1]))
+    
+    for depth in range(len(levels) - 2, -1, -1):
+        level = levels[depth]
+        rows, cols = np.nonzero(np.isnan(level))
+        if len(rows) == 0:
+            continue
+        level[rows, cols] = _upsample_at(levels[depth + 1], rows, cols)
+        _relax_voids(level, rows, cols, VOID_FILL_RELAX_ITERATIONS)
+    return filled, void_count
+
+
+def _fill_voids_banded(bands, halo: Optional[int] = None):
+    """
+    北から順に(開始行, 終了行, 高度データ)を受け取り、欠損値を埋めた帯を同じ順に返すジェネレーター。
+    
+    各帯は、上下にhalo行ずつ（未補間の）前後の帯を重ねた窓で埋め、帯の部分だけを返します。
+    下側は必要なだけ帯を先読みし、窓の先頭はピラミッドの縮小の区切りが全体で埋めた場合と
+    揃うように全体の行番号で揃えるため、縦方向の大きさがhalo行程度までの欠損は全体で
+    埋めた場合とほぼ同じ値になり、帯の境界でも途切れません。それより大きい欠損は
+    窓の外の値を参照できないため、全体で埋めた場合と差が出ます（合成地形での計測では、
+    halo=128行のとき最大0.2m程度、256行でほぼ0）。窓全体が欠損の帯はNaNのまま返します。
+    
+    メモリ使用量は帯1つ分と上下のりしろ（先読みした帯）に収まります。
+    "min"・"none"では何もしません（帯の量子化でNaNは高さ範囲の最小値になるため、
+    全体の最小値で埋めた場合と同じ結果になります）。
+    """
+    if VOID_FILL_MODE != "inpaint":
+        yield from bands
+        return
+    halo = max(0, VOID_FILL_HALO_ROWS if halo is None else halo)
+    # 窓の先頭を揃える行数（halo以下の2の累乗）
+    align = 1 << (halo.bit_length() - 1) if halo > 0 else 1
+    source = iter(bands)
+    pending: List[tuple] = []
+    above = None  # 直前までの帯の末尾（未補間）
+    exhausted = False
+    while True:
+        # 現在の帯の下にhalo行そろうまで先読みする
+        while not exhausted and (not pending or sum(len(band[2]) for band in pending[1:]) < halo):
+            band = next(source, None)
+            if band is None:
+                exhausted = True
+            else:
+                pending.append(band)
+        if not pending:
+            return
+        row_start, row_end, data = pending.pop(0)
+        if above is not None:
+            above = above[(len(above) - row_start) % align:]
+        top = 0 if above is None else len(above)
+        parts = [above] if above is not None else []
+        parts.append(data)
+        needed = halo
+        for _, _, following in pending:
+            if needed <= 0:
+                break
+            parts.append(following[:needed])
+            needed -= len(parts[-1])
+        window = np.concatenate(parts).astype(np.float32, copy=False) if len(parts) > 1 else np.array(data, dtype=np.float32)
+        # 次の帯の上側ののりしろには、埋める前の値を使う
+        above = window[:top + len(data)][-(halo + align - 1):].copy() if halo > 0 else None
+        _fill_voids(window, inplace=True)
+        yield row_start, row_end, window[top:top + len(data)]
+
+
+# ============================================================================
+# タイル分割・ストリーミング書き出し（大きな範囲の高度マップ用）
+# ============================================================================
+
+# 1回に処理する帯（行方向のタイル）の最大ピクセル数
+TILED_BAND_MAX_PIXELS = int(os.environ.get("JAXA_TILED_BAND_MAX_PIXELS", str(4 * 1024 * 1024)))
+# このピクセル数を超える場合は自動的にタイルモードで生成
+TILED_HEIGHTMAP_AUTO_PIXELS = int(os.environ.get("JAXA_TILED_HEIGHTMAP_AUTO_PIXELS", str(64 * 1024 * 1024)))
+
+
+def _grid_shape(bounds: List[float], ppu: float) -> tuple:
+    """範囲と解像度(ppu)から出力グリッドの(行数, 列数)を計算"""
+    rows = max(1, int(round((bounds[3] - bounds[1]) * ppu)))
+    cols = max(1, int(round((bounds[2] - bounds[0]) * ppu)))
+    return rows, cols
+
+
+def _iter_row_bands(bounds: List[float], ppu: float, max_pixels: Optional[int] = None):
+    """
+    範囲を北から南への帯に分割し、(開始行, 終了行, 帯の範囲)を順に返す。
+    帯の境界はピクセル境界（1/ppu度単位）に揃えます。
+    """
+    rows, cols = _grid_shape(bounds, ppu)
+    rows_per_band = max(1, (max_pixels or TILED_BAND_MAX_PIXELS) // cols)
+    for row_start in range(0, rows, rows_per_band):
+        row_end = min(rows, row_start + rows_per_band)
+        band_bounds = [
+            bounds[0],
+            bounds[3] - row_end / ppu,
+            bounds[2],
+            bounds[3] - row_start / ppu
+        ]
+        yield row_start, row_end, band_bounds
+
+
+def _fit_to_shape(data: "np.ndarray", rows: int, cols: int) -> "np.ndarray":
+    """取得結果を期待する形状に切り詰め、不足分はNaNで埋める"""
+    if data.shape == (rows, cols):
+        return data
+    fitted = np.full((rows, cols), np.nan, dtype=np.float32)
+    r = min(rows, data.shape[0])
+    c = min(cols, data.shape[1])
+    fitted[:r, :c] = data[:r, :c]
+    return fitted
+
+
+# ============================================================================
+# 並列タイル取得（広範囲の取得用）
+# ============================================================================
+
+# 並列取得のワーカー数・ホストごとの同時接続数・分割単位（ソースのCOGタイルに合わせて度単位）
+FETCH_MAX_WORKERS = int(os.environ.get("JAXA_FETCH_WORKERS", "8"))
+FETCH_PER_HOST_LIMIT = int(os.environ.get("JAXA_FETCH_PER_HOST", "4"))
+FETCH_TILE_DEGREES = float(os.environ.get("JAXA_FETCH_TILE_DEGREES", "1.0"))
+JAXA_DATA_HOST = "data.earth.jaxa.jp"
+
+_HOST_SEMAPHORES: Dict[str, threading.BoundedSemaphore] = {}
+_HOST_SEMAPHORES_LOCK = threading.Lock()
+
+
+def _host_semaphore(host: str) -> threading.BoundedSemaphore:
+    """ホストごとの同時接続数を制限するセマフォを返す"""
+    with _HOST_SEMAPHORES_LOCK:
+        semaphore = _HOST_SEMAPHORES.get(host)
+        if semaphore is None:
+            semaphore = threading.BoundedSemaphore(FETCH_PER_HOST_LIMIT)
+            _HOST_SEMAPHORES[host] = semaphore
+        return semaphore
+
+
+def _grid_cuts(start: float, end: float, ppu: float, tile_degrees: float) -> List[int]:
+    """tile_degreesの倍数の経緯度線を、startを原点とするピクセル境界に変換"""
+    total = max(1, int(round((end - start) * ppu)))
+    cuts = {0, total}
+    line = (int(start // tile_degrees) + 1) * tile_degrees
+    while line < end:
+        cuts.add(int(round((line - start) * ppu)))
+        line += tile_degrees
+    return sorted(c for c in cuts if 0 <= c <= total)
+
+
+def _split_bbox_grid(bounds: List[float], ppu: float, tile_degrees: Optional[float] = None) -> List[tuple]:
+    """
+    範囲をソースのタイル境界に揃えた格子に分割します。
+    
+    Returns:
+        (行オフセット, 列オフセット, 行数, 列数, 部分範囲)のリスト（行は北から南）
+    """
+    tile_degrees = tile_degrees or FETCH_TILE_DEGREES
+    col_cuts = _grid_cuts(bounds[0], bounds[2], ppu, tile_degrees)
+    # 緯度は北（max_lat）を原点とするため、符号を反転して同じ計算を行う
+    row_cuts = _grid_cuts(-bounds[3], -bounds[1], ppu, tile_degrees)
+    
+    tiles = []
+    for r0, r1 in zip(row_cuts[:-1], row_cuts[1:]):
+        if r1 <= r0:
+            continue
+        for c0, c1 in zip(col_cuts[:-1], col_cuts[1:]):
+            if c1 <= c0:
+                continue
+            tile_bounds = [
+                bounds[0] + c0 / ppu,
+                bounds[3] - r1 / ppu,
+                bounds[0] + c1 / ppu,
+                bounds[3] - r0 / ppu
+            ]
+            tiles.append((r0, c0, r1 - r0, c1 - c0, tile_bounds))
+    return tiles
+
+
+def _place_tile(
+    data: "np.ndarray",
+    rows: int,
+    cols: int,
+    bbox: List[float],
+    ppu: float,
+    raster: Any
+) -> "np.ndarray":
+    """
+    取得結果を、返された範囲（raster.latlim/lonlim）の北西の角の位置に合わせて(rows, cols)の配列に配置します。
+    
+    範囲が返されない場合は北西の角に揃えます。はみ出した部分は切り詰め、不足分はNaNで埋めます。
+    形状や位置が1ピクセルより大きくずれている場合は、モザイクの継ぎ目がずれるため標準エラーに警告します。
+    """
+    latlim = _limits_to_list(getattr(raster, 'latlim', None))
+    lonlim = _limits_to_list(getattr(raster, 'lonlim', None))
+    row_offset = col_offset = 0
+    if latlim and lonlim:
+        row_offset = int(round((bbox[3] - max(latlim)) * ppu))
+        col_offset = int(round((min(lonlim) - bbox[0]) * ppu))
+    if data.shape == (rows, cols) and row_offset == 0 and col_offset == 0:
+        return data
+    mismatch = max(
+        abs(row_offset), abs(col_offset), abs(data.shape[0] - rows), abs(data.shape[1] - cols)
+    )
+    if mismatch > 1:
+        print(
+            f"[fetch] 取得結果の形状・位置が要求と{mismatch}ピクセル異なります: 範囲={bbox} "
+            f"要求={rows}x{cols} 取得={data.shape[0]}x{data.shape[1]} ずれ=({row_offset}, {col_offset})",
+            file=sys.stderr,
+            flush=True
+        )
+    placed = np.full((rows, cols), np.nan, dtype=np.float32)
+    dst_row, dst_col = max(0, row_offset), max(0, col_offset)
+    src_row, src_col = max(0, -row_offset), max(0, -col_offset)
+    n_rows = min(rows - dst_row, data.shape[0] - src_row)
+    n_cols = min(cols - dst_col, data.shape[1] - src_col)
+    if n_rows > 0 and n_cols > 0:
+        placed[dst_row:dst_row + n_rows, dst_col:dst_col + n_cols] = (
+            data[src_row:src_row + n_rows, src_col:src_col + n_cols]
+        )
+    return placed
+
+
+def _fetch_tile_array(
+    collection: str,
+    band: Optional[str],
+    dlim: Optional[List[str]],
+    ppu: float,
+    bbox: List[float],
+    rows: int,
+    cols: int
+) -> "np.ndarray":
+    """部分範囲を1枚取得し、期待する形状の2次元配列として返す"""
+    with _host_semaphore(JAXA_DATA_HOST):
+        result = _fetch_images(collection, band=band, dlim=dlim, ppu=ppu, bbox=bbox)
+    raster = result.raster if hasattr(result, 'raster') else None
+    if not raster or not hasattr(raster, 'img'):
+        raise ValueError(f"データの取得に失敗しました: {bbox}")
+    return _place_tile(_raster_to_array(raster), rows, cols, bbox, ppu, raster)
+
+
+def _fetch_mosaic(
+    collection: str,
+    band: Optional[str],
+    dlim: Optional[List[str]],
+    ppu: float,
+    bounds: List[float],
+    max_workers: Optional[int] = None,
+    tile_degrees: Optional[float] = None
+) -> "np.ndarray":
+    """
+    範囲を格子に分割してスレッドプールで並列に取得し、1枚の配列に結合します。
+    
+    各部分範囲は_fetch_images()を経由するため、キャッシュも部分範囲単位で共有されます。
+    """
+    rows, cols = _grid_shape(bounds, ppu)
+    tiles = _split_bbox_grid(bounds, ppu, tile_degrees)
+    if len(tiles) == 1:
+        return _fetch_tile_array(collection, band, dlim, ppu, bounds, rows, cols)
+    
+    mosaic = np.full((rows, cols), np.nan, dtype=np.float32)
+    workers = max(1, min(max_workers or FETCH_MAX_WORKERS, len(tiles)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jaxa-fetch") as executor:
+        futures = {
+            executor.submit(_fetch_tile_array, collection, band, dlim, ppu, tile_bounds, tile_rows, tile_cols):
+                (r0, c0, tile_rows, tile_cols)
+            for r0, c0, tile_rows, tile_cols, tile_bounds in tiles
+        }
+        for future in as_completed(futures):
+            r0, c0, tile_rows, tile_cols = futures[future]
+            mosaic[r0:r0 + tile_rows, c0:c0 + tile_cols] = future.result()
+    return mosaic
+
+
+class _StreamingPNGWriter:
+    """
+    16bitグレースケールPNGを行単位で書き出すライター。
+    
+    PILは画像全体をメモリに載せる必要があるため、IDATチャンクをzlibで
+    逐次圧縮して書き込みます（フィルタはUp）。
+    """
+
+    def __init__(self, path: str, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.rows_written = 0
+        self._file = open(path, 'wb')
+        self._compressor = zlib.compressobj(6)
+        self._prev_row = np.zeros(width * 2, dtype=np.uint8)
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        # IHDR: 幅, 高さ, ビット深度16, グレースケール, 圧縮0, フィルタ0, インターレースなし
+        self._write_chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 16, 0, 0, 0, 0))
+
+    def _write_chunk(self, chunk_type: bytes, data: bytes) -> None:
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(chunk_type)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(chunk_type)) & 0xFFFFFFFF))
+
+    def write_rows(self, rows: "np.ndarray") -> None:
+        """uint16の行（形状: [n, width]）を追記"""
+        row_bytes = np.ascontiguousarray(rows, dtype='>u2').view(np.uint8).reshape(rows.shape[0], self.width * 2)
+        filtered = np.empty((rows.shape[0], self.width * 2 + 1), dtype=np.uint8)
+        filtered[:, 0] = 2  # Upフィルタ
+        np.subtract(row_bytes[0], self._prev_row, out=filtered[0, 1:])
+        np.subtract(row_bytes[1:], row_bytes[:-1], out=filtered[1:, 1:])
+        self._prev_row = row_bytes[-1].copy()
+        
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._write_chunk(b"IDAT", data)
+        self.rows_written += rows.shape[0]
+
+    def close(self) -> None:
+        self._write_chunk(b"IDAT", self._compressor.flush())
+        self._write_chunk(b"IEND", b"")
+        self._file.close()
+
+    def __enter__(self) -> "_StreamingPNGWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self._file.close()
+
+
+def _generate_heightmap_tiled(
+    collection: str,
+    bounds: List[float],
+    resolution: float,
+    date_range: Optional[List[str]],
+    output_path: str,
+    raw_path: Optional[str] = None,
+    height_range: Optional[List[float]] = None
+) -> Dict[str, Any]:
+    """
+    範囲を帯に分割して高度マップを生成します。
+    
+    1パス目で各帯を取得して一時ファイル（メモリマップ）に書き出しつつ全体の最小値・最大値を求め、
+    2パス目で帯ごとに正規化してPNG/RAWへ書き出すため、ピーク時のメモリ使用量は帯1つ分に収まります。
+    height_rangeが指定されている場合は1パスで取得・書き出しを行います。
+    """
+    rows, cols = _grid_shape(bounds, resolution)
+    bands = list(_iter_row_bands(bounds, resolution))
+    if height_range is not None:
+        return _generate_heightmap_single_pass(
+            collection, bounds, resolution, date_range, output_path, raw_path, height_range, bands
+        )
+    spill_path = Path(output_path).with_name(f".{Path(output_path).name}.{os.getpid()}.spill.npy")
+    
+    height_min = np.inf
+    height_max = -np.inf
+    try:
+        spill = np.lib.format.open_memmap(spill_path, mode='w+', dtype=np.float32, shape=(rows, cols))
+        
+        # 1パス目: 取得と最小値・最大値の集計
+        for row_start, row_end, band_bounds in bands:
+            band_data = _fit_to_shape(
+                _fetch_mosaic(collection, "DSM", date_range, resolution, band_bounds),
+                row_end - row_start,
+                cols
+            )
+            spill[row_start:row_end] = band_data
+            if not np.all(np.isnan(band_data)):
+                height_min = min(height_min, float(np.nanmin(band_data)))
+                height_max = max(height_max, float(np.nanmax(band_data)))
+        
+        if not np.isfinite(height_min):
+            raise ValueError("高度データの取得に失敗しました")
+        
+        # 帯ごとに欠損値を埋める（補間値は有効な値の範囲内に収まるため、最小値・最大値は変わらない）
+        remaining = False
+        for row_start, row_end, band_data in _fill_voids_banded(
+            (row_start, row_end, spill[row_start:row_end]) for row_start, row_end, _ in bands
+        ):
+            spill[row_start:row_end] = band_data
+            remaining = remaining or bool(np.isnan(band_data).any())
+        if remaining and VOID_FILL_MODE == "inpaint":
+            # 北側の帯が窓全体で欠損だった場合は、南から北へ（上下を反転して）もう一度埋める
+            for row_start, row_end, band_data in _fill_voids_banded(
+                (rows - row_end, rows - row_start, spill[row_start:row_end][::-1])
+                for row_start, row_end, _ in reversed(bands)
+            ):
+                spill[rows - row_end:rows - row_start] = band_data[::-1]
+        spill.flush()
+        
+        # 2パス目: 帯ごとに正規化して書き出し
+        raw_file = open(raw_path, 'wb') if raw_path else None
+        try:
+            with _StreamingPNGWriter(output_path, cols, rows) as writer:
+                for row_start, row_end, _ in bands:
+                    band_uint16 = _quantize_heights(spill[row_start:row_end], 16, (height_min, height_max))[0]
+                    writer.write_rows(band_uint16)
+                    if raw_file:
+                        band_uint16.astype('<u2', copy=False).tofile(raw_file)
+        finally:
+            if raw_file:
+                raw_file.close()
+        del spill
+    finally:
+        spill_path.unlink(missing_ok=True)
+    
+    return {
+        "success": True,
+        "output_path": output_path,
+        "raw_path": raw_path,
+        "shape": (rows, cols),
+        "height_range": {
+            "min": height_min,
+            "max": height_max
+        },
+        "bounds": bounds,
+        "tiled": True,
+        "band_count": len(bands)
+    }
+
+
+def _generate_heightmap_single_pass(
+    collection: str,
+    bounds: List[float],
+    resolution: float,
+    date_range: Optional[List[str]],
+    output_path: str,
+    raw_path: Optional[str],
+    height_range: List[float],
+    bands: List[tuple]
+) -> Dict[str, Any]:
+    """高さ範囲が既知の場合のタイルモード（帯ごとに取得→量子化→書き出し）"""
+    rows, cols = _grid_shape(bounds, resolution)
+    height_min, height_max = float(height_range[0]), float(height_range[1])
+    fetched = (
+        (row_start, row_end, _fit_to_shape(
+            _fetch_mosaic(collection, "DSM", date_range, resolution, band_bounds),
+            row_end - row_start,
+            cols
+        ))
+        for row_start, row_end, band_bounds in bands
+    )
+    raw_file = open(raw_path, 'wb') if raw_path else None
+    try:
+        with _StreamingPNGWriter(output_path, cols, rows) as writer:
+            # 1パスでは全体を保持しないため、欠損値は次の帯を1つ先に取得して、のりしろを重ねて埋める
+            # （全て欠損の帯は量子化で最小値になる）
+            for row_start, row_end, band_data in _fill_voids_banded(fetched):
+                band_uint16 = _quantize_heights(band_data, 16, (height_min, height_max))[0]
+                writer.write_rows(band_uint16)
+                if raw_file:
+                    band_uint16.astype('<u2', copy=False).tofile(raw_file)
+    finally:
+        if raw_file:
+            raw_file.close()
+    
+    return {
+        "success": True,
+        "output_path": output_path,
+        "raw_path": raw_path,
+        "shape": (rows, cols),
+        "height_range": {
+            "min": height_min,
+            "max": height_max
+        },
+        "bounds": bounds,
+        "tiled": True,
+        "band_count": len(bands)
+    }
+
+
+# ============================================================================
+# 共通の高さ範囲（複数タイルの正規化）
+# ============================================================================
+
+# 地域ごとに計算した高さ範囲の保存先
+HEIGHT_RANGE_CACHE_PATH = Path(os.environ.get("JAXA_HEIGHT_RANGE_CACHE", str(TEMP_DIR / "height_ranges.json")))
+
+
+class _HeightRangeCache:
+    """
+    複数タイルからなる地域の高さ範囲（最小値・最大値）をJSONファイルに保存するキャッシュ。
+    
+    キーは(collection, band, dlim, ppu, 全タイルの範囲)から計算したSHA-256です。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def _read(self) -> Dict[str, Any]:
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._read().get(key)
+
+    def put(self, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            entries = self._read()
+            entries[key] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(entries, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, self.path)
+            except OSError:
+                tmp_path.unlink(missing_ok=True)
+
+
+_HEIGHT_RANGE_CACHE = _HeightRangeCache(HEIGHT_RANGE_CACHE_PATH)
+
+
+def _height_range_key(
+    collection: str,
+    band: Optional[str],
+    dlim: Optional[List[str]],
+    ppu: Union[float, List[float]],
+    tiles: List[List[float]]
+) -> str:
+    """地域（タイルの集合）の高さ範囲のキャッシュキー（ppuはタイルごとのリストも可）"""
+    ppus = ppu if isinstance(ppu, list) else [ppu] * len(tiles)
+    tile_keys = sorted(_raster_query_key(collection, band, dlim, p, bbox) for p, bbox in zip(ppus, tiles))
+    return hashlib.sha256("\n".join(tile_keys).encode("utf-8")).hexdigest()
+
+
+def _region_height_range(
+    collection: str,
+    tiles: List[List[float]],
+    resolution: Union[float, List[float]],
+    date_range: Optional[List[str]] = None,
+    band: str = "DSM",
+    refresh: bool = False,
+    max_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    複数タイルに共通の高さ範囲を計算します。
+    
+    resolutionにリストを渡すと、タイルごとにその解像度で取得します。
+    各タイルを_get_fetched_raster()で取得し、タイルごとの最小値・最大値を逐次集約します
+    （全体を結合した配列は作りません）。取得したタイルはメモリマップ保存に残るため、
+    続くエクスポートは再取得せずにこの範囲で量子化できます。結果は地域ごとに保存されます。
+    
+    Returns:
+        {"min": 最小値, "max": 最大値, "tile_count": タイル数, "cached": キャッシュから返したか}
+    """
+    key = _height_range_key(collection, band, date_range, resolution, tiles)
+    if not refresh:
+        entry = _HEIGHT_RANGE_CACHE.get(key)
+        if entry is not None:
+            return {**entry, "cached": True}
+    
+    height_min = np.inf
+    height_max = -np.inf
+    resolutions = resolution if isinstance(resolution, list) else [resolution] * len(tiles)
+    workers = max(1, min(max_workers or FETCH_MAX_WORKERS, len(tiles)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="jaxa-range") as executor:
+        futures = [
+            executor.submit(_get_fetched_raster, collection, bbox, ppu, date_range, band)
+            for ppu, bbox in zip(resolutions, tiles)
+        ]
+        for future in as_completed(futures):
+            tile_min, tile_max = future.result().height_range
+            if np.isfinite(tile_min):
+                height_min = min(height_min, tile_min)
+                height_max = max(height_max, tile_max)
+    if not np.isfinite(height_min):
+        raise ValueError("高度データの取得に失敗しました")
+    
+    entry = {
+        "min": float(height_min),
+        "max": float(height_max),
+        "tile_count": len(tiles),
+        "collection": collection,
+        "band": band,
+        "resolution": resolution,
+        "date_range": date_range
+    }
+    _HEIGHT_RANGE_CACHE.put(key, entry)
+    return {**entry, "cached": False}
+
+
+# ============================================================================
+# コレクションカタログ（ローカル保存・転置インデックス）
+# ============================================================================
+
+# JAXA Earth APIデータセット情報（catalog.md）の取得元と保存先
+JE_CATALOG_URL = os.environ.get("JAXA_CATALOG_URL", "https://data.earth.jaxa.jp/app/mcp/catalog.md")
+CATALOG_DIR = Path(os.environ.get("JAXA_CATALOG_DIR", str(TEMP_DIR / "catalog")))
+CATALOG_TTL_SECONDS = float(os.environ.get("JAXA_CATALOG_TTL_HOURS", "24")) * 3600
+
+_CATALOG_FIELDS = ("id", "title", "description", "bands", "keywords", "startDate", "endDate", "bbox", "epsg")
+_CATALOG_LINE_RE = re.compile(r"^[\s\-\*#>]*\**(%s)\**\s*:\s*(.*)$" % "|".join(_CATALOG_FIELDS))
+_TOKEN_RE = re.compile(r"[0-9a-z]+")
+
+
+def _tokenize(text: str) -> List[str]:
+    """検索用に英数字のトークンへ分割（小文字化）"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _parse_catalog(text: str) -> List[Dict[str, Any]]:
+    """catalog.mdのテキストを"---"区切りのデータセット情報のリストに変換"""
+    entries = []
+    current: Dict[str, Any] = {}
+    for line in text.splitlines():
+        if line.strip() == "---":
+            if current.get("id"):
+                entries.append(current)
+            current = {}
+            continue
+        match = _CATALOG_LINE_RE.match(line)
+        if match:
+            current[match.group(1)] = match.group(2).strip().strip("`")
+    if current.get("id"):
+        entries.append(current)
+    
+    for entry in entries:
+        entry["bands"] = [b.strip() for b in entry.get("bands", "").split(",") if b.strip()]
+        entry["keywords"] = [k.strip() for k in entry.get("keywords", "").split(",") if k.strip()]
+        bbox = [float(v) for v in re.findall(r"-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?", entry.get("bbox", ""))]
+        entry["bbox"] = bbox if len(bbox) == 4 else None
+    return entries
+
+
+class _CollectionCatalog:
+    """
+    catalog.mdを一度だけ読み込み、ローカルに保存して検索用の転置インデックスを構築するカタログ。
+    
+    保存済みのコピーがTTL以内であればネットワークを使用せず、TTL経過後は
+    ETag/Last-Modifiedによる条件付きリクエストで更新を確認します。
+    取得に失敗した場合は保存済みのコピー（期限切れでも）を使用します。
+    """
+
+    def __init__(self, url: str, cache_dir: Path, ttl_seconds: float):
+        self.url = url
+        self.cache_dir = Path(cache_dir)
+        self.ttl_seconds = ttl_seconds
+        self.text: Optional[str] = None
+        self.entries: List[Dict[str, Any]] = []
+        self.meta: Dict[str, Any] = {}
+        self._index: Dict[str, set] = {}
+        self._expand_cache: Dict[str, set] = {}
+        self._fetched_remote = False
+        self._lock = threading.Lock()
+        # 検索は複数スレッドから同時に呼ばれるため、エントリ・インデックス・部分一致のキャッシュは別のロックで守る
+        # （_lockはリモートからの取得中も保持されるため、検索で待たないようにする）
+        self._index_lock = threading.Lock()
+
+    @property
+    def _text_path(self) -> Path:
+        return self.cache_dir / "catalog.md"
+
+    @property
+    def _meta_path(self) -> Path:
+        return self.cache_dir / "catalog_meta.json"
+
+    def _is_fresh(self) -> bool:
+        # recordモードではフィクスチャに記録するため、プロセスごとに一度はリモートから取得する
+        if JAXA_EARTH_MODE == "record" and not self._fetched_remote:
+            return False
+        return time.time() - self.meta.get("fetched_at", 0) < self.ttl_seconds
+
+    def _read_local(self) -> bool:
+        try:
+            text = self._text_path.read_text(encoding="utf-8")
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.meta = meta
+        self._build(text)
+        return True
+
+    def _write_local(self) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._text_path.write_text(self.text or "", encoding="utf-8")
+        with open(self._meta_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, indent=2, ensure_ascii=False)
+
+    def _fetch_remote(self) -> None:
+        headers = {}
+        if self.text is not None and JAXA_EARTH_MODE != "record":
+            if self.meta.get("etag"):
+                headers["If-None-Match"] = self.meta["etag"]
+            if self.meta.get("last_modified"):
+                headers["If-Modified-Since"] = self.meta["last_modified"]
+        
+        response = _http_session().get(self.url, headers=headers)
+        self._fetched_remote = True
+        if response.status_code == 304 and self.text is not None:
+            # 変更なし: 保存済みのコピーの有効期限だけ延長
+            self.meta["fetched_at"] = time.time()
+            self._write_local()
+            return
+        response.raise_for_status()
+        
+        self.meta = {
+            "url": self.url,
+            "fetched_at": time.time(),
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified")
+        }
+        self._build(response.text)
+        self._write_local()
+
+    def _build(self, text: str) -> None:
+        """データセット情報をパースし、トークン→エントリ番号の転置インデックスを構築"""
+        entries = _parse_catalog(text)
+        index: Dict[str, set] = {}
+        for i, entry in enumerate(entries):
+            fields = [entry.get("id", ""), entry.get("title", "")] + entry["bands"] + entry["keywords"]
+            for token in _tokenize(" ".join(fields)):
+                index.setdefault(token, set()).add(i)
+        with self._index_lock:
+            self.text = text
+            self.entries = entries
+            self._index = index
+            self._expand_cache = {}
+
+    def load(self, force_refresh: bool = False) -> "_CollectionCatalog":
+        """カタログを読み込みます（メモリ→ローカル保存→リモートの順に確認）"""
+        with self._lock:
+            if self.text is None:
+                self._read_local()
+            if self.text is not None and self._is_fresh() and not force_refresh:
+                return self
+            try:
+                self._fetch_remote()
+            except Exception:
+                # オフライン時などは保存済みのコピーを使用
+                if self.text is None:
+                    raise
+            return self
+
+    def _match_token(self, token: str, index: Dict[str, set], expand_cache: Dict[str, set]) -> set:
+        """トークンに一致するエントリ（語彙中の部分一致を含む）"""
+        with self._index_lock:
+            matched = expand_cache.get(token)
+        if matched is None:
+            matched = set(index.get(token, ()))
+            for vocab, ids in index.items():
+                if token in vocab and vocab != token:
+                    matched |= ids
+            with self._index_lock:
+                # 計算中にインデックスが作り直された場合は、古いキャッシュに書き込まれて捨てられる
+                expand_cache[token] = matched
+        return matched
+
+    def search(
+        self,
+        keywords: List[str],
+        bounds: Optional[List[float]] = None,
+        date_range: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """全キーワードを含み、範囲・期間が重なるデータセットを返す"""
+        # 検索中にカタログが更新されても、同じ版のエントリとインデックスを使う
+        with self._index_lock:
+            entries, index, expand_cache = self.entries, self._index, self._expand_cache
+        candidates = set(range(len(entries)))
+        for keyword in keywords:
+            for token in _tokenize(keyword):
+                candidates &= self._match_token(token, index, expand_cache)
+                if not candidates:
+                    return []
+        
+        results = []
+        for i in sorted(candidates):
+            entry = entries[i]
+            if bounds and entry["bbox"] and "4326" in entry.get("epsg", "4326"):
+                min_lon, min_lat, max_lon, max_lat = entry["bbox"]
+                if bounds[0] > max_lon or bounds[2] < min_lon or bounds[1] > max_lat or bounds[3] < min_lat:
+                    continue
+            if date_range:
+                start = entry.get("startDate", "")[:10]
+                end = entry.get("endDate", "")[:10]
+                if end and end != "present" and date_range[0][:10] > end:
+                    continue
+                if start and date_range[-1][:10] < start:
+                    continue
+            results.append(entry)
+        return results
+
+
+_CATALOG = _CollectionCatalog(JE_CATALOG_URL, CATALOG_DIR, CATALOG_TTL_SECONDS)
+
+
+# ============================================================================
+# データ検索ツール
+# ============================================================================
+
+@mcp.tool()
+async def search_collections_id() -> str:
+    """
+    JAXA Earth APIで利用可能なデータセットの詳細情報を返します。
+    ユーザーのリクエストに基づいて、適切なデータセットIDとバンドを選択して応答してください。
+    
+    返されるテキストは、JAXA Earth APIを通じて利用可能なすべてのデータセットのリストです。
+    各パラメータは以下のように記述されています：
+    
+    id: データセットを一意に識別するID
+    title: データセットのタイトル
+    description: データセットの説明
+    bands: データセットに含まれるデータのID。複数のIDはカンマ（,）で区切られます。
+    keywords: データセットに関連するキーワード。観測衛星の名前やデータを管理する宇宙機関の名前が含まれます。
+    startDate: ISO8601形式のデータセット期間の開始日時を表す文字列。この日付以降のデータが利用可能であることを示します。
+    endDate: ISO8601形式のデータセット期間の終了日時を表す文字列。"present"という値は、データがまだ毎日更新されていることを示します。
+    各データセットのパラメータの終わりは"---"で示されます。
+    bbox: データセットの地理的範囲（バウンディングボックス）。EPSG:4326の場合、[最小経度、最小緯度、最大経度、最大緯度]を示します。EPSG:3995またはEPSG:3031の場合、[最小X、最小Y、最大X、最大Y]を示します。
+    epsg: データセットの投影方法を示すEPSGコード。
+    
+    上記に基づいて、ユーザーのリクエストに最適なデータセットIDとバンドを選択して応答してください。
+    """
+    try:
+        # JAXA Earth APIデータセット情報を読み込む（ローカル保存済みならネットワーク不要）
+        catalog = await _run_blocking(_CATALOG.load)
+        je_text = catalog.text
+        
+        # データセット情報テキストを返す
+        return je_text
+    except Exception as e:
+        return f"Error: {str(e)}\n{traceback.format_exc()}"
+
+
+@mcp.tool()
+async def search_collections(
+    keywords: List[str],
+    bounds: Optional[List[float]] = None,
+    date_range: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """
+    コレクション名とバンドをキーワードで検索します。
+    
+    Args:
+        keywords: 検索キーワードのリスト（例: ["LST", "half-month"]）
+        bounds: この範囲と重なるデータセットに絞り込む [min_lon, min_lat, max_lon, max_lat]（オプション）
+        date_range: この期間と重なるデータセットに絞り込む [開始日, 終了日]（オプション）
+    
+    Returns:
+        検索結果の辞書（collectionsとbandsを含む）
+    """
+    try:
+        try:
+            catalog = await _run_blocking(_CATALOG.load)
+            entries = catalog.search(keywords, bounds=bounds, date_range=date_range)
+        except Exception:
+            # カタログが取得できない場合はjaxa.earthの一覧にフォールバック
+            collection_list = await _run_blocking(je.ImageCollectionList)
+            collections, bands = await _run_blocking(collection_list.filter_name, keywords=keywords)
+            return {
+                "collections": collections if isinstance(collections, list) else list(collections),
+                "bands": bands if isinstance(bands, list) else list(bands),
+                "keywords": keywords
+            }
+        
+        return {
+            "collections": [entry["id"] for entry in entries],
+            "bands": [entry["bands"] for entry in entries],
+            "keywords": keywords
+        }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+@mcp.tool()
+def list_available_collections() -> Dict[str, Any]:
+    """
+    利用可能なコレクション一覧を取得します。
+    
+    Returns:
+        利用可能なコレクションのリスト
+    """
+    try:
+        try:
+            entries = _CATALOG.load().entries
+        except Exception:
+            # カタログが取得できない場合はjaxa.earthの一覧にフォールバック
+            collection_list = je.ImageCollectionList()
+            # 空のキーワードで全コレクションを取得
+            collections, bands = collection_list.filter_name(keywords=[])
+            return {
+                "collections": collections if isinstance(collections, list) else list(collections),
+                "bands": bands if isinstance(bands, list) else list(bands),
+                "total_count": len(collections) if isinstance(collections, list) else 0
+            }
+        
+        return {
+            "collections": [entry["id"] for entry in entries],
+            "bands": [entry["bands"] for entry in entries],
+            "total_count": len(entries)
+        }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+# ============================================================================
+# 画像取得ツール
+# ============================================================================
+
+@mcp.tool()
+async def show_images(
+    collection: str = "JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global",
+    band: str = "DSM",
+    dlim: List[str] = ["2021-01-01T00:00:00", "2021-01-01T00:00:00"],
+    bbox: List[float] = [135.0, 37.5, 140.0, 42.5],
+) -> Any:  # Returns List[Image], but using Any to avoid Pydantic schema error
+    """
+    ユーザー入力に基づいてJAXA Earth APIを使用して衛星画像を表示します。
+    
+    Args:
+        collection: JAXA Earth APIコレクションID
+        band: コレクション内のバンド名
+        dlim: 開始から終了までの日付範囲制限。yyyy-mm-ddThh:mm:ss形式の日付文字列
+        bbox: データセットの地理的範囲（バウンディングボックス）。EPSG:4326の場合、[最小経度、最小緯度、最大経度、最大緯度]を示します
+    """
+    try:
+        # ターゲット画像サイズでppu（単位あたりのピクセル）を設定
+        image_size = 300  # 画像サイズターゲット
+        ppu = image_size / (bbox[2] - bbox[0])
+        
+        def render() -> Any:
+            # 画像を取得（キャッシュ経由）
+            data = _fetch_images(collection, band=band, dlim=dlim, ppu=ppu, bbox=bbox)
+            
+            # 画像を処理して表示
+            with _PLOT_LOCK:
+                return je.ImageProcess(data)\
+                    .show_images(output="buffer")
+        
+        img_data = await _run_blocking(render)
+        
+        # PNGバッファとして画像データを返す
+        output = []
+        for png_buffer in img_data.png_buffers:
+            output.append(Image(data=png_buffer, format="png"))
+        return output
+    except Exception as e:
+        return [Image(data=f"Error: {str(e)}".encode(), format="text")]
+
+
+@mcp.tool()
+async def get_earth_images(
+    collection: str,
+    date_range: Optional[List[str]] = None,
+    resolution: Optional[float] = None,
+    bounds: Optional[List[float]] = None,
+    geojson_path: Optional[str] = None,
+    band: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    日付、解像度、範囲、バンドを指定して地球観測画像を取得します。
+    
+    Args:
+        collection: コレクション名（例: "JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global"）
+        date_range: 日付範囲 [開始日, 終了日] (ISO形式: "YYYY-MM-DDTHH:MM:SS")
+        resolution: 解像度（ppu: Pixels Per Unit）
+        bounds: バウンディングボックス [min_lon, min_lat, max_lon, max_lat]
+        geojson_path: GeoJSONファイルのパス（boundsより優先）
+        band: バンド名（例: "DSM"）
+    
+    Returns:
+        取得した画像データの情報
+    """
+    try:
+        # 日付フィルタ（デフォルト: 2021年のデータ）
+        dlim = date_range if date_range else [
+            "2021-01-01T00:00:00",
+            "2021-12-31T23:59:59"
+        ]
+        
+        def fetch() -> Any:
+            # 範囲フィルタ
+            geoj = None
+            if geojson_path and os.path.exists(geojson_path):
+                features = je.FeatureCollection().read(geojson_path).select([])
+                geoj = features[0] if features else None
+            
+            # 画像取得（キャッシュ経由）
+            return _fetch_images(collection, band=band, dlim=dlim, ppu=resolution, bbox=bounds, geoj=geoj)
+        
+        result = await _run_blocking(fetch)
+        
+        # 結果情報を返す
+        raster = result.raster if hasattr(result, 'raster') else None
+        if raster:
+            return {
+                "success": True,
+                "collection": collection,
+                "raster_info": {
+                    "shape": getattr(raster, 'img', {}).shape if hasattr(raster, 'img') else None,
+                    "latlim": getattr(raster, 'latlim', None),
+                    "lonlim": getattr(raster, 'lonlim', None)
+                }
+            }
+        else:
+            return {
+                "success": False,
+                "message": "画像の取得に失敗しました"
+            }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+# ============================================================================
+# 画像処理ツール
+# ============================================================================
+
+@mcp.tool()
+async def calc_spatial_stats(
+    collection: str,
+    date_range: Optional[List[str]] = None,
+    bounds: Optional[List[float]] = None,
+    band: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    空間統計を計算します。
+    
+    Args:
+        collection: コレクション名
+        date_range: 日付範囲
+        bounds: バウンディングボックス
+        band: バンド名
+    
+    Returns:
+        空間統計結果（mean, std, min, max, median）
+    """
+    try:
+        # 公式v0.1.5スタイルに合わせる
+        collection_param = collection if collection else "JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global"
+        band_param = band if band else "DSM"
+        dlim_param = date_range if date_range else ["2021-01-01T00:00:00", "2021-01-01T00:00:00"]
+        bbox_param = bounds if bounds else [135.0, 37.5, 140.0, 42.5]
+        
+        # ターゲット画像サイズでppuを設定
+        image_size = 300
+        ppu = image_size / (bbox_param[2] - bbox_param[0])
+        
+        def compute() -> Any:
+            # 画像を取得（キャッシュ経由）
+            data = _fetch_images(collection_param, band=band_param, dlim=dlim_param, ppu=ppu, bbox=bbox_param)
+            
+            # 画像を処理
+            return je.ImageProcess(data)\
+                .calc_spatial_stats()
+        
+        img_data = await _run_blocking(compute)
+        
+        # 統計結果を返す
+        return img_data.timeseries if hasattr(img_data, 'timeseries') else {}
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+@mcp.tool()
+async def show_spatial_stats(
+    collection: str = "JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global",
+    band: str = "DSM",
+    dlim: List[str] = ["2021-01-01T00:00:00", "2021-01-01T00:00:00"],
+    bbox: List[float] = [135.0, 37.5, 140.0, 42.5],
+) -> Any:  # Returns List[Image], but using Any to avoid Pydantic schema error
+    """
+    ユーザー入力に基づいてJAXA Earth APIを使用して衛星データの空間統計結果画像を表示します。
+    
+    Args:
+        collection: JAXA Earth APIコレクションID
+        band: コレクション内のバンド名
+        dlim: 開始から終了までの日付範囲制限。yyyy-mm-ddThh:mm:ss形式の日付文字列
+        bbox: データセットの地理的範囲（バウンディングボックス）
+    """
+    try:
+        # ターゲット画像サイズでppuを設定
+        image_size = 300
+        ppu = image_size / (bbox[2] - bbox[0])
+        
+        def render() -> Any:
+            # 画像を取得（キャッシュ経由）
+            data = _fetch_images(collection, band=band, dlim=dlim, ppu=ppu, bbox=bbox)
+            
+            # 画像を処理して表示
+            img_process = je.ImageProcess(data).calc_spatial_stats()
+            with _PLOT_LOCK:
+                return img_process.show_spatial_stats(output="buffer")
+        
+        img_data = await _run_blocking(render)
+        
+        # PNGバッファとして画像データを返す
+        output_images = []
+        for png_buffer in img_data.png_buffers_stats:
+            output_images.append(Image(data=png_buffer, format="png"))
+        
+        return output_images
+    except Exception as e:
+        return [Image(data=f"Error: {str(e)}".encode(), format="text")]
+
+
+@mcp.tool()
+async def calc_temporal_stats(
+    collection: str,
+    date_range: List[str],
+    method: str = "mean",
+    bounds: Optional[List[float]] = None,
+    band: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    時間統計を計算します。
+    
+    Args:
+        collection: コレクション名
+        date_range: 日付範囲
+        method: 統計手法 ("mean", "max", "min", "std", "median")
+        bounds: バウンディングボックス
+        band: バンド名
+    
+    Returns:
+        時間統計結果
+    """
+    try:
+        def compute() -> Any:
+            result = _fetch_images(collection, band=band, dlim=date_range, bbox=bounds)
+            img_process = je.ImageProcess(result)
+            return img_process.calc_temporal_stats(method_query=method)
+        
+        img_process = await _run_blocking(compute)
+        
+        return {
+            "success": True,
+            "method": method,
+            "temporal_statistics": "計算完了"
+        }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+# ============================================================================
+# GeoJSON処理ツール
+# ============================================================================
+
+@mcp.tool()
+def read_geojson(file_path: str) -> Dict[str, Any]:
+    """
+    GeoJSONファイルを読み込みます。
+    
+    Args:
+        file_path: GeoJSONファイルのパス
+    
+    Returns:
+        読み込んだGeoJSONデータの情報
+    """
+    try:
+        if not os.path.exists(file_path):
+            return {
+                "error": f"ファイルが見つかりません: {file_path}"
+            }
+        
+        feature_collection = je.FeatureCollection().read(file_path)
+        features = feature_collection.select([])
+        
+        return {
+            "success": True,
+            "file_path": file_path,
+            "feature_count": len(features) if isinstance(features, list) else 1
+        }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+@mcp.tool()
+def select_features(file_path: str, keywords: List[str]) -> Dict[str, Any]:
+    """
+    キーワードでフィーチャーを選択します。
+    
+    Args:
+        file_path: GeoJSONファイルのパス
+        keywords: 検索キーワードのリスト
+    
+    Returns:
+        選択されたフィーチャーの情報
+    """
+    try:
+        if not os.path.exists(file_path):
+            return {
+                "error": f"ファイルが見つかりません: {file_path}"
+            }
+        
+        feature_collection = je.FeatureCollection().read(file_path)
+        selected = feature_collection.select(keywords)
+        
+        return {
+            "success": True,
+            "keywords": keywords,
+            "selected_count": len(selected) if isinstance(selected, list) else 1
+        }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+# ============================================================================
+# 3D地形生成・エクスポートツール（VRChat向け）
+# ============================================================================
+
+@mcp.tool()
+def generate_heightmap(
+    collection: str,
+    bounds: List[float],
+    resolution: float = 20.0,
+    date_range: Optional[List[str]] = None,
+    output_path: Optional[str] = None,
+    raster_id: Optional[str] = None,
+    tiled: Optional[bool] = None,
+    write_raw: bool = False,
+    bit_depth: int = 16,
+    height_range: Optional[List[float]] = None,
+    compress: Optional[str] = "deflate"
+) -> Dict[str, Any]:
+    """
+    衛星データから高度マップ（Heightmap）を生成します。
+    
+    output_pathの拡張子が.tif/.tiff/.exrの場合は、正規化せずにfloat32（メートル）で出力します。
+    
+    Args:
+        collection: コレクション名（標高データ用、例: "JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global"）
+        bounds: バウンディングボックス [min_lon, min_lat, max_lon, max_lat]
+        resolution: 解像度（ppu）
+        date_range: 日付範囲（オプション）
+        output_path: 出力ファイルパス（オプション、未指定時はtempディレクトリに保存）
+        raster_id: 以前のツール呼び出しで返されたraster_id（指定時は再取得しない）
+        tiled: Trueの場合、範囲を帯に分割してメモリ使用量を抑えて生成（未指定時は大きな範囲で自動的に有効）
+        write_raw: Trueの場合、同じ名前の.rawファイル（リトルエンディアン）も出力
+        bit_depth: 出力のビット深度（16または8、8はタイルモード非対応）
+        height_range: 量子化に使う高さ範囲 [最小値, 最大値]（隣接タイルで揃える場合、compute_height_rangeの結果を指定）
+        compress: GeoTIFF出力時の圧縮方式（"deflate", "lzw", "zstd"など、Noneで無圧縮）
+    
+    Returns:
+        生成された高度マップの情報（raster_idを含む）
+    """
+    try:
+        # 出力パスを決定
+        if not output_path:
+            output_path = str(TEMP_DIR / "heightmap.png")
+        raw_path = str(Path(output_path).with_suffix(".raw")) if write_raw else None
+        
+        # float32（GeoTIFF/EXR）はメモリマップからブロック単位で書き出すため帯分割は不要
+        if Path(output_path).suffix.lower() in _FLOAT_HEIGHTMAP_SUFFIXES:
+            fetched = _get_fetched_raster(collection, bounds, resolution, date_range, raster_id=raster_id)
+            return _write_float_heightmap(fetched, output_path, compress)
+        
+        # 大きな範囲は帯に分割してストリーミング生成
+        if tiled is None:
+            rows, cols = _grid_shape(bounds, resolution)
+            tiled = raster_id is None and rows * cols > TILED_HEIGHTMAP_AUTO_PIXELS
+        if tiled:
+            if bit_depth != 16:
+                return {"error": "タイルモードは16bit出力のみ対応しています"}
+            return _generate_heightmap_tiled(
+                collection, bounds, resolution, date_range, output_path, raw_path, height_range
+            )
+        
+        # 標高データを取得（DSM: Digital Surface Model、取得済みならメモリマップから再利用）
+        fetched = _get_fetched_raster(collection, bounds, resolution, date_range, raster_id=raster_id)
+        
+        return _write_heightmap_png(fetched, output_path, raw_path, bit_depth, height_range)
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+def _write_heightmap_png(
+    fetched: _FetchedRaster,
+    output_path: str,
+    raw_path: Optional[str] = None,
+    bit_depth: int = 16,
+    height_range: Optional[List[float]] = None
+) -> Dict[str, Any]:
+    """取得済みラスターをグレースケールPNG（と必要に応じて.raw）として保存"""
+    # 正規化（16bit: 0-65535、8bit: 0-255の範囲に）
+    height_quantized, height_min, height_max = _quantize_heights(
+        fetched.data, bit_depth, height_range or fetched.height_range
+    )
+    
+    # PNG形式で保存（グレースケール）
+    height_image = PILImage.fromarray(height_quantized, mode='I;16' if bit_depth == 16 else 'L')
+    height_image.save(output_path)
+    
+    # .raw形式で保存（リトルエンディアン）
+    if raw_path:
+        height_quantized.astype('<u2' if bit_depth == 16 else 'u1', copy=False).tofile(raw_path)
+    
+    return {
+        "success": True,
+        "output_path": output_path,
+        "raw_path": raw_path,
+        "raster_id": fetched.raster_id,
+        "shape": fetched.shape,
+        "bit_depth": bit_depth,
+        "height_range": {
+            "min": height_min,
+            "max": height_max
+        },
+        "bounds": fetched.bounds
+    }
+
+
+# float32で書き出す高さマップの拡張子
+_FLOAT_HEIGHTMAP_SUFFIXES = (".tif", ".tiff", ".exr")
+
+
+def _write_float_geotiff(
+    path: str,
+    data: "np.ndarray",
+    bounds: List[float],
+    compress: Optional[str] = "deflate",
+    block_size: int = 256
+) -> None:
+    """
+    高度データ（メートル）をfloat32のGeoTIFF（EPSG:4326、NaNはnodata）として保存します。
+    
+    タイル化・圧縮したGeoTIFFに、block_size行ずつウィンドウ単位で書き込むため、
+    メモリマップされた高度データ全体をメモリに読み込みません。
+    """
+    from rasterio.transform import from_bounds
+    from rasterio.windows import Window
+    
+    if block_size <= 0 or block_size % 16 != 0:
+        raise ValueError(f"block_sizeは16の倍数を指定してください: {block_size}")
+    rows, cols = data.shape
+    profile = {
+        "driver": "GTiff",
+        "height": rows,
+        "width": cols,
+        "count": 1,
+        "dtype": "float32",
+        "crs": "EPSG:4326",
+        "transform": from_bounds(bounds[0], bounds[1], bounds[2], bounds[3], cols, rows),
+        "nodata": float("nan"),
+        "tiled": True,
+        "blockxsize": block_size,
+        "blockysize": block_size,
+        "BIGTIFF": "IF_SAFER"
+    }
+    if compress:
+        profile["compress"] = compress
+        if compress.lower() in ("deflate", "lzw", "zstd"):
+            profile["predictor"] = 3  # 浮動小数点用の予測子
+    
+    with rasterio.open(path, "w", **profile) as dst:
+        for row in range(0, rows, block_size):
+            block = np.asarray(data[row:row + block_size], dtype=np.float32)
+            dst.write(block, 1, window=Window(0, row, cols, block.shape[0]))
+
+
+def _write_float_exr(path: str, data: "np.ndarray", block_size: int = 256) -> None:
+    """
+    高度データ（メートル）を1チャンネル（Y）のfloat32 OpenEXRとして保存します（OpenEXRが必要）。
+    Blenderの変位用にNaNは最小値で埋め、block_size行ずつ書き込みます。
+    """
+    if importlib.util.find_spec("OpenEXR") is None or importlib.util.find_spec("Imath") is None:
+        raise ValueError("EXR形式の出力にはOpenEXRが必要です（pip install OpenEXR）。GeoTIFF（.tif）を使用してください")
+    import Imath
+    import OpenEXR
+    
+    rows, cols = data.shape
+    fill_value = float(np.nanmin(data))
+    header = OpenEXR.Header(cols, rows)
+    header["channels"] = {"Y": Imath.Channel(Imath.PixelType(Imath.PixelType.FLOAT))}
+    exr = OpenEXR.OutputFile(path, header)
+    try:
+        for row in range(0, rows, block_size):
+            block = np.asarray(data[row:row + block_size], dtype=np.float32)
+            block = np.where(np.isnan(block), fill_value, block).astype('<f4', copy=False)
+            exr.writePixels({"Y": block.tobytes()}, block.shape[0])
+    finally:
+        exr.close()
+
+
+def _write_float_heightmap(
+    fetched: _FetchedRaster,
+    output_path: str,
+    compress: Optional[str] = "deflate",
+    block_size: int = 256
+) -> Dict[str, Any]:
+    """取得済みラスターを正規化せずにfloat32（メートル）で保存（拡張子で.tif/.tiff/.exrを判定）"""
+    suffix = Path(output_path).suffix.lower()
+    if suffix == ".exr":
+        _write_float_exr(output_path, fetched.data, block_size)
+    elif suffix in (".tif", ".tiff"):
+        _write_float_geotiff(output_path, fetched.data, fetched.bounds, compress, block_size)
+    else:
+        raise ValueError(f"float32の高さマップは{', '.join(_FLOAT_HEIGHTMAP_SUFFIXES)}で出力できます: {output_path}")
+    
+    height_min, height_max = fetched.height_range
+    return {
+        "success": True,
+        "output_path": output_path,
+        "raster_id": fetched.raster_id,
+        "shape": fetched.shape,
+        "dtype": "float32",
+        "units": "meters",
+        "height_range": {
+            "min": height_min,
+            "max": height_max
+        },
+        "bounds": fetched.bounds
+    }
+
+
+@mcp.tool()
+def export_to_blender(
+    collection: str,
+    bounds: List[float],
+    resolution: float = 20.0,
+    date_range: Optional[List[str]] = None,
+    output_dir: Optional[str] = None,
+    raster_id: Optional[str] = None,
+    height_range: Optional[List[float]] = None,
+    mesh_format: Optional[str] = None,
+    max_polygons: Optional[int] = None,
+    compress: Optional[str] = "deflate"
+) -> Dict[str, Any]:
+    """
+    Blender用の高度データとテクスチャをエクスポートします。
+    
+    高さマップは16bit PNG（正規化済み）に加えて、実際の標高（メートル）を保持する
+    float32のGeoTIFF（heightmap.tif）を出力します。OpenEXRがインストールされている場合は
+    heightmap.exrも出力します。
+    
+    Args:
+        collection: コレクション名
+        bounds: バウンディングボックス
+        resolution: 解像度
+        date_range: 日付範囲
+        output_dir: 出力ディレクトリ（オプション）
+        raster_id: 以前のツール呼び出しで返されたraster_id（指定時は再取得しない）
+        height_range: 量子化に使う高さ範囲 [最小値, 最大値]（隣接タイルで揃える場合、compute_height_rangeの結果を指定）
+        mesh_format: 指定時（"glb"または"obj"）、Displaceせずにそのままインポートできるメッシュも出力
+        max_polygons: メッシュの最大ポリゴン数（指定時は適応メッシュ、未指定時は全ピクセルの格子メッシュ）
+        compress: GeoTIFFの圧縮方式（"deflate", "lzw", "zstd"など、Noneで無圧縮）
+    
+    Returns:
+        エクスポートされたファイルの情報
+    """
+    try:
+        if not output_dir:
+            output_dir = str(TEMP_DIR / "blender_export")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 高度データを一度だけ取得し、高度マップとテクスチャの両方に使用
+        fetched = _get_fetched_raster(collection, bounds, resolution, date_range, raster_id=raster_id)
+        
+        # 16bit PNG（0-65535に正規化）
+        heightmap_path = os.path.join(output_dir, "heightmap.png")
+        heightmap_result = _write_heightmap_png(fetched, heightmap_path, height_range=height_range)
+        
+        # float32（メートル、正規化なし）のGeoTIFFと、可能ならEXR
+        float_heightmap_path = os.path.join(output_dir, "heightmap.tif")
+        _write_float_heightmap(fetched, float_heightmap_path, compress)
+        exr_path = None
+        if importlib.util.find_spec("OpenEXR") is not None and importlib.util.find_spec("Imath") is not None:
+            exr_path = os.path.join(output_dir, "heightmap.exr")
+            _write_float_heightmap(fetched, exr_path)
+        
+        # テクスチャ（衛星画像）も保存
+        # ここでは高度マップをテクスチャとしても使用（実際には別のバンドを使用可能）
+        texture_path = os.path.join(output_dir, "texture.png")
+        shutil.copyfile(heightmap_path, texture_path)
+        
+        files = {
+            "heightmap": heightmap_path,
+            "heightmap_float": float_heightmap_path,
+            "texture": texture_path
+        }
+        if exr_path:
+            files["heightmap_exr"] = exr_path
+        
+        # メッシュ（メートル単位、頂点・法線・UV付き）
+        mesh = None
+        if mesh_format:
+            mesh_path = os.path.join(output_dir, f"terrain.{mesh_format}")
+            method = "rtin" if max_polygons else "grid"
+            mesh = _export_mesh(fetched, mesh_path, method, max_polygons, mesh_format=mesh_format)
+            files["mesh"] = mesh_path
+        
+        return {
+            "success": True,
+            "output_dir": output_dir,
+            "raster_id": fetched.raster_id,
+            "files": files,
+            "mesh": mesh,
+            "height_range": heightmap_result["height_range"],
+            "note": "heightmap.tif（またはheightmap.exr）は実際の標高（メートル）をfloat32で保持しています。Displace Modifierで使用する場合はStrengthを1.0、Midlevelを0にしてください。PNGは0-65535に正規化されています。"
+        }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+@mcp.tool()
+def export_to_unity(
+    collection: str,
+    bounds: List[float],
+    resolution: float = 20.0,
+    date_range: Optional[List[str]] = None,
+    output_dir: Optional[str] = None,
+    raster_id: Optional[str] = None,
+    height_range: Optional[List[float]] = None,
+    heightmap_resolution: Optional[int] = None,
+    tiles_per_side: int = 1
+) -> Dict[str, Any]:
+    """
+    Unity用の地形データをエクスポートします。
+    
+    高さマップはUnityのTerrainが扱える2^n+1の正方形に一度だけ再サンプリングし、
+    .raw（16bitリトルエンディアン、Byte Order: Windows）として配列から直接書き出します。
+    tiles_per_sideを2以上にすると、端の行・列を共有する複数のTerrain用に分割します。
+    
+    Args:
+        collection: コレクション名
+        bounds: バウンディングボックス
+        resolution: 解像度
+        date_range: 日付範囲
+        output_dir: 出力ディレクトリ
+        raster_id: 以前のツール呼び出しで返されたraster_id（指定時は再取得しない）
+        height_range: 量子化に使う高さ範囲 [最小値, 最大値]（隣接タイルで揃える場合、compute_height_rangeの結果を指定）
+        heightmap_resolution: 1タイルの高さマップ解像度（2^n+1、33〜4097。未指定時は取得データに最も近い値）
+        tiles_per_side: 1辺あたりのTerrainタイル数
+    
+    Returns:
+        エクスポートされたファイルの情報
+    """
+    try:
+        if not output_dir:
+            output_dir = str(TEMP_DIR / "unity_export")
+        os.makedirs(output_dir, exist_ok=True)
+        if tiles_per_side < 1:
+            return {"error": f"tiles_per_sideは1以上を指定してください: {tiles_per_side}"}
+        if heightmap_resolution is not None and heightmap_resolution not in _UNITY_HEIGHTMAP_RESOLUTIONS:
+            return {
+                "error": f"heightmap_resolutionは{', '.join(map(str, _UNITY_HEIGHTMAP_RESOLUTIONS))}のいずれかを指定してください: {heightmap_resolution}"
+            }
+        
+        # 高度データを取得（取得済みなら再利用）
+        fetched = _get_fetched_raster(collection, bounds, resolution, date_range, raster_id=raster_id)
+        
+        # 2^n+1への再サンプリングは全体で1回だけ行い、タイルは端を共有するビューとして切り出す
+        tile_resolution = heightmap_resolution or _nearest_unity_resolution(max(fetched.shape) / tiles_per_side)
+        size = (tile_resolution - 1) * tiles_per_side + 1
+        height_data = _resample_grid(fetched.data, size, size)
+        
+        # UnityのTerrainは16bitの高さマップを使用
+        height_uint16, height_min, height_max = _normalize_to_uint16(height_data, height_range or fetched.height_range)
+        
+        # Unityの高さマップは南端の行が先頭（インポート時の「Flip Vertically」はオフのまま）
+        unity_rows = height_uint16[::-1]
+        step = tile_resolution - 1
+        tiles = []
+        for tile_z in range(tiles_per_side):
+            for tile_x in range(tiles_per_side):
+                name = "terrain.raw" if tiles_per_side == 1 else f"terrain_x{tile_x}_z{tile_z}.raw"
+                tile_path = os.path.join(output_dir, name)
+                tile = unity_rows[tile_z * step:tile_z * step + tile_resolution, tile_x * step:tile_x * step + tile_resolution]
+                tile.astype('<u2', copy=False).tofile(tile_path)
+                tiles.append({"x": tile_x, "z": tile_z, "path": tile_path})
+        
+        # テクスチャも保存（北が上の画像）
+        texture_path = os.path.join(output_dir, "terrain_texture.png")
+        height_image = PILImage.fromarray(height_uint16, mode='I;16')
+        height_image.save(texture_path)
+        
+        # メタデータファイル（Unity用の情報）
+        width_m, depth_m = _bounds_size_meters(fetched.bounds)
+        metadata = {
+            "width": tile_resolution,
+            "height": tile_resolution,
+            "depth": 16,  # 16bit
+            "byte_order": "little",
+            "row_order": "south_to_north",
+            "tiles_per_side": tiles_per_side,
+            "tiles": [{"x": t["x"], "z": t["z"], "file": os.path.basename(t["path"])} for t in tiles],
+            "terrain_size": {
+                "x": width_m / tiles_per_side,
+                "y": height_max - height_min,
+                "z": depth_m / tiles_per_side
+            },
+            "height_range": {
+                "min": height_min,
+                "max": height_max
+            },
+            "source_shape": list(fetched.shape),
+            "bounds": fetched.bounds
+        }
+        
+        metadata_path = os.path.join(output_dir, "terrain_metadata.json")
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        
+        files = {
+            "terrain_raw": tiles[0]["path"] if tiles_per_side == 1 else [t["path"] for t in tiles],
+            "texture": texture_path,
+            "metadata": metadata_path
+        }
+        return {
+            "success": True,
+            "output_dir": output_dir,
+            "raster_id": fetched.raster_id,
+            "files": files,
+            "metadata": metadata,
+            "note": "UnityのTerrainで.rawファイルをインポートする際は、Depth: Bit 16、Byte Order: Windows、Resolutionとterrain_size（メートル）はメタデータの値を指定してください。"
+        }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+# UnityのTerrainが扱える高さマップ解像度（2^n+1）
+_UNITY_HEIGHTMAP_RESOLUTIONS = (33, 65, 129, 257, 513, 1025, 2049, 4097)
+
+
+def _nearest_unity_resolution(pixels: float) -> int:
+    """ピクセル数に最も近いUnityの高さマップ解像度（2^n+1）"""
+    return min(_UNITY_HEIGHTMAP_RESOLUTIONS, key=lambda size: abs(size - pixels))
+
+
+def _plan_vrchat_resolution(
+    bounds: List[float],
+    resolution: float,
+    max_polygons: int,
+    texture_size: int
+) -> Dict[str, Any]:
+    """create_vrchat_terrainの取得解像度（テクスチャとポリゴン格子のうち細かい方に必要な最小値）"""
+    texture_shape = _output_shape(bounds, texture_size)
+    # 縦横比を保ったまま、セル数×2がmax_polygonsになる格子
+    aspect = min(texture_shape) / max(texture_shape)
+    polygon_shape = _output_shape(bounds, int(np.sqrt(max_polygons / (2 * aspect))))
+    target_shape = (max(texture_shape[0], polygon_shape[0]), max(texture_shape[1], polygon_shape[1]))
+    return _plan_fetch_resolution(bounds, target_shape, resolution)
+
+
+def _plan_fetch_resolution(bounds: List[float], target_shape: tuple, max_ppu: float) -> Dict[str, Any]:
+    """
+    出力に必要な(行数, 列数)から、取得前に最小の解像度(ppu)を決めます。
+    
+    縦横ともtarget_shape以上のピクセル数になる最小の整数ppuを選び、max_ppu（呼び出し側の解像度）を
+    上限とします。これより細かく取得しても、出力の段階で縮小されて捨てられるだけです。
+    """
+    lat_span, lon_span = bounds[3] - bounds[1], bounds[2] - bounds[0]
+    if lat_span > 0 and lon_span > 0:
+        # 浮動小数点の誤差で1つ上の整数にならないよう丸めてから切り上げる
+        needed = float(np.ceil(round(max(target_shape[0] / lat_span, target_shape[1] / lon_span), 6)))
+    else:
+        needed = max_ppu
+    ppu = min(max_ppu, needed)
+    requested_rows, requested_cols = _grid_shape(bounds, max_ppu)
+    rows, cols = _grid_shape(bounds, ppu)
+    return {
+        "requested_ppu": max_ppu,
+        "ppu": ppu,
+        "target_shape": [int(target_shape[0]), int(target_shape[1])],
+        "shape": [rows, cols],
+        "pixel_reduction": round(requested_rows * requested_cols / (rows * cols), 2)
+    }
+
+
+# create_vrchat_terrainのデフォルトの予算（バッチの事前計算でも同じ値を使う）
+VRCHAT_DEFAULT_MAX_POLYGONS = 100000
+VRCHAT_DEFAULT_TEXTURE_SIZE = 2048
+
+
+@mcp.tool()
+def create_vrchat_terrain(
+    collection: str,
+    bounds: List[float],
+    resolution: float = 20.0,
+    max_polygons: int = VRCHAT_DEFAULT_MAX_POLYGONS,
+    texture_size: int = VRCHAT_DEFAULT_TEXTURE_SIZE,
+    date_range: Optional[List[str]] = None,
+    output_dir: Optional[str] = None,
+    raster_id: Optional[str] = None,
+    height_range: Optional[List[float]] = None,
+    mesh_format: Optional[str] = None,
+    texture_format: str = "png",
+    resample_kernel: str = "lanczos"
+) -> Dict[str, Any]:
+    """
+    VRChat向けに最適化された地形データを生成します。
+    
+    Args:
+        collection: コレクション名
+        bounds: バウンディングボックス
+        resolution: 解像度
+        max_polygons: 最大ポリゴン数（VRChat制約対応）
+        texture_size: テクスチャの長い辺のピクセル数（VRChat推奨: 2048以下、縦横比は範囲の実寸に合わせる）
+        date_range: 日付範囲
+        output_dir: 出力ディレクトリ
+        raster_id: 以前のツール呼び出しで返されたraster_id（指定時は再取得しない）
+        height_range: 量子化に使う高さ範囲 [最小値, 最大値]（隣接タイルで揃える場合、compute_height_rangeの結果を指定）
+        mesh_format: 指定時（"glb"または"obj"）、max_polygons以内の適応メッシュ（RTIN）も出力
+        texture_format: 陰影起伏テクスチャの形式（"png"、または"dds"でミップマップ付きBC1圧縮）
+        resample_kernel: 再サンプリングのカーネル（"box"、"bilinear"、"lanczos"、"area"）
+    
+    resolutionは上限として扱い、実際の取得解像度はtexture_sizeとmax_polygonsから必要な
+    最小値を取得前に決めます（raster_id指定時は取得済みのデータをそのまま使います）。
+    出力は取得したラスターから1回だけ再サンプリングします。
+    
+    vrchat_heightmap.pngはテクスチャと同じ大きさ、vrchat_mesh_heightmap.pngはポリゴン数が
+    max_polygons以内になる格子（1ピクセル = 1頂点、metadataのwidth・heightとestimated_polygons）
+    の高度マップです。起伏に応じて三角形を配分したメッシュはmesh_formatを指定してください。
+    
+    Returns:
+        最適化された地形データの情報
+    """
+    try:
+        if not output_dir:
+            output_dir = str(TEMP_DIR / "vrchat_terrain")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 出力に必要な最小の解像度で取得（取得済みなら再利用）
+        plan = _plan_vrchat_resolution(bounds, resolution, max_polygons, texture_size)
+        fetched = _get_fetched_raster(
+            collection, bounds, plan["ppu"], date_range, raster_id=raster_id
+        )
+        plan["fetched_ppu"] = fetched.ppu
+        
+        # テクスチャサイズへの再サンプリングは1回だけ行い、高度マップと陰影起伏で共有
+        texture_shape = _output_shape(fetched.bounds, texture_size)
+        
+        # ポリゴン数制約に合う格子（_plan_vrchat_resolutionと同じ実寸の縦横比、1セル = 2ポリゴン、
+        # 取得したラスターより細かくはしない）
+        rows, cols = fetched.shape
+        aspect = min(texture_shape) / max(texture_shape)
+        longest = min(int(np.sqrt(max_polygons / (2 * aspect))), max(rows, cols))
+        grid_rows, grid_cols = (max(2, n) for n in _output_shape(fetched.bounds, longest))
+        texture_height = _resample_grid(fetched.data, *texture_shape, kernel=resample_kernel)
+        height_uint16, height_min, height_max = _normalize_to_uint16(
+            texture_height, height_range or fetched.height_range
+        )
+        
+        # ファイル保存
+        heightmap_path = os.path.join(output_dir, "vrchat_heightmap.png")
+        PILImage.fromarray(height_uint16, mode='I;16').save(heightmap_path)
+        
+        # メッシュ用の高度マップ（1ピクセル = 1頂点、ポリゴン数がmax_polygons以内の格子。高さ範囲は共通）
+        mesh_height = _resample_grid(fetched.data, grid_rows, grid_cols, kernel=resample_kernel)
+        mesh_uint16 = _normalize_to_uint16(mesh_height, (height_min, height_max))[0]
+        mesh_heightmap_path = os.path.join(output_dir, "vrchat_mesh_heightmap.png")
+        PILImage.fromarray(mesh_uint16, mode='I;16').save(mesh_heightmap_path)
+        
+        # 陰影起伏のテクスチャ（高度マップの複製ではなく、見た目用のカラーテクスチャ）
+        shade = _terrain_derivatives(
+            texture_height, _pixel_spacing_meters(fetched.bounds, texture_height.shape), ("hillshade",)
+        )["maps"]["hillshade"]
+        shade_rgba = np.empty(shade.shape + (4,), dtype=np.uint8)
+        shade_rgba[:, :, :3] = shade[:, :, None]
+        shade_rgba[:, :, 3] = 255
+        texture_path = os.path.join(output_dir, f"vrchat_texture.{texture_format}")
+        texture = _write_texture(texture_path, shade_rgba, texture_format, "bc1")
+        
+        # メタデータ
+        metadata = {
+            "width": grid_cols,
+            "height": grid_rows,
+            "texture_size": texture_size,
+            "texture_shape": list(texture_shape),
+            "estimated_polygons": int((grid_rows - 1) * (grid_cols - 1) * 2),
+            "fetched_shape": [rows, cols],
+            "resolution_plan": plan,
+            "height_range": {
+                "min": height_min,
+                "max": height_max
+            },
+            "bounds": fetched.bounds,
+            "optimization": {
+                "max_polygons": max_polygons,
+                "texture_size": texture_size
+            },
+            "texture": texture
+        }
+        files = {
+            "heightmap": heightmap_path,
+            "mesh_heightmap": mesh_heightmap_path,
+            "texture": texture_path
+        }
+        
+        # 適応メッシュ（一様な縮小ではなく、起伏に応じて三角形を配分）
+        if mesh_format:
+            mesh_path = os.path.join(output_dir, f"vrchat_terrain.{mesh_format}")
+            metadata["mesh"] = _export_mesh(fetched, mesh_path, "rtin", max_polygons, mesh_format=mesh_format)
+            files["mesh"] = mesh_path
         
-        # データセット情報テキストを返す
-        return je_text
-    except Exception as e:
-        return f"Error: {str(e)}\n{traceback.format_exc()}"
-
-
-@mcp.tool()
-async def search_collections(keywords: List[str]) -> Dict[str, Any]:
-    """
-    コレクション名とバンドをキーワードで検索します。
-    
-    Args:
-        keywords: 検索キーワードのリスト（例: ["LST", "half-month"]）
-    
-    Returns:
-        検索結果の辞書（collectionsとbandsを含む）
-    """
-    try:
-        collection_list = je.ImageCollectionList()
-        collections, bands = collection_list.filter_name(keywords=keywords)
+        metadata_path = os.path.join(output_dir, "vrchat_metadata.json")
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        files["metadata"] = metadata_path
         
         return {
-            "collections": collections if isinstance(collections, list) else list(collections),
-            "bands": bands if isinstance(bands, list) else list(bands),
-            "keywords": keywords
+            "success": True,
+            "output_dir": output_dir,
+            "raster_id": fetched.raster_id,
+            "files": files,
+            "metadata": metadata,
+            "note": "VRChatのワールドサイズ制限（100MB）を考慮して最適化されています。BlenderまたはUnityでインポートして使用してください。"
         }
     except Exception as e:
         return {
@@ -100,22 +3100,70 @@ async def search_collections(keywords: List[str]) -> Dict[str, Any]:
 
 
 @mcp.tool()
-def list_available_collections() -> Dict[str, Any]:
+def export_texture_maps(
+    collection: str,
+    bounds: List[float],
+    resolution: float = 20.0,
+    date_range: Optional[List[str]] = None,
+    output_dir: Optional[str] = None
+) -> Dict[str, Any]:
     """
-    利用可能なコレクション一覧を取得します。
+    衛星画像をテクスチャマップとしてエクスポートします（Diffuse, Normal等）。
+    
+    Args:
+        collection: コレクション名
+        bounds: バウンディングボックス
+        resolution: 解像度
+        date_range: 日付範囲
+        output_dir: 出力ディレクトリ
     
     Returns:
-        利用可能なコレクションのリスト
+        エクスポートされたテクスチャマップの情報
     """
     try:
-        collection_list = je.ImageCollectionList()
-        # 空のキーワードで全コレクションを取得
-        collections, bands = collection_list.filter_name(keywords=[])
+        if not output_dir:
+            output_dir = str(TEMP_DIR / "texture_maps")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 衛星画像を取得（複数のバンドがある場合は最初のバンドを使用、キャッシュ経由）
+        result = _fetch_images(collection, dlim=date_range, ppu=resolution, bbox=bounds)
+        raster = result.raster
+        image_data = _raster_to_array(raster)
+        if np.isnan(image_data).all():
+            raise ValueError("衛星画像の取得に失敗しました")
+        # 欠損値（NaN）は正規化の前に埋める（JAXA_VOID_FILL=noneで残ったNaNは黒にする）
+        image_data = _fill_voids(image_data)[0]
+        
+        # Diffuseマップ（基本テクスチャ）
+        if len(image_data.shape) == 2:
+            # グレースケールの場合、RGBに変換
+            diffuse_data = np.stack([image_data, image_data, image_data], axis=-1)
+        else:
+            diffuse_data = image_data
+        
+        # 正規化
+        diffuse_normalized = (diffuse_data - np.nanmin(diffuse_data)) / (np.nanmax(diffuse_data) - np.nanmin(diffuse_data))
+        diffuse_uint8 = (np.nan_to_num(diffuse_normalized, nan=0.0) * 255).astype(np.uint8)
+        
+        diffuse_image = PILImage.fromarray(diffuse_uint8, mode='RGB')
+        diffuse_path = os.path.join(output_dir, "diffuse.png")
+        diffuse_image.save(diffuse_path)
+        
+        # Normalマップ（簡易版：高度データから生成）
+        height_data = image_data if len(image_data.shape) == 2 else np.mean(image_data, axis=2)
+        normal_map = _generate_normal_map(height_data, _pixel_spacing_meters(bounds, height_data.shape))
+        normal_path = os.path.join(output_dir, "normal.png")
+        normal_image = PILImage.fromarray(normal_map, mode='RGB')
+        normal_image.save(normal_path)
         
         return {
-            "collections": collections if isinstance(collections, list) else list(collections),
-            "bands": bands if isinstance(bands, list) else list(bands),
-            "total_count": len(collections) if isinstance(collections, list) else 0
+            "success": True,
+            "output_dir": output_dir,
+            "files": {
+                "diffuse": diffuse_path,
+                "normal": normal_path
+            },
+            "note": "Normalマップは高度データから簡易的に生成されています。より高品質なNormalマップが必要な場合は、専用のツールを使用してください。"
         }
     except Exception as e:
         return {
@@ -124,179 +3172,391 @@ def list_available_collections() -> Dict[str, Any]:
         }
 
 
-# ============================================================================
-# 画像取得ツール
-# ============================================================================
+# 法線マップを計算する帯の行数（帯ごとに上下1ピクセルののりしろを付けて計算）
+NORMAL_MAP_TILE_ROWS = int(os.environ.get("JAXA_NORMAL_MAP_TILE_ROWS", "512"))
 
-@mcp.tool()
-async def show_images(
-    collection: str = "JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global",
-    band: str = "DSM",
-    dlim: List[str] = ["2021-01-01T00:00:00", "2021-01-01T00:00:00"],
-    bbox: List[float] = [135.0, 37.5, 140.0, 42.5],
-) -> Any:  # Returns List[Image], but using Any to avoid Pydantic schema error
+
+def _pixel_spacing_meters(bounds: List[float], shape: tuple) -> tuple:
+    """1ピクセルの東西・南北の大きさ（メートル）"""
+    width, depth = _bounds_size_meters(bounds)
+    return width / shape[1], depth / shape[0]
+
+
+def _pad_band(height_data: "np.ndarray", row_start: int, row_end: int, padded: "np.ndarray") -> "np.ndarray":
+    """height_data[row_start:row_end]の上下左右に1ピクセルののりしろを付けてpaddedに書き込む（外周は端の値を複製）"""
+    rows, cols = height_data.shape
+    n = row_end - row_start
+    hp = padded[:n + 2, :cols + 2]
+    hp[1:n + 1, 1:cols + 1] = height_data[row_start:row_end]
+    hp[0, 1:cols + 1] = height_data[max(0, row_start - 1)]
+    hp[n + 1, 1:cols + 1] = height_data[min(rows - 1, row_end)]
+    hp[:, 0] = hp[:, 1]
+    hp[:, cols + 1] = hp[:, cols]
+    return hp
+
+
+def _horn_gradient(hp: "np.ndarray", grad_x: "np.ndarray", grad_y: "np.ndarray", spacing: tuple) -> None:
     """
-    ユーザー入力に基づいてJAXA Earth APIを使用して衛星画像を表示します。
+    のりしろ付きの帯hpから、Sobel（Horn法）で東向きの勾配dz/dxと北向きの勾配dz/dyを
+    grad_x・grad_yに書き込みます（spacingはピクセルの東西・南北の大きさ、メートル）。
+    """
+    np.subtract(hp[1:-1, 2:], hp[1:-1, :-2], out=grad_x)
+    grad_x *= 2.0
+    grad_x += hp[:-2, 2:]
+    grad_x -= hp[:-2, :-2]
+    grad_x += hp[2:, 2:]
+    grad_x -= hp[2:, :-2]
+    grad_x *= 1.0 / (8.0 * spacing[0])
     
-    Args:
-        collection: JAXA Earth APIコレクションID
-        band: コレクション内のバンド名
-        dlim: 開始から終了までの日付範囲制限。yyyy-mm-ddThh:mm:ss形式の日付文字列
-        bbox: データセットの地理的範囲（バウンディングボックス）。EPSG:4326の場合、[最小経度、最小緯度、最大経度、最大緯度]を示します
+    # 行は北から南へ並ぶため、北側（上の行）から南側（下の行）を引く
+    np.subtract(hp[:-2, 1:-1], hp[2:, 1:-1], out=grad_y)
+    grad_y *= 2.0
+    grad_y += hp[:-2, :-2]
+    grad_y -= hp[2:, :-2]
+    grad_y += hp[:-2, 2:]
+    grad_y -= hp[2:, 2:]
+    grad_y *= 1.0 / (8.0 * spacing[1])
+
+
+def _generate_normal_map(
+    height_data: "np.ndarray",
+    spacing: tuple = (1.0, 1.0),
+    out: Optional["np.ndarray"] = None,
+    tile_rows: Optional[int] = None
+) -> "np.ndarray":
     """
-    try:
-        # ターゲット画像サイズでppu（単位あたりのピクセル）を設定
-        image_size = 300  # 画像サイズターゲット
-        ppu = image_size / (bbox[2] - bbox[0])
+    高度データからNormalマップ（RGB、uint8）を生成するヘルパー関数。
+    
+    Sobelフィルタの勾配をピクセルの実際の大きさspacing（東西, 南北、メートル）で割るため、
+    斜面の傾きは実寸に比例します。緑チャンネルは北（画像の上）向きです（OpenGL形式）。
+    
+    tile_rows行ずつ上下1ピクセルののりしろ付きで計算し、float32の作業用バッファは
+    帯1つ分だけを確保して使い回します。outにメモリマップを渡せば巨大なラスターも扱えます。
+    NaNの部分は平坦（0, 0, 1）になります。
+    """
+    rows, cols = height_data.shape
+    tile_rows = max(1, min(tile_rows or NORMAL_MAP_TILE_ROWS, rows))
+    if out is None:
+        out = np.empty((rows, cols, 3), dtype=np.uint8)
+    
+    padded = np.empty((tile_rows + 2, cols + 2), dtype=np.float32)
+    normal_x = np.empty((tile_rows, cols), dtype=np.float32)
+    normal_y = np.empty_like(normal_x)
+    normal_z = np.empty_like(normal_x)
+    scratch = np.empty_like(normal_x)
+    
+    for row_start in range(0, rows, tile_rows):
+        row_end = min(rows, row_start + tile_rows)
+        n = row_end - row_start
         
-        # 画像を取得
-        data = je.ImageCollection(collection=collection, ssl_verify=True)\
-            .filter_date(dlim=dlim)\
-            .filter_resolution(ppu=ppu)\
-            .filter_bounds(bbox=bbox)\
-            .select(band=band)\
-            .get_images()
+        # のりしろ付きの帯
+        hp = _pad_band(height_data, row_start, row_end, padded)
+        nx, ny, nz, tmp = normal_x[:n], normal_y[:n], normal_z[:n], scratch[:n]
         
-        # 画像を処理して表示
-        img_data = je.ImageProcess(data)\
-            .show_images(output="buffer")
+        # 法線 = (-dz/dx, -dz/dy, 1)（東, 北, 上）
+        _horn_gradient(hp, nx, ny, spacing)
+        np.negative(nx, out=nx)
+        np.negative(ny, out=ny)
+        np.nan_to_num(nx, copy=False, nan=0.0)
+        np.nan_to_num(ny, copy=False, nan=0.0)
         
-        # PNGバッファとして画像データを返す
-        output = []
-        for png_buffer in img_data.png_buffers:
-            output.append(Image(data=png_buffer, format="png"))
-        return output
-    except Exception as e:
-        return [Image(data=f"Error: {str(e)}".encode(), format="text")]
+        # 正規化: nz = 1 / sqrt(nx^2 + ny^2 + 1)
+        np.multiply(nx, nx, out=nz)
+        np.multiply(ny, ny, out=tmp)
+        nz += tmp
+        nz += 1.0
+        np.sqrt(nz, out=nz)
+        np.reciprocal(nz, out=nz)
+        nx *= nz
+        ny *= nz
+        
+        # RGB形式に変換（-1〜1 → 0〜255）
+        block = out[row_start:row_end]
+        for channel, component in enumerate((nx, ny, nz)):
+            component += 1.0
+            component *= 127.5
+            np.copyto(block[:, :, channel], component, casting='unsafe')
+    
+    return out
 
 
-@mcp.tool()
-async def get_earth_images(
-    collection: str,
-    date_range: Optional[List[str]] = None,
-    resolution: Optional[float] = None,
-    bounds: Optional[List[float]] = None,
-    geojson_path: Optional[str] = None,
-    band: Optional[str] = None
+# ============================================================================
+# 地形の派生マップ（傾斜・方位・陰影・曲率・AO）
+# ============================================================================
+
+_TERRAIN_MAP_PRODUCTS = ("slope", "aspect", "hillshade", "curvature", "ao")
+
+
+def _horizon_ambient_occlusion(
+    height_data: "np.ndarray",
+    spacing: tuple,
+    radius: int = 32,
+    directions: int = 8
+) -> "np.ndarray":
+    """
+    地平線ベースの簡易アンビエントオクルージョン（0=完全に遮蔽、1=開けている）を計算します。
+    
+    各方向について1, 2, 4, …, radiusピクセル先の高さとの仰角の最大値（地平線の高さ）を求め、
+    sin(仰角)の平均を遮蔽率とします。距離を2倍ずつ伸ばすため、計算量は方向数×log2(radius)回の
+    配列演算で済みます。NaNの部分は遮蔽なしとして扱います。
+    """
+    rows, cols = height_data.shape
+    radius = max(1, int(radius))
+    height = np.asarray(height_data, dtype=np.float32)
+    padded = np.pad(height, radius, mode='edge')
+    
+    steps = []
+    step = 1
+    while step <= radius:
+        steps.append(step)
+        step *= 2
+    
+    offsets = []
+    for k in range(directions):
+        angle = 2.0 * np.pi * k / directions
+        # 東向き・北向きの単位ベクトル（行は北から南へ並ぶ）
+        east, north = np.sin(angle), np.cos(angle)
+        ray = []
+        for step in steps:
+            dx = int(round(east * step))
+            dy = int(round(-north * step))
+            distance = float(np.hypot(dx * spacing[0], dy * spacing[1]))
+            if distance > 0.0:
+                ray.append((dy, dx, 1.0 / distance))
+        offsets.append(ray)
+    
+    # キャッシュに収まる行数ずつ処理する
+    band_rows = max(1, (1 << 18) // max(1, cols))
+    occlusion = np.zeros((rows, cols), dtype=np.float32)
+    horizon = np.empty((band_rows, cols), dtype=np.float32)
+    rise = np.empty_like(horizon)
+    for row_start in range(0, rows, band_rows):
+        row_end = min(rows, row_start + band_rows)
+        n = row_end - row_start
+        center = height[row_start:row_end]
+        occ, hz, rs = occlusion[row_start:row_end], horizon[:n], rise[:n]
+        for ray in offsets:
+            hz.fill(0.0)
+            for dy, dx, inv_distance in ray:
+                top = radius + row_start + dy
+                shifted = padded[top:top + n, radius + dx:radius + dx + cols]
+                np.subtract(shifted, center, out=rs)
+                rs *= inv_distance
+                np.fmax(hz, rs, out=hz)
+            # sin(atan(t)) = t / sqrt(1 + t^2)
+            np.multiply(hz, hz, out=rs)
+            rs += 1.0
+            np.sqrt(rs, out=rs)
+            hz /= rs
+            occ += hz
+    
+    occlusion *= -1.0 / directions
+    occlusion += 1.0
+    return occlusion
+
+
+def _terrain_derivatives(
+    height_data: "np.ndarray",
+    spacing: tuple = (1.0, 1.0),
+    products: tuple = _TERRAIN_MAP_PRODUCTS,
+    sun_azimuth: float = 315.0,
+    sun_altitude: float = 45.0,
+    ao_radius: int = 32,
+    tile_rows: Optional[int] = None
 ) -> Dict[str, Any]:
     """
-    日付、解像度、範囲、バンドを指定して地球観測画像を取得します。
+    標高データから傾斜・方位・陰影起伏・曲率・AOのマップ（uint8のグレースケール）を生成します。
     
-    Args:
-        collection: コレクション名（例: "JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global"）
-        date_range: 日付範囲 [開始日, 終了日] (ISO形式: "YYYY-MM-DDTHH:MM:SS")
-        resolution: 解像度（ppu: Pixels Per Unit）
-        bounds: バウンディングボックス [min_lon, min_lat, max_lon, max_lat]
-        geojson_path: GeoJSONファイルのパス（boundsより優先）
-        band: バンド名（例: "DSM"）
+    _generate_normal_mapと同じくtile_rows行ずつのりしろ付きで処理し、帯ごとに1回だけ
+    Sobel勾配を計算して傾斜・方位・陰影起伏に共有します。曲率は同じ帯の2階差分から求めます。
+    
+    エンコード:
+        slope: 傾斜角 0〜90度 → 0〜255
+        aspect: 下り斜面の向き（北から時計回り）0〜360度 → 0〜255（平坦は0）
+        hillshade: sun_azimuth・sun_altitudeの光源による陰影 0〜1 → 0〜255
+        curvature: 凸が正の曲率（-ラプラシアン×100）を±curvature_scaleで128中心に割り当て
+        ao: 地平線ベースのAO 0〜1 → 0〜255
     
     Returns:
-        取得した画像データの情報
+        {"maps": {名前: uint8配列}, "curvature_scale": float or None}
     """
-    try:
-        # ImageCollectionを作成
-        image_collection = je.ImageCollection(collection)
+    rows, cols = height_data.shape
+    tile_rows = max(1, min(tile_rows or NORMAL_MAP_TILE_ROWS, rows))
+    maps = {name: np.empty((rows, cols), dtype=np.uint8) for name in products if name != "curvature"}
+    curvature = np.empty((rows, cols), dtype=np.float32) if "curvature" in products else None
+    
+    azimuth = np.radians(sun_azimuth)
+    altitude = np.radians(sun_altitude)
+    light = (np.sin(azimuth) * np.cos(altitude), np.cos(azimuth) * np.cos(altitude), np.sin(altitude))
+    
+    padded = np.empty((tile_rows + 2, cols + 2), dtype=np.float32)
+    grad_x = np.empty((tile_rows, cols), dtype=np.float32)
+    grad_y = np.empty_like(grad_x)
+    steepness = np.empty_like(grad_x)
+    work = np.empty_like(grad_x)
+    
+    def _store(name: str, values: "np.ndarray", row_start: int, row_end: int) -> None:
+        values += 0.5
+        np.clip(values, 0.0, 255.0, out=values)
+        np.copyto(maps[name][row_start:row_end], values, casting='unsafe')
+    
+    for row_start in range(0, rows, tile_rows):
+        row_end = min(rows, row_start + tile_rows)
+        n = row_end - row_start
         
-        # 日付フィルタ
-        if date_range:
-            image_collection = image_collection.filter_date(date_range)
-        else:
-            # デフォルト: 2021年のデータ
-            image_collection = image_collection.filter_date([
-                "2021-01-01T00:00:00",
-                "2021-12-31T23:59:59"
-            ])
-        
-        # 解像度フィルタ
-        if resolution:
-            image_collection = image_collection.filter_resolution(resolution)
-        
-        # 範囲フィルタ
-        if geojson_path and os.path.exists(geojson_path):
-            geoj = je.FeatureCollection().read(geojson_path).select([])
-            image_collection = image_collection.filter_bounds(geoj=geoj[0] if geoj else None)
-        elif bounds:
-            image_collection = image_collection.filter_bounds(bbox=bounds)
-        
-        # バンド選択
-        if band:
-            image_collection = image_collection.select(band)
-        
-        # 画像取得
-        result = image_collection.get_images()
+        hp = _pad_band(height_data, row_start, row_end, padded)
+        gx, gy, t, w = grad_x[:n], grad_y[:n], steepness[:n], work[:n]
         
-        # 結果情報を返す
-        raster = result.raster if hasattr(result, 'raster') else None
-        if raster:
-            return {
-                "success": True,
-                "collection": collection,
-                "raster_info": {
-                    "shape": getattr(raster, 'img', {}).shape if hasattr(raster, 'img') else None,
-                    "latlim": getattr(raster, 'latlim', None),
-                    "lonlim": getattr(raster, 'lonlim', None)
-                }
-            }
-        else:
-            return {
-                "success": False,
-                "message": "画像の取得に失敗しました"
-            }
-    except Exception as e:
-        return {
-            "error": str(e),
-            "traceback": traceback.format_exc()
-        }
-
+        # 共有の勾配（NaNの部分は平坦として扱う）
+        _horn_gradient(hp, gx, gy, spacing)
+        np.nan_to_num(gx, copy=False, nan=0.0)
+        np.nan_to_num(gy, copy=False, nan=0.0)
+        np.hypot(gx, gy, out=t)
+        
+        if "slope" in maps:
+            np.arctan(t, out=w)
+            w *= 255.0 / (np.pi / 2.0)
+            _store("slope", w, row_start, row_end)
+        
+        if "aspect" in maps:
+            # 下り斜面の方向ベクトル（-dz/dx, -dz/dy）の方位角
+            np.arctan2(-gx, -gy, out=w)
+            w *= 180.0 / np.pi
+            w %= 360.0
+            w *= 255.0 / 360.0
+            w[t == 0.0] = 0.0
+            _store("aspect", w, row_start, row_end)
+        
+        if "hillshade" in maps:
+            # 法線(-gx, -gy, 1)/|n| と光源ベクトルの内積
+            np.multiply(gx, -light[0], out=w)
+            w -= gy * light[1]
+            w += light[2]
+            w /= np.sqrt(t * t + 1.0)
+            np.maximum(w, 0.0, out=w)
+            w *= 255.0
+            _store("hillshade", w, row_start, row_end)
+        
+        if curvature is not None:
+            center = hp[1:-1, 1:-1]
+            c = curvature[row_start:row_end]
+            np.add(hp[1:-1, 2:], hp[1:-1, :-2], out=c)
+            c -= 2.0 * center
+            c *= 1.0 / (spacing[0] * spacing[0])
+            np.add(hp[:-2, 1:-1], hp[2:, 1:-1], out=w)
+            w -= 2.0 * center
+            w *= 1.0 / (spacing[1] * spacing[1])
+            c += w
+            c *= -100.0
+            np.nan_to_num(c, copy=False, nan=0.0)
+    
+    result = {"maps": maps, "curvature_scale": None}
+    
+    if curvature is not None:
+        # 外れ値で階調がつぶれないよう、絶対値の99パーセンタイルを±端にする
+        scale = float(np.percentile(np.abs(curvature), 99)) or 1.0
+        curvature *= 127.0 / scale
+        curvature += 128.0
+        maps["curvature"] = np.empty((rows, cols), dtype=np.uint8)
+        for row_start in range(0, rows, tile_rows):
+            row_end = min(rows, row_start + tile_rows)
+            _store("curvature", curvature[row_start:row_end], row_start, row_end)
+        result["curvature_scale"] = scale
+    
+    if "ao" in maps:
+        ao = _horizon_ambient_occlusion(height_data, spacing, ao_radius)
+        ao *= 255.0
+        _store("ao", ao, 0, rows)
+    
+    return result
 
-# ============================================================================
-# 画像処理ツール
-# ============================================================================
 
 @mcp.tool()
-async def calc_spatial_stats(
+def export_terrain_maps(
     collection: str,
+    bounds: List[float],
+    resolution: float = 20.0,
     date_range: Optional[List[str]] = None,
-    bounds: Optional[List[float]] = None,
-    band: Optional[str] = None
+    output_dir: Optional[str] = None,
+    products: Optional[List[str]] = None,
+    sun_azimuth: float = 315.0,
+    sun_altitude: float = 45.0,
+    ao_radius: int = 32,
+    raster_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
-    空間統計を計算します。
+    標高データから傾斜・方位・陰影起伏・曲率・AOのテクスチャマップをまとめて生成します。
+    
+    標高データは1回だけ取得し、勾配も1回の計算を全マップで共有します。
+    各マップは8ビットのグレースケールPNGで、エンコードはterrain_maps.jsonに記録されます。
     
     Args:
         collection: コレクション名
-        date_range: 日付範囲
         bounds: バウンディングボックス
-        band: バンド名
+        resolution: 解像度
+        date_range: 日付範囲
+        output_dir: 出力ディレクトリ（オプション）
+        products: 生成するマップ（"slope", "aspect", "hillshade", "curvature", "ao"、デフォルト: すべて）
+        sun_azimuth: 陰影起伏の光源の方位角（北から時計回り、度）
+        sun_altitude: 陰影起伏の光源の高度角（度）
+        ao_radius: AOで地平線を探す距離（ピクセル）
+        raster_id: 以前のツール呼び出しで返されたraster_id（指定時は再取得しない）
     
     Returns:
-        空間統計結果（mean, std, min, max, median）
+        生成したマップのパスとエンコード情報
     """
     try:
-        # 公式v0.1.5スタイルに合わせる
-        collection_param = collection if collection else "JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global"
-        band_param = band if band else "DSM"
-        dlim_param = date_range if date_range else ["2021-01-01T00:00:00", "2021-01-01T00:00:00"]
-        bbox_param = bounds if bounds else [135.0, 37.5, 140.0, 42.5]
+        products = tuple(products or _TERRAIN_MAP_PRODUCTS)
+        unknown = [name for name in products if name not in _TERRAIN_MAP_PRODUCTS]
+        if unknown:
+            return {"error": f"未対応のマップです: {unknown}（対応: {list(_TERRAIN_MAP_PRODUCTS)}）"}
         
-        # ターゲット画像サイズでppuを設定
-        image_size = 300
-        ppu = image_size / (bbox_param[2] - bbox_param[0])
+        if not output_dir:
+            output_dir = str(TEMP_DIR / "terrain_maps")
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 高度データを取得（取得済みなら再利用）
+        fetched = _get_fetched_raster(collection, bounds, resolution, date_range, raster_id=raster_id)
+        height_data = fetched.data
+        spacing = _pixel_spacing_meters(fetched.bounds, height_data.shape)
         
-        # 画像を取得
-        data = je.ImageCollection(collection=collection_param, ssl_verify=True)\
-            .filter_date(dlim=dlim_param)\
-            .filter_resolution(ppu=ppu)\
-            .filter_bounds(bbox=bbox_param)\
-            .select(band=band_param)\
-            .get_images()
+        derived = _terrain_derivatives(
+            height_data, spacing, products, sun_azimuth, sun_altitude, ao_radius
+        )
         
-        # 画像を処理
-        img_data = je.ImageProcess(data)\
-            .calc_spatial_stats()
+        files = {}
+        for name in products:
+            path = os.path.join(output_dir, f"{name}.png")
+            PILImage.fromarray(derived["maps"][name], mode='L').save(path)
+            files[name] = path
         
-        # 統計結果を返す
-        return img_data.timeseries if hasattr(img_data, 'timeseries') else {}
+        encodings = {
+            "slope": {"unit": "degrees", "range": [0, 90]},
+            "aspect": {"unit": "degrees_clockwise_from_north", "range": [0, 360], "flat": 0},
+            "hillshade": {"sun_azimuth": sun_azimuth, "sun_altitude": sun_altitude, "range": [0, 1]},
+            "curvature": {"unit": "1/100 m^-1 (convex positive)", "center": 128, "scale": derived["curvature_scale"]},
+            "ao": {"radius_pixels": ao_radius, "range": [0, 1]}
+        }
+        metadata = {
+            "collection": collection,
+            "bounds": fetched.bounds,
+            "resolution": resolution,
+            "shape": list(height_data.shape),
+            "pixel_spacing_meters": list(spacing),
+            "encodings": {name: encodings[name] for name in products}
+        }
+        metadata_path = os.path.join(output_dir, "terrain_maps.json")
+        with open(metadata_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        
+        return {
+            "success": True,
+            "output_dir": output_dir,
+            "raster_id": fetched.raster_id,
+            "files": files,
+            "metadata_path": metadata_path,
+            "encodings": metadata["encodings"]
+        }
     except Exception as e:
         return {
             "error": str(e),
@@ -304,87 +3564,215 @@ async def calc_spatial_stats(
         }
 
 
-@mcp.tool()
-async def show_spatial_stats(
-    collection: str = "JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global",
-    band: str = "DSM",
-    dlim: List[str] = ["2021-01-01T00:00:00", "2021-01-01T00:00:00"],
-    bbox: List[float] = [135.0, 37.5, 140.0, 42.5],
-) -> Any:  # Returns List[Image], but using Any to avoid Pydantic schema error
+# ============================================================================
+# スプラットマップ（Unity/VRChatの地形レイヤー）
+# ============================================================================
+
+# RGBAの各チャンネルに割り当てるレイヤー
+_SPLATMAP_LAYERS = ("vegetation", "rock", "soil", "snow")
+# 植生とみなす土地被覆の分類コード（JAXA高解像度土地利用土地被覆図: 水田・畑・草地・森林・竹林・湿地など）
+SPLATMAP_VEGETATION_CLASSES = (3, 4, 5, 6, 7, 8, 9, 10, 13)
+
+
+def _smoothstep(values: "np.ndarray", low: float, high: float) -> "np.ndarray":
+    """low〜highで0から1へ滑らかに変化する重み（valuesを上書き）"""
+    values -= low
+    values *= 1.0 / max(high - low, 1e-6)
+    np.clip(values, 0.0, 1.0, out=values)
+    # t^2 * (3 - 2t)
+    weight = values * values
+    values *= -2.0
+    values += 3.0
+    values *= weight
+    return values
+
+
+def _splatmap_weights(
+    height_data: "np.ndarray",
+    spacing: tuple,
+    vegetation: Optional["np.ndarray"] = None,
+    rock_slope: tuple = (30.0, 45.0),
+    snow_line: Optional[float] = None,
+    snow_blend: float = 100.0,
+    tile_rows: Optional[int] = None
+) -> "np.ndarray":
     """
-    ユーザー入力に基づいてJAXA Earth APIを使用して衛星データの空間統計結果画像を表示します。
+    標高と傾斜（と植生の重み0〜1）から、_SPLATMAP_LAYERSの順のRGBAスプラットマップ（uint8）を生成します。
     
-    Args:
-        collection: JAXA Earth APIコレクションID
-        band: コレクション内のバンド名
-        dlim: 開始から終了までの日付範囲制限。yyyy-mm-ddThh:mm:ss形式の日付文字列
-        bbox: データセットの地理的範囲（バウンディングボックス）
+    帯ごとに1回だけ勾配を計算し、次の規則で重みを決めます（各ピクセルの合計は1）:
+        rock: 傾斜がrock_slopeの範囲で0→1
+        snow: 岩以外のうち、標高がsnow_line±snow_blendの範囲で0→1
+        vegetation: 残りに植生の重みを掛けたもの（植生データがなければ残りすべて）
+        soil: 残りのうち植生以外
     """
-    try:
-        # ターゲット画像サイズでppuを設定
-        image_size = 300
-        ppu = image_size / (bbox[2] - bbox[0])
+    rows, cols = height_data.shape
+    tile_rows = max(1, min(tile_rows or NORMAL_MAP_TILE_ROWS, rows))
+    out = np.empty((rows, cols, len(_SPLATMAP_LAYERS)), dtype=np.uint8)
+    
+    padded = np.empty((tile_rows + 2, cols + 2), dtype=np.float32)
+    grad_x = np.empty((tile_rows, cols), dtype=np.float32)
+    grad_y = np.empty_like(grad_x)
+    
+    for row_start in range(0, rows, tile_rows):
+        row_end = min(rows, row_start + tile_rows)
+        n = row_end - row_start
         
-        # 画像を取得
-        data = je.ImageCollection(collection=collection, ssl_verify=True)\
-            .filter_date(dlim=dlim)\
-            .filter_resolution(ppu=ppu)\
-            .filter_bounds(bbox=bbox)\
-            .select(band=band)\
-            .get_images()
+        hp = _pad_band(height_data, row_start, row_end, padded)
+        gx, gy = grad_x[:n], grad_y[:n]
+        _horn_gradient(hp, gx, gy, spacing)
+        np.nan_to_num(gx, copy=False, nan=0.0)
+        np.nan_to_num(gy, copy=False, nan=0.0)
         
-        # 画像を処理して表示
-        img_data = je.ImageProcess(data)\
-            .calc_spatial_stats()\
-            .show_spatial_stats(output="buffer")
+        # 傾斜角（度）→ 岩
+        rock = np.hypot(gx, gy)
+        np.arctan(rock, out=rock)
+        rock *= 180.0 / np.pi
+        _smoothstep(rock, rock_slope[0], rock_slope[1])
+        rest = 1.0 - rock
         
-        # PNGバッファとして画像データを返す
-        output_images = []
-        for png_buffer in img_data.png_buffers_stats:
-            output_images.append(Image(data=png_buffer, format="png"))
+        # 標高 → 雪
+        if snow_line is not None:
+            snow = np.nan_to_num(hp[1:-1, 1:-1], nan=-np.inf)
+            _smoothstep(snow, snow_line - snow_blend, snow_line + snow_blend)
+            snow *= rest
+            rest -= snow
+        else:
+            snow = np.zeros_like(rest)
+        
+        # 植生 → 残りを植生と土に分ける
+        if vegetation is not None:
+            green = rest * vegetation[row_start:row_end]
+        else:
+            green = rest.copy()
+        rest -= green
         
-        return output_images
-    except Exception as e:
-        return [Image(data=f"Error: {str(e)}".encode(), format="text")]
+        block = out[row_start:row_end]
+        for channel, weight in enumerate((green, rock, rest, snow)):
+            weight *= 255.0
+            weight += 0.5
+            np.clip(weight, 0.0, 255.0, out=weight)
+            np.copyto(block[:, :, channel], weight, casting='unsafe')
+    
+    return out
 
 
 @mcp.tool()
-async def calc_temporal_stats(
+def create_splatmap(
     collection: str,
-    date_range: List[str],
-    method: str = "mean",
-    bounds: Optional[List[float]] = None,
-    band: Optional[str] = None
+    bounds: List[float],
+    resolution: float = 20.0,
+    texture_size: int = 2048,
+    date_range: Optional[List[str]] = None,
+    output_dir: Optional[str] = None,
+    raster_id: Optional[str] = None,
+    landcover_collection: Optional[str] = None,
+    landcover_band: Optional[str] = None,
+    vegetation_classes: Optional[List[int]] = None,
+    ndvi_collection: Optional[str] = None,
+    ndvi_band: Optional[str] = None,
+    ndvi_range: Optional[List[float]] = None,
+    rock_slope: Optional[List[float]] = None,
+    snow_line: Optional[float] = None,
+    snow_blend: float = 100.0
 ) -> Dict[str, Any]:
     """
-    時間統計を計算します。
+    Unity/VRChatの地形レイヤー用のRGBAスプラットマップ（アルファマップ）を生成します。
+    
+    R=植生、G=岩、B=土、A=雪の重み（合計255）をtexture_size×texture_sizeで書き出します。
+    標高データはraster_id（create_vrchat_terrain等の戻り値）があれば再取得せずに使い、
+    土地被覆・NDVIのコレクションを指定した場合は同じ範囲・解像度で取得して植生の判定に使います。
     
     Args:
-        collection: コレクション名
-        date_range: 日付範囲
-        method: 統計手法 ("mean", "max", "min", "std", "median")
+        collection: 標高データのコレクション名
         bounds: バウンディングボックス
-        band: バンド名
+        resolution: 解像度
+        texture_size: スプラットマップのサイズ（Unityのalphamap resolution）
+        date_range: 日付範囲
+        output_dir: 出力ディレクトリ（オプション）
+        raster_id: 以前のツール呼び出しで返されたraster_id（指定時は再取得しない）
+        landcover_collection: 土地被覆のコレクション名（オプション）
+        landcover_band: 土地被覆のバンド名
+        vegetation_classes: 植生とみなす土地被覆の分類コード（デフォルト: SPLATMAP_VEGETATION_CLASSES）
+        ndvi_collection: NDVIのコレクション名（オプション）
+        ndvi_band: NDVIのバンド名
+        ndvi_range: 植生の重みが0→1になるNDVIの範囲（デフォルト: [0.2, 0.6]）
+        rock_slope: 岩の重みが0→1になる傾斜角の範囲（度、デフォルト: [30, 45]）
+        snow_line: 雪線の標高（m、指定しない場合は雪レイヤーなし）
+        snow_blend: 雪線の上下でぼかす幅（m）
     
     Returns:
-        時間統計結果
+        生成したスプラットマップの情報
     """
     try:
-        image_collection = je.ImageCollection(collection)
-        image_collection = image_collection.filter_date(date_range)
-        if bounds:
-            image_collection = image_collection.filter_bounds(bbox=bounds)
-        if band:
-            image_collection = image_collection.select(band)
+        if not output_dir:
+            output_dir = str(TEMP_DIR / "splatmap")
+        os.makedirs(output_dir, exist_ok=True)
+        rock_slope = tuple(rock_slope or (30.0, 45.0))
+        ndvi_range = tuple(ndvi_range or (0.2, 0.6))
+        
+        # 高度データを取得（取得済みなら再利用）
+        fetched = _get_fetched_raster(collection, bounds, resolution, date_range, raster_id=raster_id)
+        bounds = fetched.bounds
+        height = _resample_grid(fetched.data, texture_size, texture_size)
+        
+        # 植生の重み（土地被覆とNDVIの両方を指定した場合は積）
+        vegetation = None
+        sources = {"dsm": fetched.raster_id}
+        if landcover_collection:
+            landcover = _get_fetched_raster(
+                landcover_collection, bounds, resolution, date_range, band=landcover_band, fill_voids=False
+            )
+            classes = _resample_nearest(landcover.data, texture_size, texture_size)
+            vegetation = np.isin(classes, vegetation_classes or SPLATMAP_VEGETATION_CLASSES).astype(np.float32)
+            sources["landcover"] = landcover.raster_id
+        if ndvi_collection:
+            ndvi = _get_fetched_raster(
+                ndvi_collection, bounds, resolution, date_range, band=ndvi_band, fill_voids=False
+            )
+            green = _smoothstep(_resample_grid(ndvi.data, texture_size, texture_size), *ndvi_range)
+            vegetation = green if vegetation is None else vegetation * green
+            sources["ndvi"] = ndvi.raster_id
         
-        result = image_collection.get_images()
-        img_process = je.ImageProcess(result)
-        img_process = img_process.calc_temporal_stats(method_query=method)
+        splatmap = _splatmap_weights(
+            height,
+            _pixel_spacing_meters(bounds, height.shape),
+            vegetation,
+            rock_slope,
+            snow_line,
+            snow_blend
+        )
+        splatmap_path = os.path.join(output_dir, "splatmap.png")
+        PILImage.fromarray(splatmap, mode='RGBA').save(splatmap_path)
+        
+        coverage = splatmap.reshape(-1, len(_SPLATMAP_LAYERS)).mean(axis=0) / 255.0
+        metadata = {
+            "texture_size": texture_size,
+            "bounds": bounds,
+            "channels": dict(zip("RGBA", _SPLATMAP_LAYERS)),
+            "coverage": {name: round(float(value), 4) for name, value in zip(_SPLATMAP_LAYERS, coverage)},
+            "rules": {
+                "rock_slope": list(rock_slope),
+                "snow_line": snow_line,
+                "snow_blend": snow_blend,
+                "ndvi_range": list(ndvi_range) if ndvi_collection else None,
+                "vegetation_classes": list(vegetation_classes or SPLATMAP_VEGETATION_CLASSES) if landcover_collection else None
+            },
+            "sources": sources
+        }
+        metadata_path = os.path.join(output_dir, "splatmap.json")
+        with open(metadata_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2, ensure_ascii=False)
         
         return {
             "success": True,
-            "method": method,
-            "temporal_statistics": "計算完了"
+            "output_dir": output_dir,
+            "raster_id": fetched.raster_id,
+            "files": {
+                "splatmap": splatmap_path,
+                "metadata": metadata_path
+            },
+            "metadata": metadata,
+            "note": "UnityではTerrainLayerを植生・岩・土・雪の順に4つ設定し、各チャンネルをアルファマップとして割り当ててください。"
         }
     except Exception as e:
         return {
@@ -394,66 +3782,335 @@ async def calc_temporal_stats(
 
 
 # ============================================================================
-# GeoJSON処理ツール
+# テクスチャ（ミップマップ・アトラス・ブロック圧縮）
 # ============================================================================
 
-@mcp.tool()
-def read_geojson(file_path: str) -> Dict[str, Any]:
+# DDSに書き出せる形式とFourCC
+_DDS_COMPRESSIONS = {"bc1": b"DXT1", "bc3": b"DXT5", "none": None}
+# 1ピクセルあたりのバイト数（VRAM見積もり用）
+_TEXTURE_BYTES_PER_PIXEL = {"bc1": 0.5, "bc3": 1.0, "none": 4.0}
+
+
+def _downsample_image_2x(image: "np.ndarray", mip_filter: str = "box") -> "np.ndarray":
+    """uint8の画像（H×W×C）を縦横1/2に縮小（奇数の辺は切り捨て）"""
+    current = _resample(image, image.shape[0] // 2, image.shape[1] // 2, mip_filter)
+    current += 0.5
+    return np.clip(current, 0, 255).astype(np.uint8)
+
+
+def _build_mip_chain(image: "np.ndarray", mip_filter: str = "box") -> List["np.ndarray"]:
     """
-    GeoJSONファイルを読み込みます。
+    uint8の画像（H×W×C）から1×1までのミップマップ列を生成します。
+    各レベルは前のレベルを_resample()で縦横1/2に縮小したものです。
+    """
+    if mip_filter not in _RESAMPLE_KERNELS:
+        raise ValueError(f"未対応のミップマップフィルタです: {mip_filter}（対応: {', '.join(_RESAMPLE_KERNELS)}）")
+    levels = [image]
+    while levels[-1].shape[0] > 1 or levels[-1].shape[1] > 1:
+        levels.append(_downsample_image_2x(levels[-1], mip_filter))
+    return levels
+
+
+def _pack_atlas(
+    images: Dict[str, "np.ndarray"],
+    max_size: int = 2048,
+    padding: int = 4
+) -> Dict[str, Any]:
+    """
+    RGBA画像を高さ順の棚詰め（シェルフパッキング）で2のべき乗の正方形アトラスに詰めます。
     
-    Args:
-        file_path: GeoJSONファイルのパス
+    各タイルの周囲にpaddingピクセルの端の複製を付け、ミップマップでの色のにじみを防ぎます。
+    max_sizeに収まらない場合は全タイルを1/2に縮小して詰め直します。
     
     Returns:
-        読み込んだGeoJSONデータの情報
+        {"image": アトラス（uint8 RGBA）, "size": 1辺, "scale": 縮小率, "rects": {名前: {x, y, width, height, uv}}}
     """
-    try:
-        if not os.path.exists(file_path):
-            return {
-                "error": f"ファイルが見つかりません: {file_path}"
-            }
-        
-        feature_collection = je.FeatureCollection().read(file_path)
-        features = feature_collection.select([])
-        
-        return {
-            "success": True,
-            "file_path": file_path,
-            "feature_count": len(features) if isinstance(features, list) else 1
+    scale = 1.0
+    tiles = dict(images)
+    while True:
+        placements = {}
+        padded_sizes = {
+            name: (tile.shape[0] + 2 * padding, tile.shape[1] + 2 * padding) for name, tile in tiles.items()
         }
-    except Exception as e:
-        return {
-            "error": str(e),
-            "traceback": traceback.format_exc()
+        widest = max(w for _, w in padded_sizes.values())
+        area = sum(h * w for h, w in padded_sizes.values())
+        size = 1 << max(0, int(np.ceil(np.log2(max(widest, np.sqrt(area))))))
+        while size <= max_size:
+            x = y = shelf_height = 0
+            placements = {}
+            for name in sorted(tiles, key=lambda k: padded_sizes[k][0], reverse=True):
+                h, w = padded_sizes[name]
+                if x + w > size:
+                    x, y, shelf_height = 0, y + shelf_height, 0
+                if y + h > size:
+                    placements = None
+                    break
+                placements[name] = (x, y)
+                x += w
+                shelf_height = max(shelf_height, h)
+            if placements:
+                break
+            size *= 2
+        if placements and size <= max_size:
+            break
+        # 収まらない場合は全タイルを縮小
+        if all(tile.shape[:2] == (1, 1) for tile in tiles.values()):
+            raise ValueError(f"max_size={max_size}のアトラスにタイルが収まりません")
+        scale *= 0.5
+        tiles = {name: _downsample_image_2x(tile) for name, tile in tiles.items()}
+    
+    atlas = np.zeros((size, size, 4), dtype=np.uint8)
+    rects = {}
+    for name, (x, y) in placements.items():
+        tile = tiles[name]
+        h, w = tile.shape[:2]
+        atlas[y:y + h + 2 * padding, x:x + w + 2 * padding] = np.pad(
+            tile, ((padding, padding), (padding, padding), (0, 0)), mode='edge'
+        )
+        left, top = x + padding, y + padding
+        rects[name] = {
+            "x": left,
+            "y": top,
+            "width": w,
+            "height": h,
+            # UVは左下原点（u0, v0, u1, v1）
+            "uv": [left / size, 1.0 - (top + h) / size, (left + w) / size, 1.0 - top / size]
         }
+    return {"image": atlas, "size": size, "scale": scale, "rects": rects}
+
+
+def _to_blocks(image: "np.ndarray") -> "np.ndarray":
+    """画像を4×4ブロックに分割（辺は端の複製で4の倍数に拡張）→ (ブロック数, 16, チャンネル)"""
+    h, w, channels = image.shape
+    ph, pw = -h % 4, -w % 4
+    if ph or pw:
+        image = np.pad(image, ((0, ph), (0, pw), (0, 0)), mode='edge')
+    bh, bw = image.shape[0] // 4, image.shape[1] // 4
+    blocks = image.reshape(bh, 4, bw, 4, channels).transpose(0, 2, 1, 3, 4)
+    return blocks.reshape(bh * bw, 16, channels)
+
+
+def _pack_565(rgb: "np.ndarray") -> "np.ndarray":
+    r = np.rint(rgb[:, 0] * (31.0 / 255.0)).astype(np.uint16)
+    g = np.rint(rgb[:, 1] * (63.0 / 255.0)).astype(np.uint16)
+    b = np.rint(rgb[:, 2] * (31.0 / 255.0)).astype(np.uint16)
+    return (r << 11) | (g << 5) | b
+
+
+def _unpack_565(color: "np.ndarray") -> "np.ndarray":
+    r = (color >> 11) & 31
+    g = (color >> 5) & 63
+    b = color & 31
+    return np.stack([(r << 3) | (r >> 2), (g << 2) | (g >> 4), (b << 3) | (b >> 2)], axis=-1).astype(np.float32)
+
+
+def _encode_bc1_blocks(pixels: "np.ndarray") -> "np.ndarray":
+    """
+    4×4ブロックのRGB（ブロック数, 16, 3）をBC1（DXT1）の4色モードで圧縮します。
+    
+    端点はブロックの色の範囲（主成分の向きに合わせて対角を選択し、1/16だけ内側に寄せる）、
+    各ピクセルは端点を結ぶ直線への射影で4色のいずれかに割り当てます。
+    """
+    # (チャンネル, ブロック数, 16)に並べ替え、ブロック内の集計を連続したメモリ上で行う
+    px = np.ascontiguousarray(pixels.transpose(2, 0, 1), dtype=np.float32)
+    lo = px.min(axis=2)
+    hi = px.max(axis=2)
+    
+    # 最も幅の広いチャンネルと負の相関を持つチャンネルは端点を入れ替える（対角の選択）
+    centered = px - px.mean(axis=2, keepdims=True)
+    widest = np.argmax(hi - lo, axis=0)
+    ref = np.take_along_axis(centered, widest[None, :, None], axis=0)
+    flip = np.einsum('cnk,cnk->cn', centered, np.broadcast_to(ref, centered.shape)) < 0
+    lo_fit, hi_fit = np.where(flip, hi, lo), np.where(flip, lo, hi)
+    inset = (hi_fit - lo_fit) / 16.0
+    c0 = _pack_565(np.clip(hi_fit - inset, 0, 255).T)
+    c1 = _pack_565(np.clip(lo_fit + inset, 0, 255).T)
+    
+    # c0 > c1 で4色モード
+    swap = c0 < c1
+    c0, c1 = np.where(swap, c1, c0), np.where(swap, c0, c1)
+    e0, e1 = _unpack_565(c0).T, _unpack_565(c1).T
+    axis = e0 - e1
+    denom = np.maximum((axis * axis).sum(axis=0), 1e-6)
+    t = np.einsum('cnk,cn->nk', px - e1[:, :, None], axis / denom)
+    level = np.clip(np.rint(t * 3.0), 0, 3).astype(np.uint32)
+    # t=1 → c0(0), t=2/3 → 2, t=1/3 → 3, t=0 → c1(1)
+    index = np.array([1, 3, 2, 0], dtype=np.uint32)[level]
+    index[c0 == c1] = 0
+    
+    blocks = np.empty(len(c0), dtype=[("c0", "<u2"), ("c1", "<u2"), ("index", "<u4")])
+    blocks["c0"] = c0
+    blocks["c1"] = c1
+    index <<= 2 * np.arange(16, dtype=np.uint32)
+    blocks["index"] = np.bitwise_or.reduce(index, axis=1)
+    return blocks
+
+
+def _encode_bc3_alpha_blocks(alpha: "np.ndarray") -> "np.ndarray":
+    """4×4ブロックのアルファ（ブロック数, 16）をBC3のアルファブロック（8アルファモード）に圧縮"""
+    a = alpha.astype(np.float32)
+    a0 = a.max(axis=1)
+    a1 = a.min(axis=1)
+    t = (a - a1[:, None]) / np.maximum(a0 - a1, 1e-6)[:, None]
+    level = np.clip(np.rint(t * 7.0), 0, 7).astype(np.uint64)
+    # t=1 → a0(0), t=0 → a1(1), 中間は8-level
+    index = np.where(level == 7, 0, np.where(level == 0, 1, 8 - level)).astype(np.uint64)
+    index[a0 == a1] = 0
+    index <<= 3 * np.arange(16, dtype=np.uint64)
+    bits = np.bitwise_or.reduce(index, axis=1)
+    return (
+        a0.astype(np.uint64) | (a1.astype(np.uint64) << np.uint64(8)) | (bits << np.uint64(16))
+    ).astype("<u8")
+
+
+def _encode_texture_level(image: "np.ndarray", compression: str) -> bytes:
+    """RGBAの1レベルを指定の形式のバイト列に変換"""
+    if compression == "none":
+        return np.ascontiguousarray(image, dtype=np.uint8).tobytes()
+    blocks = _to_blocks(image)
+    color = _encode_bc1_blocks(blocks[:, :, :3])
+    if compression == "bc1":
+        return color.tobytes()
+    combined = np.empty(len(blocks), dtype=[("alpha", "<u8"), ("color", color.dtype)])
+    combined["alpha"] = _encode_bc3_alpha_blocks(blocks[:, :, 3])
+    combined["color"] = color
+    return combined.tobytes()
+
+
+def _write_dds(path: str, levels: List["np.ndarray"], compression: str = "bc1") -> int:
+    """
+    ミップマップ列（RGBA uint8）をDDSファイルに書き出します。
+    compressionは"bc1"（DXT1）、"bc3"（DXT5）、"none"（32ビットRGBA）です。
+    
+    Returns:
+        書き出したピクセルデータのバイト数（VRAM使用量の目安）
+    """
+    if compression not in _DDS_COMPRESSIONS:
+        raise ValueError(f"未対応の圧縮形式です: {compression}（対応: {list(_DDS_COMPRESSIONS)}）")
+    height, width = levels[0].shape[:2]
+    payloads = [_encode_texture_level(level, compression) for level in levels]
+    
+    fourcc = _DDS_COMPRESSIONS[compression]
+    # DDSD_CAPS | HEIGHT | WIDTH | PIXELFORMAT | MIPMAPCOUNT | (LINEARSIZE or PITCH)
+    flags = 0x1 | 0x2 | 0x4 | 0x1000 | 0x20000 | (0x80000 if fourcc else 0x8)
+    pitch = len(payloads[0]) if fourcc else width * 4
+    if fourcc:
+        pixel_format = struct.pack("<II4sIIIII", 32, 0x4, fourcc, 0, 0, 0, 0, 0)
+    else:
+        # DDPF_RGB | DDPF_ALPHAPIXELS、メモリ上の並びはR, G, B, A
+        pixel_format = struct.pack("<II4sIIIII", 32, 0x41, b"\0\0\0\0", 32, 0xFF, 0xFF00, 0xFF0000, 0xFF000000)
+    # DDSCAPS_TEXTURE | COMPLEX | MIPMAP
+    caps = 0x1000 | 0x8 | 0x400000
+    header = (
+        struct.pack("<7I", 124, flags, height, width, pitch, 0, len(levels))
+        + b"\0" * 44
+        + pixel_format
+        + struct.pack("<5I", caps, 0, 0, 0, 0)
+    )
+    
+    with open(path, "wb") as f:
+        f.write(b"DDS ")
+        f.write(header)
+        for payload in payloads:
+            f.write(payload)
+    return sum(len(payload) for payload in payloads)
+
+
+def _write_texture(
+    path: str,
+    image: "np.ndarray",
+    texture_format: str = "png",
+    compression: str = "bc1",
+    mip_filter: str = "box"
+) -> Dict[str, Any]:
+    """
+    RGBAのテクスチャを書き出します。"dds"はミップマップ付きのブロック圧縮、"png"はレベル0のみです。
+    
+    Returns:
+        パスとVRAM使用量の目安
+    """
+    if texture_format == "dds":
+        levels = _build_mip_chain(image, mip_filter)
+        vram_bytes = _write_dds(path, levels, compression)
+        return {"path": path, "format": "dds", "compression": compression, "mip_levels": len(levels), "vram_bytes": vram_bytes}
+    if texture_format == "png":
+        PILImage.fromarray(image, mode='RGBA' if image.shape[2] == 4 else 'RGB').save(path)
+        # GPU上では非圧縮RGBA+ミップマップ（約4/3倍）として扱われる
+        vram_bytes = int(image.shape[0] * image.shape[1] * 4 * 4 / 3)
+        return {"path": path, "format": "png", "vram_bytes": vram_bytes}
+    raise ValueError(f"未対応のテクスチャ形式です: {texture_format}（対応: png, dds）")
 
 
 @mcp.tool()
-def select_features(file_path: str, keywords: List[str]) -> Dict[str, Any]:
+def create_texture_atlas(
+    image_paths: List[str],
+    output_dir: Optional[str] = None,
+    max_size: int = 2048,
+    padding: int = 4,
+    texture_format: str = "dds",
+    compression: str = "bc1",
+    mip_filter: str = "box"
+) -> Dict[str, Any]:
     """
-    キーワードでフィーチャーを選択します。
+    複数のテクスチャを1枚のアトラスに詰め、ミップマップ付きで書き出します（外部ツール不要）。
+    
+    VRChatのVRAM予算に収めるため、DDS（BC1/BC3のブロック圧縮）で出力できます。
+    max_sizeに収まらない場合はタイルを1/2ずつ縮小します。16ビットの高度マップは
+    8ビットに変換されるため、アトラスには色テクスチャ・マスクを入れてください。
     
     Args:
-        file_path: GeoJSONファイルのパス
-        keywords: 検索キーワードのリスト
+        image_paths: 詰める画像ファイルのパス
+        output_dir: 出力ディレクトリ（オプション）
+        max_size: アトラスの最大サイズ（VRChat推奨: 2048以下）
+        padding: タイルの周囲に付ける余白（ピクセル）
+        texture_format: 出力形式（"dds"または"png"）
+        compression: DDSの圧縮形式（"bc1": RGB、"bc3": RGBA、"none": 非圧縮）
+        mip_filter: ミップマップの縮小フィルタ（"box"、"bilinear"、"lanczos"、"area"）
     
     Returns:
-        選択されたフィーチャーの情報
+        アトラスの情報（各タイルのUV範囲、VRAM使用量の目安）
     """
     try:
-        if not os.path.exists(file_path):
-            return {
-                "error": f"ファイルが見つかりません: {file_path}"
-            }
+        if not image_paths:
+            return {"error": "image_pathsを指定してください"}
+        if not output_dir:
+            output_dir = str(TEMP_DIR / "texture_atlas")
+        os.makedirs(output_dir, exist_ok=True)
         
-        feature_collection = je.FeatureCollection().read(file_path)
-        selected = feature_collection.select(keywords)
+        images = {}
+        for path in image_paths:
+            name = Path(path).stem
+            if name in images:
+                name = f"{name}_{len(images)}"
+            with PILImage.open(path) as image:
+                images[name] = np.asarray(image.convert('RGBA'))
+        
+        packed = _pack_atlas(images, max_size, padding)
+        atlas_path = os.path.join(output_dir, f"atlas.{texture_format}")
+        texture = _write_texture(atlas_path, packed["image"], texture_format, compression, mip_filter)
+        
+        layout = {
+            "size": packed["size"],
+            "scale": packed["scale"],
+            "padding": padding,
+            "texture": texture,
+            "rects": packed["rects"]
+        }
+        layout_path = os.path.join(output_dir, "atlas.json")
+        with open(layout_path, "w", encoding="utf-8") as f:
+            json.dump(layout, f, indent=2, ensure_ascii=False)
         
         return {
             "success": True,
-            "keywords": keywords,
-            "selected_count": len(selected) if isinstance(selected, list) else 1
+            "output_dir": output_dir,
+            "files": {
+                "atlas": atlas_path,
+                "layout": layout_path
+            },
+            "size": packed["size"],
+            "scale": packed["scale"],
+            "vram_bytes": texture["vram_bytes"],
+            "rects": packed["rects"]
         }
     except Exception as e:
         return {
@@ -463,155 +4120,589 @@ def select_features(file_path: str, keywords: List[str]) -> Dict[str, Any]:
 
 
 # ============================================================================
-# 3D地形生成・エクスポートツール（VRChat向け）
+# 適応メッシュ（RTIN: Right-Triangulated Irregular Network）
 # ============================================================================
 
-@mcp.tool()
-def generate_heightmap(
-    collection: str,
-    bounds: List[float],
-    resolution: float = 20.0,
-    date_range: Optional[List[str]] = None,
-    output_path: Optional[str] = None
-) -> Dict[str, Any]:
+def _rtin_grid(height_data: "np.ndarray") -> "np.ndarray":
+    """高度データを(2^k+1)×(2^k+1)の正方グリッドに再サンプリング（NaNは最小値で埋める）"""
+    rows, cols = height_data.shape
+    size = 2 ** int(np.ceil(np.log2(max(rows, cols, 2) - 1))) + 1
+    return np.ascontiguousarray(_resample_grid(height_data, size, size), dtype=np.float32)
+
+
+# 三角形内の誤差を計算する際に一度に処理する要素数（キャッシュに収まる大きさ）
+_RTIN_CHUNK_ELEMENTS = 1 << 18
+
+
+def _rtin_plane_weights(u: "np.ndarray", v: "np.ndarray", pattern: str) -> "np.ndarray":
     """
-    衛星データから高度マップ（Heightmap）を生成します。
+    正方形内の点(u, v)（0〜1、uが東、vが南）の高さを、角（左上・右上・左下・右下）と
+    中心の高さから補間する重み。形状は[点数, 角の数]です。
     
-    Args:
-        collection: コレクション名（標高データ用、例: "JAXA.EORC_ALOS.PRISM_AW3D30.v3.2_global"）
-        bounds: バウンディングボックス [min_lon, min_lat, max_lon, max_lat]
-        resolution: 解像度（ppu）
-        date_range: 日付範囲（オプション）
-        output_path: 出力ファイルパス（オプション、未指定時はtempディレクトリに保存）
+    pattern:
+        "main": 対角線（左上-右下）で2分割した面
+        "anti": 対角線（右上-左下）で2分割した面
+        "quarters": 両方の対角線で4分割した面（中心の高さを含む）
+    """
+    if pattern == "main":
+        weights = [1 - np.maximum(u, v), np.maximum(u - v, 0), np.maximum(v - u, 0), np.minimum(u, v)]
+    elif pattern == "anti":
+        bottom_right = np.maximum(u + v - 1, 0)
+        weights = [np.maximum(1 - u - v, 0), u - bottom_right, v - bottom_right, bottom_right]
+    else:
+        weights = [
+            np.maximum(1 - u - v, 0),
+            np.maximum(u - v, 0),
+            np.maximum(v - u, 0),
+            np.maximum(u + v - 1, 0),
+            2 * np.minimum(np.minimum(u, v), np.minimum(1 - u, 1 - v))
+        ]
+    shape = np.broadcast_shapes(u.shape, v.shape)
+    return np.stack([np.broadcast_to(w, shape) for w in weights]).reshape(len(weights), -1).T
+
+
+def _rtin_quarter_max(deviation: "np.ndarray", s: int, row_start: int, row_end: int) -> "np.ndarray":
+    """
+    正方形の行row_start〜row_end-1の誤差（形状[点数, 正方形数]）から、
+    4分割した三角形（上・右・下・左）ごとの最大値（形状[4, 正方形数]）を求めます。
+    
+    行rの点は、左の三角形が列0〜lo、中央（r≤s/2なら上、r≥s/2なら下）が列lo〜hi、
+    右の三角形が列hi〜sです（lo = min(r, s-r)、hi = max(r, s-r)、境界の点は両側に含める）。
+    """
+    h = s // 2
+    rows = np.arange(row_start, row_end)
+    lo, hi = np.minimum(rows, s - rows), np.maximum(rows, s - rows)
+    if row_end - row_start == s + 1 and s <= 64:
+        # 小さな正方形は点の添字でまとめて集計する（区間が短く、reduceatでは遅い）
+        cols = np.tile(np.arange(s + 1), s + 1)
+        r, l, u = np.repeat(rows, s + 1), np.repeat(lo, s + 1), np.repeat(hi, s + 1)
+        middle = (cols >= l) & (cols <= u)
+        groups = [middle & (r <= h), cols >= u, middle & (r >= h), cols <= l]
+        return np.stack([deviation[np.flatnonzero(g)].max(axis=0) for g in groups])
+    
+    starts = (rows - row_start) * (s + 1)
+    index = np.stack([starts, starts + lo + 1, starts + hi], axis=1).ravel()
+    segments = np.maximum.reduceat(deviation, index, axis=0).reshape(len(rows), 3, -1)
+    # 中央の区間はreduceatでは両端を除いた範囲になるため、両端の点を加える（空の場合は0）
+    middle = np.maximum(segments[:, 1], np.maximum(deviation[starts + lo], deviation[starts + hi]))
+    middle[hi - lo < 2] = 0
+    parts = [middle[rows <= h], segments[:, 2], middle[rows >= h], segments[:, 0]]
+    empty = np.zeros(deviation.shape[1], dtype=deviation.dtype)
+    return np.stack([part.max(axis=0) if len(part) else empty for part in parts])
+
+
+def _rtin_square_deviation(
+    grid: "np.ndarray",
+    s: int,
+    row: int,
+    col: int,
+    step: int,
+    count_rows: int,
+    count_cols: int,
+    pattern: str
+) -> "np.ndarray":
+    """
+    (row, col)番目からstep個おきのs×s正方形について、正方形内の全格子点での
+    区分線形面（_rtin_plane_weightsのpattern）と高さの差の最大値を求めます。
     
     Returns:
-        生成された高度マップの情報
+        形状[4（上・右・下・左）, count_rows, count_cols]（"quarters"）または
+        [1, count_rows, count_cols]（対角線で2分割した場合は正方形全体）
     """
-    try:
-        # 標高データを取得
-        image_collection = je.ImageCollection(collection)
-        if date_range:
-            image_collection = image_collection.filter_date(date_range)
-        image_collection = image_collection.filter_resolution(resolution)
-        image_collection = image_collection.filter_bounds(bbox=bounds)
-        image_collection = image_collection.select("DSM")  # Digital Surface Model
-        
-        result = image_collection.get_images()
-        raster = result.raster if hasattr(result, 'raster') else None
-        
-        if not raster or not hasattr(raster, 'img'):
-            return {
-                "error": "高度データの取得に失敗しました"
-            }
-        
-        # 高度データをnumpy配列に変換
-        height_data = np.array(raster.img)
-        
-        # 正規化（0-1の範囲に）
-        height_min = np.nanmin(height_data)
-        height_max = np.nanmax(height_data)
-        height_normalized = (height_data - height_min) / (height_max - height_min)
-        
-        # 出力パスを決定
-        if not output_path:
-            output_path = str(TEMP_DIR / "heightmap.png")
+    h = s // 2
+    quarters = pattern == "quarters"
+    result = np.zeros((4 if quarters else 1, count_rows, count_cols), dtype=np.float32)
+    row_stride, col_stride = grid.strides
+    squares = np.lib.stride_tricks.as_strided(
+        grid[row * s:, col * s:],
+        shape=(count_rows, count_cols, s + 1, s + 1),
+        strides=(step * s * row_stride, step * s * col_stride, row_stride, col_stride),
+        writeable=False
+    )
+    corners = [squares[:, :, 0, 0], squares[:, :, 0, s], squares[:, :, s, 0], squares[:, :, s, s]]
+    if quarters:
+        corners.append(squares[:, :, h, h])
+    corners = np.stack(corners)
+    
+    # 小さな正方形は複数行をまとめ、大きな正方形は1つの正方形を行の帯に分けて処理する
+    square_rows = max(1, _RTIN_CHUNK_ELEMENTS // (count_cols * (s + 1) ** 2))
+    band_rows = min(s + 1, max(1, _RTIN_CHUNK_ELEMENTS // (count_cols * (s + 1))))
+    t = np.arange(s + 1, dtype=np.float32) / s
+    for r0 in range(0, s + 1, band_rows):
+        r1 = min(s + 1, r0 + band_rows)
+        weights = _rtin_plane_weights(t[None, :], t[r0:r1, None], pattern)
+        for a in range(0, count_rows, square_rows):
+            b = min(count_rows, a + square_rows)
+            c = corners[:, a:b].reshape(len(corners), -1)
+            # 形状[点数, 正方形数]に並べ替え、点ごとの集計を連続したメモリで行う
+            deviation = squares[a:b, :, r0:r1, :].transpose(2, 3, 0, 1).reshape(-1, c.shape[1])
+            deviation = deviation - weights @ c
+            np.abs(deviation, out=deviation)
+            if quarters:
+                part = _rtin_quarter_max(deviation, s, r0, r1)
+            else:
+                part = deviation.max(axis=0)[np.newaxis]
+            np.maximum(result[:, a:b], part.reshape(len(part), b - a, count_cols), out=result[:, a:b])
+    return result
+
+
+def _rtin_errors(grid: "np.ndarray") -> "np.ndarray":
+    """
+    各頂点を斜辺の中点とする三角形の近似誤差（子孫の誤差の最大値を含む）を計算します。
+    
+    頂点自身の誤差は、その頂点を斜辺の中点とする2つの三角形に含まれる全格子点での
+    三角形の平面と高さの差の最大値です。分割しなかった三角形の内側の誤差は
+    しきい値以下になるため、しきい値がメッシュ全体の高さの誤差の上限になります。
+    
+    細かいレベルから順に、レベル内の全頂点をまとめて計算します。正方形の大きさsごとに
+      - 辺レベル: 正方形の辺の中点（三角形は辺と正方形の中心を結ぶ4分割の1つ、
+        子は1/4正方形の中心 (x±s/4, y±s/4)）
+      - 対角レベル: 正方形の中心（三角形は対角線で2分割した正方形、子は4辺の中点）。
+        対角線は(i+j)が偶数なら左上-右下
+    の順に処理します。
+    """
+    n = grid.shape[0]
+    errors = np.zeros_like(grid)
+    s = 2
+    while s <= n - 1:
+        h = s // 2
+        q = h // 2
+        k = (n - 1) // s
+        padded = np.pad(errors, q) if q else None
+
+        def children(r0: int, c0: int, nr: int, nc: int) -> "np.ndarray":
+            """(r0, c0)からs間隔の格子点について、(±q, ±q)の4点の誤差の最大値"""
+            result = None
+            for dr in (-q, q):
+                for dc in (-q, q):
+                    r, c = r0 + dr + q, c0 + dc + q
+                    block = padded[r:r + s * (nr - 1) + 1:s, c:c + s * (nc - 1) + 1:s]
+                    result = block if result is None else np.maximum(result, block)
+            return result
         
-        # PNG形式で保存（16bitグレースケール）
-        height_uint16 = (height_normalized * 65535).astype(np.uint16)
-        height_image = PILImage.fromarray(height_uint16, mode='I;16')
-        height_image.save(output_path)
+        # 辺レベル: 辺の両側の正方形で、その辺と中心を結ぶ三角形（上・右・下・左）の誤差
+        top, right, bottom, left = _rtin_square_deviation(grid, s, 0, 0, 1, k, k, "quarters")
+        # 水平な辺（yがsの倍数、xが奇数×h）: 下の正方形の上の三角形と、上の正方形の下の三角形
+        own = np.zeros((k + 1, k), dtype=np.float32)
+        own[:-1] = top
+        np.maximum(own[1:], bottom, out=own[1:])
+        errors[0::s, h::s] = np.maximum(own, children(0, h, k + 1, k)) if q else own
+        # 垂直な辺（xがsの倍数、yが奇数×h）: 右の正方形の左の三角形と、左の正方形の右の三角形
+        own = np.zeros((k, k + 1), dtype=np.float32)
+        own[:, :-1] = left
+        np.maximum(own[:, 1:], right, out=own[:, 1:])
+        errors[h::s, 0::s] = np.maximum(own, children(h, 0, k, k + 1)) if q else own
         
-        return {
-            "success": True,
-            "output_path": output_path,
-            "shape": height_data.shape,
-            "height_range": {
-                "min": float(height_min),
-                "max": float(height_max)
+        # 対角レベル（正方形の中心）: 対角線で2分割した正方形全体の誤差
+        own = np.empty((k, k), dtype=np.float32)
+        for i0 in (0, 1):
+            for j0 in (0, 1):
+                rows, cols = len(range(i0, k, 2)), len(range(j0, k, 2))
+                if rows and cols:
+                    pattern = "main" if (i0 + j0) % 2 == 0 else "anti"
+                    own[i0::2, j0::2] = _rtin_square_deviation(grid, s, i0, j0, 2, rows, cols, pattern)[0]
+        errors[h::s, h::s] = np.maximum.reduce([
+            own,
+            errors[0:n - 1:s, h::s],
+            errors[s::s, h::s],
+            errors[h::s, 0:n - 1:s],
+            errors[h::s, s::s]
+        ])
+        s *= 2
+    return errors
+
+
+def _rtin_threshold(errors: "np.ndarray", max_triangles: int) -> float:
+    """
+    三角形数がmax_triangles以下になる最小の誤差しきい値を求めます。
+    
+    誤差がしきい値を超える頂点1つにつき、その頂点を斜辺の中点とする三角形
+    （内部なら2つ、外周なら1つ）が分割されて三角形が1つずつ増えます。
+    """
+    weights = np.full(errors.shape, 2, dtype=np.int64)
+    weights[0, :] = weights[-1, :] = weights[:, 0] = weights[:, -1] = 1
+    weights[0, 0] = weights[0, -1] = weights[-1, 0] = weights[-1, -1] = 0
+    
+    flat = errors.ravel()
+    limit = max(0, max_triangles - 2)
+    # 分割できる頂点はlimit個以下なので、誤差の大きい側だけを並べ替える（外周の角は重み0）
+    candidates = min(flat.size, limit + 5)
+    top = np.argpartition(flat, flat.size - candidates)[flat.size - candidates:]
+    order = top[np.argsort(flat[top], kind='stable')[::-1]]
+    cumulative = np.cumsum(weights.ravel()[order])
+    count = int(np.searchsorted(cumulative, limit, side='right'))
+    if count >= len(order):
+        return 0.0
+    return float(flat[order[count]])
+
+
+def _rtin_triangles(errors: "np.ndarray", threshold: float) -> "np.ndarray":
+    """
+    誤差がthresholdを超える三角形を分割し、残った三角形の頂点（x, y）を返します。
+    
+    Returns:
+        形状[三角形数, 3, 2]の配列（各三角形は斜辺の両端a, bと直角の頂点c）
+    """
+    m = errors.shape[0] - 1
+    a = np.array([[0, 0], [m, m]], dtype=np.int64)
+    b = np.array([[m, m], [0, 0]], dtype=np.int64)
+    c = np.array([[m, 0], [0, m]], dtype=np.int64)
+    leaves = []
+    while len(a):
+        mid = (a + b) // 2
+        split = (np.abs(a - c).sum(axis=1) > 1) & (errors[mid[:, 1], mid[:, 0]] > threshold)
+        keep = ~split
+        leaves.append(np.stack([a[keep], b[keep], c[keep]], axis=1))
+        a, b, c, mid = a[split], b[split], c[split], mid[split]
+        a, b, c = np.concatenate([c, b]), np.concatenate([a, c]), np.concatenate([mid, mid])
+    return np.concatenate(leaves)
+
+
+def _build_rtin_mesh(
+    height_data: "np.ndarray",
+    bounds: List[float],
+    max_triangles: int,
+    max_error: Optional[float] = None,
+    height_scale: float = 1.0
+) -> Dict[str, Any]:
+    """
+    高度データから、三角形数の上限と誤差の上限を満たす適応メッシュを作成します。
+    
+    平坦な場所は大きな三角形、尾根や谷は細かい三角形になります。座標はメートル単位
+    （X: 東、Y: 高さ、Z: 南、原点は北西の角）で、面は上（+Y）向きです。
+    
+    三角形数の上限で決まるしきい値がmax_errorより大きい場合は、三角形数の上限を優先します
+    （その場合max_error_metはFalseになります）。
+    
+    Returns:
+        positions（[V, 3] float32）、uvs（[V, 2] float32）、faces（[T, 3] uint32）と
+        誤差のしきい値（(2^k+1)グリッドの全格子点でのメッシュと高さの差の上限）。
+        max_errorを指定した場合のみ、それを満たしたか（max_error_met、bool）も返します。
+    """
+    grid = _rtin_grid(height_data)
+    n = grid.shape[0]
+    errors = _rtin_errors(grid)
+    threshold = _rtin_threshold(errors, max_triangles)
+    if max_error is not None:
+        threshold = max(threshold, float(max_error))
+    triangles = _rtin_triangles(errors, threshold)
+    
+    # 頂点を共有するようにインデックス化
+    keys = triangles[:, :, 1] * n + triangles[:, :, 0]
+    unique_keys, faces = np.unique(keys.ravel(), return_inverse=True)
+    faces = faces.reshape(-1, 3).astype(np.uint32)
+    ys, xs = np.divmod(unique_keys, n)
+    
+    width, depth = _bounds_size_meters(bounds)
+    positions = np.empty((len(unique_keys), 3), dtype=np.float32)
+    positions[:, 0] = xs * (width / (n - 1))
+    positions[:, 1] = grid[ys, xs] * height_scale
+    positions[:, 2] = ys * (depth / (n - 1))
+    uvs = np.empty((len(unique_keys), 2), dtype=np.float32)
+    uvs[:, 0] = xs / (n - 1)
+    uvs[:, 1] = 1.0 - ys / (n - 1)
+    
+    # 面の向きを上（+Y）に揃える
+    p0, p1, p2 = positions[faces[:, 0]], positions[faces[:, 1]], positions[faces[:, 2]]
+    facing_down = ((p1[:, 2] - p0[:, 2]) * (p2[:, 0] - p0[:, 0]) - (p1[:, 0] - p0[:, 0]) * (p2[:, 2] - p0[:, 2])) < 0
+    faces[facing_down] = faces[facing_down][:, ::-1]
+    
+    mesh = {
+        "positions": positions,
+        "uvs": uvs,
+        "faces": faces,
+        "grid_size": n,
+        "error_threshold": threshold * height_scale,
+        "vertex_count": int(len(positions)),
+        "triangle_count": int(len(faces)),
+        "size_meters": [width, depth]
+    }
+    if max_error is not None:
+        mesh["max_error_met"] = bool(threshold <= float(max_error))
+    return mesh
+
+
+# ============================================================================
+# メッシュ出力（格子メッシュ・OBJ/GLB）
+# ============================================================================
+
+def _bounds_size_meters(bounds: List[float]) -> tuple:
+    """範囲の東西・南北の長さ（メートル、中心緯度での近似）"""
+    mid_lat = np.radians((bounds[1] + bounds[3]) / 2)
+    width = (bounds[2] - bounds[0]) * 111320.0 * float(np.cos(mid_lat))
+    depth = (bounds[3] - bounds[1]) * 110574.0
+    return width, depth
+
+
+def _build_grid_mesh(height_data: "np.ndarray", bounds: List[float], height_scale: float = 1.0) -> Dict[str, Any]:
+    """
+    高度データの各ピクセルを頂点とする格子メッシュを作成します（Pythonのループなし）。
+    
+    座標系は_build_rtin_meshと同じ（X: 東、Y: 高さ、Z: 南、単位はメートル）で、
+    法線は高さの勾配（中心差分）から計算します。
+    """
+    height = np.asarray(height_data, dtype=np.float32)
+    if np.isnan(height).any():
+        height = np.where(np.isnan(height), np.nanmin(height), height)
+    rows, cols = height.shape
+    if rows < 2 or cols < 2:
+        raise ValueError(f"メッシュには2×2ピクセル以上が必要です: {height.shape}")
+    width, depth = _bounds_size_meters(bounds)
+    dx = width / (cols - 1)
+    dz = depth / (rows - 1)
+    
+    positions = np.empty((rows, cols, 3), dtype=np.float32)
+    positions[:, :, 0] = np.arange(cols, dtype=np.float32) * dx
+    np.multiply(height, height_scale, out=positions[:, :, 1])
+    positions[:, :, 2] = (np.arange(rows, dtype=np.float32) * dz)[:, None]
+    
+    uvs = np.empty((rows, cols, 2), dtype=np.float32)
+    uvs[:, :, 0] = np.arange(cols, dtype=np.float32) / (cols - 1)
+    uvs[:, :, 1] = (1.0 - np.arange(rows, dtype=np.float32) / (rows - 1))[:, None]
+    
+    # 法線 = (-dh/dx, 1, -dh/dz) を正規化
+    grad_z, grad_x = np.gradient(positions[:, :, 1], dz, dx)
+    normals = np.empty((rows, cols, 3), dtype=np.float32)
+    np.negative(grad_x, out=normals[:, :, 0])
+    normals[:, :, 1] = 1.0
+    np.negative(grad_z, out=normals[:, :, 2])
+    normals /= np.linalg.norm(normals, axis=2, keepdims=True)
+    
+    # 各セルを2つの三角形（上向き）に分割
+    index = np.arange(rows * cols, dtype=np.uint32).reshape(rows, cols)
+    top_left = index[:-1, :-1].ravel()
+    top_right = index[:-1, 1:].ravel()
+    bottom_left = index[1:, :-1].ravel()
+    bottom_right = index[1:, 1:].ravel()
+    faces = np.empty((top_left.size, 2, 3), dtype=np.uint32)
+    faces[:, 0, 0] = top_left
+    faces[:, 0, 1] = bottom_left
+    faces[:, 0, 2] = top_right
+    faces[:, 1, 0] = top_right
+    faces[:, 1, 1] = bottom_left
+    faces[:, 1, 2] = bottom_right
+    
+    return {
+        "positions": positions.reshape(-1, 3),
+        "uvs": uvs.reshape(-1, 2),
+        "normals": normals.reshape(-1, 3),
+        "faces": faces.reshape(-1, 3),
+        "vertex_count": rows * cols,
+        "triangle_count": int(top_left.size * 2),
+        "size_meters": [width, depth]
+    }
+
+
+def _vertex_normals(positions: "np.ndarray", faces: "np.ndarray") -> "np.ndarray":
+    """面の法線（面積で重み付け）を頂点ごとに合計して正規化した頂点法線"""
+    p0 = positions[faces[:, 0]]
+    face_normals = np.cross(positions[faces[:, 1]] - p0, positions[faces[:, 2]] - p0)
+    normals = np.empty_like(positions, dtype=np.float32)
+    vertex_index = faces.ravel()
+    for axis in range(3):
+        normals[:, axis] = np.bincount(
+            vertex_index, weights=np.repeat(face_normals[:, axis], 3), minlength=len(positions)
+        )
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    length[length == 0] = 1.0
+    normals /= length
+    return normals
+
+
+def _write_obj(
+    path: str,
+    positions: "np.ndarray",
+    uvs: "np.ndarray",
+    faces: "np.ndarray",
+    normals: Optional["np.ndarray"] = None
+) -> None:
+    """メッシュをWavefront OBJ（頂点・UV・法線・面）として保存"""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("# JAXA Earth terrain mesh\n")
+        np.savetxt(f, positions, fmt="v %.3f %.3f %.3f")
+        np.savetxt(f, uvs, fmt="vt %.6f %.6f")
+        face_index = faces.astype(np.int64) + 1
+        if normals is not None:
+            np.savetxt(f, normals, fmt="vn %.5f %.5f %.5f")
+            np.savetxt(f, np.repeat(face_index, 3, axis=1), fmt="f %d/%d/%d %d/%d/%d %d/%d/%d")
+        else:
+            np.savetxt(f, np.repeat(face_index, 2, axis=1), fmt="f %d/%d %d/%d %d/%d")
+
+
+def _write_glb(
+    path: str,
+    positions: "np.ndarray",
+    uvs: "np.ndarray",
+    faces: "np.ndarray",
+    normals: Optional["np.ndarray"] = None
+) -> None:
+    """
+    メッシュをバイナリglTF（.glb）として保存します。
+    
+    頂点・法線・UV・インデックス（uint32）の各配列のバッファをそのまま書き込みます。
+    glTFのUVは左上が原点のため、vを反転して保存します。
+    """
+    if normals is None:
+        normals = _vertex_normals(positions, faces)
+    positions = np.ascontiguousarray(positions, dtype='<f4')
+    normals = np.ascontiguousarray(normals, dtype='<f4')
+    gltf_uvs = np.ascontiguousarray(uvs, dtype='<f4').copy()
+    gltf_uvs[:, 1] = 1.0 - gltf_uvs[:, 1]
+    indices = np.ascontiguousarray(faces, dtype='<u4').reshape(-1)
+    
+    arrays = [positions, normals, gltf_uvs, indices]
+    buffer_views = []
+    offset = 0
+    for array in arrays:
+        buffer_views.append({
+            "buffer": 0,
+            "byteOffset": offset,
+            "byteLength": array.nbytes,
+            "target": 34963 if array is indices else 34962  # ELEMENT_ARRAY_BUFFER / ARRAY_BUFFER
+        })
+        offset += array.nbytes  # 各配列は4バイト単位なので境界の調整は不要
+    
+    vertex_count = len(positions)
+    gltf = {
+        "asset": {"version": "2.0", "generator": "jaxa-earth-mcp"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0, "name": "terrain"}],
+        "meshes": [{
+            "name": "terrain",
+            "primitives": [{
+                "attributes": {"POSITION": 0, "NORMAL": 1, "TEXCOORD_0": 2},
+                "indices": 3,
+                "mode": 4  # TRIANGLES
+            }]
+        }],
+        "buffers": [{"byteLength": offset}],
+        "bufferViews": buffer_views,
+        "accessors": [
+            {
+                "bufferView": 0, "componentType": 5126, "count": vertex_count, "type": "VEC3",
+                "min": positions.min(axis=0).tolist(), "max": positions.max(axis=0).tolist()
             },
-            "bounds": bounds
-        }
-    except Exception as e:
-        return {
-            "error": str(e),
-            "traceback": traceback.format_exc()
-        }
+            {"bufferView": 1, "componentType": 5126, "count": vertex_count, "type": "VEC3"},
+            {"bufferView": 2, "componentType": 5126, "count": vertex_count, "type": "VEC2"},
+            {"bufferView": 3, "componentType": 5125, "count": int(indices.size), "type": "SCALAR"}
+        ]
+    }
+    
+    json_chunk = json.dumps(gltf, separators=(",", ":")).encode("utf-8")
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    total_length = 12 + 8 + len(json_chunk) + 8 + offset
+    with open(path, 'wb') as f:
+        f.write(struct.pack("<4sII", b"glTF", 2, total_length))
+        f.write(struct.pack("<I4s", len(json_chunk), b"JSON"))
+        f.write(json_chunk)
+        f.write(struct.pack("<I4s", offset, b"BIN\x00"))
+        for array in arrays:
+            f.write(memoryview(array).cast("B"))
+
+
+# 出力できるメッシュ形式と書き出し関数
+_MESH_WRITERS = {
+    "obj": _write_obj,
+    "glb": _write_glb
+}
+
+
+def _export_mesh(
+    fetched: _FetchedRaster,
+    output_path: str,
+    method: str = "rtin",
+    max_triangles: Optional[int] = None,
+    max_error: Optional[float] = None,
+    height_scale: float = 1.0,
+    mesh_format: str = "obj"
+) -> Dict[str, Any]:
+    """
+    取得済みラスターからメッシュを作成してファイルに保存し、メッシュの情報を返します。
+    
+    method: "rtin"（適応メッシュ、max_triangles以内）または"grid"（全ピクセルの格子）
+    """
+    writer = _MESH_WRITERS.get(mesh_format)
+    if writer is None:
+        raise ValueError(f"mesh_formatは{', '.join(_MESH_WRITERS)}のいずれかを指定してください: {mesh_format}")
+    if method == "rtin":
+        if not max_triangles:
+            raise ValueError("適応メッシュにはmax_polygonsが必要です")
+        mesh = _build_rtin_mesh(fetched.data, fetched.bounds, max_triangles, max_error, height_scale)
+    elif method == "grid":
+        mesh = _build_grid_mesh(fetched.data, fetched.bounds, height_scale)
+    else:
+        raise ValueError(f"methodは\"rtin\"または\"grid\"を指定してください: {method}")
+    writer(output_path, mesh["positions"], mesh["uvs"], mesh["faces"], mesh.get("normals"))
+    
+    info = {
+        "path": output_path,
+        "format": mesh_format,
+        "method": method,
+        "vertex_count": mesh["vertex_count"],
+        "triangle_count": mesh["triangle_count"],
+        "size_meters": mesh["size_meters"]
+    }
+    if method == "rtin":
+        info["error_threshold"] = mesh["error_threshold"]
+        if "max_error_met" in mesh:
+            info["max_error_met"] = mesh["max_error_met"]
+        info["grid_size"] = mesh["grid_size"]
+    return info
 
 
 @mcp.tool()
-def export_to_blender(
+def create_terrain_mesh(
     collection: str,
     bounds: List[float],
     resolution: float = 20.0,
+    max_polygons: int = 100000,
+    max_error: Optional[float] = None,
     date_range: Optional[List[str]] = None,
-    output_dir: Optional[str] = None
+    output_path: Optional[str] = None,
+    mesh_format: str = "glb",
+    method: str = "rtin",
+    height_scale: float = 1.0,
+    raster_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
-    Blender用の高度データとテクスチャをエクスポートします。
+    標高データから3Dメッシュ（頂点・法線・UV付き）を直接生成します。
+    
+    Blenderで平面を細分化してDisplaceする代わりに、そのままインポートできます。
+    method="rtin"は平坦な場所は大きな三角形、尾根や谷は細かい三角形で表現する適応メッシュで、
+    一様に縮小する方法より同じポリゴン数で高さの誤差が小さくなります。
     
     Args:
         collection: コレクション名
         bounds: バウンディングボックス
         resolution: 解像度
+        max_polygons: 最大ポリゴン数（三角形数、method="rtin"のみ）
+        max_error: 許容する高さの誤差（メートル、method="rtin"のみ。指定時はポリゴン数がさらに少なくなる場合があります。
+            max_polygons以内で満たせない場合はmax_polygonsを優先し、max_error_metがFalseになります）
         date_range: 日付範囲
-        output_dir: 出力ディレクトリ（オプション）
+        output_path: 出力ファイルパス（オプション）
+        mesh_format: メッシュ形式（"glb"または"obj"）
+        method: "rtin"（適応メッシュ）または"grid"（全ピクセルの格子メッシュ）
+        height_scale: 高さの倍率
+        raster_id: 以前のツール呼び出しで返されたraster_id（指定時は再取得しない）
     
     Returns:
-        エクスポートされたファイルの情報
+        生成したメッシュの情報（頂点数・三角形数・誤差のしきい値）
     """
     try:
-        if not output_dir:
-            output_dir = str(TEMP_DIR / "blender_export")
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 高度マップ生成
-        heightmap_result = generate_heightmap(
-            collection=collection,
-            bounds=bounds,
-            resolution=resolution,
-            date_range=date_range,
-            output_path=os.path.join(output_dir, "heightmap.exr")
-        )
-        
-        if "error" in heightmap_result:
-            return heightmap_result
-        
-        # EXR形式で高度マップを保存（32bit浮動小数点）
-        image_collection = je.ImageCollection(collection)
-        if date_range:
-            image_collection = image_collection.filter_date(date_range)
-        image_collection = image_collection.filter_resolution(resolution)
-        image_collection = image_collection.filter_bounds(bbox=bounds)
-        image_collection = image_collection.select("DSM")
-        
-        result = image_collection.get_images()
-        raster = result.raster
-        height_data = np.array(raster.img).astype(np.float32)
-        
-        # EXR形式で保存（rasterioを使用）
-        height_min, height_max = np.nanmin(height_data), np.nanmax(height_data)
-        height_normalized = (height_data - height_min) / (height_max - height_min)
-        
-        exr_path = os.path.join(output_dir, "heightmap.exr")
-        # EXR形式はPILでは直接サポートされていないため、PNG形式で保存
-        # 実際のEXR形式はOpenEXRライブラリが必要
-        height_uint16 = (height_normalized * 65535).astype(np.uint16)
-        height_image = Image.fromarray(height_uint16, mode='I;16')
-        height_image.save(exr_path.replace('.exr', '.png'))
+        if not output_path:
+            output_path = str(TEMP_DIR / f"terrain_mesh.{mesh_format}")
         
-        # テクスチャ（衛星画像）も取得して保存
-        texture_path = os.path.join(output_dir, "texture.png")
-        # ここでは高度マップをテクスチャとしても使用（実際には別のバンドを使用可能）
-        height_image.save(texture_path)
+        # 高度データを取得（取得済みなら再利用）
+        fetched = _get_fetched_raster(collection, bounds, resolution, date_range, raster_id=raster_id)
+        mesh = _export_mesh(fetched, output_path, method, max_polygons, max_error, height_scale, mesh_format)
         
         return {
             "success": True,
-            "output_dir": output_dir,
-            "files": {
-                "heightmap": exr_path.replace('.exr', '.png'),
-                "texture": texture_path
-            },
-            "note": "EXR形式はPNG形式で保存されました。BlenderでDisplace Modifierを使用する際は、画像を読み込んで使用してください。"
+            "output_path": output_path,
+            "raster_id": fetched.raster_id,
+            "mesh": mesh,
+            "bounds": fetched.bounds
         }
     except Exception as e:
         return {
@@ -620,85 +4711,198 @@ def export_to_blender(
         }
 
 
+# ============================================================================
+# LODピラミッド（クアッドツリー）
+# ============================================================================
+
+# LODタイルの1辺のピクセル数（隣接タイルと共有する1ピクセルを除く）
+LOD_TILE_SIZE = int(os.environ.get("JAXA_LOD_TILE_SIZE", "256"))
+
+
+def _downsample_2x(data: "np.ndarray") -> "np.ndarray":
+    """
+    2×2ピクセルの平均で1/2に縮小します（NaNは除外して平均）。
+    行数・列数が奇数の場合は端をNaNで埋めてから縮小します。
+    """
+    rows, cols = data.shape
+    padded_rows = rows + rows % 2
+    padded_cols = cols + cols % 2
+    if (padded_rows, padded_cols) != (rows, cols):
+        padded = np.full((padded_rows, padded_cols), np.nan, dtype=np.float32)
+        padded[:rows, :cols] = data
+    else:
+        padded = np.asarray(data, dtype=np.float32)
+    
+    quads = (padded[0::2, 0::2], padded[0::2, 1::2], padded[1::2, 0::2], padded[1::2, 1::2])
+    nan_quads = [np.isnan(quad) for quad in quads]
+    if not any(mask.any() for mask in nan_quads):
+        total = quads[0] + quads[1]
+        total += quads[2]
+        total += quads[3]
+        total *= 0.25
+        return total
+    
+    total = np.zeros(quads[0].shape, dtype=np.float32)
+    count = np.zeros(quads[0].shape, dtype=np.float32)
+    for quad, mask in zip(quads, nan_quads):
+        total += np.where(mask, np.float32(0.0), quad)
+        count += ~mask
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total /= count
+    return total
+
+
+def _build_lod_levels(data: "np.ndarray", tile_size: int) -> List["np.ndarray"]:
+    """
+    元の解像度から、全体が1タイルに収まるまで2×縮小を繰り返します。
+    各レベルは1つ前のレベルから計算します（全解像度からの再縮小はしません）。
+    
+    Returns:
+        [最も粗いレベル, ..., 元の解像度]（インデックスがクアッドツリーのレベル）
+    """
+    levels = [np.asarray(data, dtype=np.float32)]
+    while max(levels[-1].shape) > tile_size:
+        levels.append(_downsample_2x(levels[-1]))
+    levels.reverse()
+    return levels
+
+
+def _write_lod_pyramid(
+    fetched: _FetchedRaster,
+    output_dir: str,
+    tile_size: int,
+    height_range: Optional[List[float]] = None
+) -> Dict[str, Any]:
+    """
+    LODピラミッドをlod/{level}/{x}_{y}.png（16bitグレースケール）とindex.jsonとして書き出します。
+    
+    全レベル・全タイルを同じ高さ範囲で量子化し、各タイルは右端・下端の1ピクセルを
+    隣のタイルと共有します（メッシュ化したときに継ぎ目ができないように）。
+    """
+    bounds = fetched.bounds
+    height_min, height_max = height_range or fetched.height_range
+    full_rows, full_cols = fetched.shape
+    levels = _build_lod_levels(fetched.data, tile_size)
+    max_level = len(levels) - 1
+    
+    index_levels = []
+    for level, level_data in enumerate(levels):
+        rows, cols = level_data.shape
+        # このレベルの1ピクセルの大きさ（度）
+        scale = 2 ** (max_level - level)
+        pixel_lon = (bounds[2] - bounds[0]) / full_cols * scale
+        pixel_lat = (bounds[3] - bounds[1]) / full_rows * scale
+        level_dir = os.path.join(output_dir, "lod", str(level))
+        os.makedirs(level_dir, exist_ok=True)
+        
+        tiles_x = -(-cols // tile_size)
+        tiles_y = -(-rows // tile_size)
+        tiles = []
+        for y in range(tiles_y):
+            for x in range(tiles_x):
+                r0, c0 = y * tile_size, x * tile_size
+                tile = level_data[r0:r0 + tile_size + 1, c0:c0 + tile_size + 1]
+                tile_uint16 = _quantize_heights(tile, 16, (height_min, height_max))[0]
+                relative_path = f"lod/{level}/{x}_{y}.png"
+                PILImage.fromarray(tile_uint16, mode='I;16').save(os.path.join(output_dir, relative_path))
+                tiles.append({
+                    "x": x,
+                    "y": y,
+                    "path": relative_path,
+                    "shape": [int(tile.shape[0]), int(tile.shape[1])],
+                    "bounds": [
+                        bounds[0] + c0 * pixel_lon,
+                        bounds[3] - (r0 + tile.shape[0]) * pixel_lat,
+                        bounds[0] + (c0 + tile.shape[1]) * pixel_lon,
+                        bounds[3] - r0 * pixel_lat
+                    ]
+                })
+        index_levels.append({
+            "level": level,
+            "shape": [int(rows), int(cols)],
+            "pixel_size_degrees": [pixel_lon, pixel_lat],
+            "tiles_x": tiles_x,
+            "tiles_y": tiles_y,
+            "tiles": tiles
+        })
+    
+    index = {
+        "raster_id": fetched.raster_id,
+        "bounds": bounds,
+        "tile_size": tile_size,
+        "overlap": 1,
+        "height_range": {
+            "min": height_min,
+            "max": height_max
+        },
+        "level_count": len(levels),
+        "levels": index_levels
+    }
+    index_path = os.path.join(output_dir, "index.json")
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    index["index_path"] = index_path
+    return index
+
+
 @mcp.tool()
-def export_to_unity(
+def create_lod_pyramid(
     collection: str,
     bounds: List[float],
     resolution: float = 20.0,
     date_range: Optional[List[str]] = None,
-    output_dir: Optional[str] = None
+    output_dir: Optional[str] = None,
+    tile_size: Optional[int] = None,
+    raster_id: Optional[str] = None,
+    height_range: Optional[List[float]] = None
 ) -> Dict[str, Any]:
     """
-    Unity用の地形データをエクスポートします。
+    大きなワールド向けに、LOD（詳細度）ピラミッドをクアッドツリーのタイルとして生成します。
+    
+    1回取得した標高データから2×縮小を繰り返してレベルを作り、lod/{level}/{x}_{y}.pngと
+    index.jsonに書き出します。レベル0が最も粗く（全体が1タイル）、最大レベルが元の解像度です。
+    クライアントはindex.jsonを読んで必要なレベル・タイルだけを読み込めます。
     
     Args:
         collection: コレクション名
         bounds: バウンディングボックス
-        resolution: 解像度
+        resolution: 解像度（最大レベルの解像度）
         date_range: 日付範囲
-        output_dir: 出力ディレクトリ
+        output_dir: 出力ディレクトリ（オプション）
+        tile_size: タイルの1辺のピクセル数（デフォルト: JAXA_LOD_TILE_SIZE）
+        raster_id: 以前のツール呼び出しで返されたraster_id（指定時は再取得しない）
+        height_range: 量子化に使う高さ範囲 [最小値, 最大値]（隣接タイルで揃える場合、compute_height_rangeの結果を指定）
     
     Returns:
-        エクスポートされたファイルの情報
+        生成したピラミッドの情報（レベルごとの形状とタイル数）
     """
     try:
         if not output_dir:
-            output_dir = str(TEMP_DIR / "unity_export")
+            output_dir = str(TEMP_DIR / "lod_pyramid")
         os.makedirs(output_dir, exist_ok=True)
+        tile_size = tile_size or LOD_TILE_SIZE
+        if tile_size < 2:
+            return {"error": f"tile_sizeは2以上を指定してください: {tile_size}"}
         
-        # 高度データを取得
-        image_collection = je.ImageCollection(collection)
-        if date_range:
-            image_collection = image_collection.filter_date(date_range)
-        image_collection = image_collection.filter_resolution(resolution)
-        image_collection = image_collection.filter_bounds(bbox=bounds)
-        image_collection = image_collection.select("DSM")
-        
-        result = image_collection.get_images()
-        raster = result.raster
-        height_data = np.array(raster.img).astype(np.float32)
-        
-        # Unity Terrain Tool用の.raw形式で保存
-        # UnityのTerrainは16bitの高さマップを使用
-        height_min, height_max = np.nanmin(height_data), np.nanmax(height_data)
-        height_normalized = (height_data - height_min) / (height_max - height_min)
-        height_uint16 = (height_normalized * 65535).astype(np.uint16)
-        
-        # .raw形式で保存（リトルエンディアン、16bit）
-        raw_path = os.path.join(output_dir, "terrain.raw")
-        height_uint16.byteswap(False).tofile(raw_path)
-        
-        # テクスチャも保存
-        texture_path = os.path.join(output_dir, "terrain_texture.png")
-        height_image = Image.fromarray(height_uint16, mode='I;16')
-        height_image.save(texture_path)
-        
-        # メタデータファイル（Unity用の情報）
-        metadata = {
-            "width": int(height_data.shape[1]),
-            "height": int(height_data.shape[0]),
-            "depth": 16,  # 16bit
-            "height_range": {
-                "min": float(height_min),
-                "max": float(height_max)
-            },
-            "bounds": bounds
-        }
-        
-        metadata_path = os.path.join(output_dir, "terrain_metadata.json")
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
+        # 高度データを取得（取得済みなら再利用）
+        fetched = _get_fetched_raster(collection, bounds, resolution, date_range, raster_id=raster_id)
+        index = _write_lod_pyramid(fetched, output_dir, tile_size, height_range)
         
         return {
             "success": True,
             "output_dir": output_dir,
-            "files": {
-                "terrain_raw": raw_path,
-                "texture": texture_path,
-                "metadata": metadata_path
-            },
-            "metadata": metadata,
-            "note": "UnityのTerrain Toolで.rawファイルをインポートする際は、メタデータの情報を参照してください。"
+            "raster_id": fetched.raster_id,
+            "index_path": index["index_path"],
+            "tile_size": tile_size,
+            "height_range": index["height_range"],
+            "levels": [
+                {
+                    "level": level["level"],
+                    "shape": level["shape"],
+                    "tile_count": len(level["tiles"])
+                }
+                for level in index["levels"]
+            ]
         }
     except Exception as e:
         return {
@@ -707,103 +4911,307 @@ def export_to_unity(
         }
 
 
+# ============================================================================
+# バッチエクスポート
+# ============================================================================
+
+# バッチエクスポートのプロセス数
+BATCH_MAX_WORKERS = int(os.environ.get("JAXA_BATCH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# バッチエクスポートで実行できる出力形式
+_BATCH_TARGETS = ("heightmap", "blender", "unity", "vrchat", "lod")
+
+
+def _geometry_bounds(geometry: Dict[str, Any]) -> List[float]:
+    """GeoJSONジオメトリの[min_lon, min_lat, max_lon, max_lat]"""
+    lons: List[float] = []
+    lats: List[float] = []
+
+    def walk(coords: Any) -> None:
+        if coords and isinstance(coords[0], (int, float)):
+            lons.append(float(coords[0]))
+            lats.append(float(coords[1]))
+        else:
+            for child in coords:
+                walk(child)
+
+    if geometry.get("type") == "GeometryCollection":
+        for child in geometry.get("geometries", []):
+            child_bounds = _geometry_bounds(child)
+            lons.extend([child_bounds[0], child_bounds[2]])
+            lats.extend([child_bounds[1], child_bounds[3]])
+    else:
+        walk(geometry.get("coordinates", []))
+    if not lons:
+        raise ValueError("ジオメトリに座標がありません")
+    return [min(lons), min(lats), max(lons), max(lats)]
+
+
+def _batch_region_name(name: str) -> str:
+    """地域名を出力ディレクトリ名に使える文字列に変換"""
+    return re.sub(r'[\\/:*?"<>|\s]+', "_", str(name)).strip("._") or "region"
+
+
+def _batch_regions(
+    bboxes: Optional[List[List[float]]] = None,
+    geojson_path: Optional[str] = None,
+    keywords: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    バウンディングボックスのリストまたはGeoJSON（je.FeatureCollection）から
+    [{"name": ..., "bounds": [...]}, ...]を作成します。
+    """
+    regions = []
+    for bbox in bboxes or []:
+        if len(bbox) != 4:
+            raise ValueError(f"バウンディングボックスは[min_lon, min_lat, max_lon, max_lat]で指定してください: {bbox}")
+        regions.append({"bounds": [float(v) for v in bbox]})
+    
+    if geojson_path:
+        if not os.path.exists(geojson_path):
+            raise ValueError(f"ファイルが見つかりません: {geojson_path}")
+        features = je.FeatureCollection().read(geojson_path).select(keywords or [])
+        if isinstance(features, dict):
+            features = [features]
+        for feature in features:
+            properties = feature.get("properties") or {}
+            name = next(
+                (properties[k] for k in ("name", "NAME", "NAME_2", "NAME_1", "id") if properties.get(k)),
+                None
+            )
+            regions.append({"name": name, "bounds": _geometry_bounds(feature["geometry"])})
+    
+    # 名前のない地域には連番を付け、重複した名前は区別する
+    used = set()
+    for index, region in enumerate(regions):
+        name = _batch_region_name(region.get("name") or f"region_{index:03d}")
+        if name in used:
+            name = f"{name}_{index:03d}"
+        used.add(name)
+        region["name"] = name
+    return regions
+
+
+def _batch_worker_init() -> None:
+    """バッチ用ワーカープロセスの初期化（標準出力をMCPのstdio通信から切り離す）"""
+    sys.stdout = sys.stderr
+
+
+def _batch_worker(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    1地域分の取得→正規化→リサイズ→保存を実行します（ワーカープロセスで実行）。
+    
+    取得結果はディスクキャッシュ（_RASTER_CACHE）とメモリマップ保存（_RASTER_STORE）を
+    通じてプロセス間で共有されます。
+    """
+    start = time.perf_counter()
+    target = job["target"]
+    output_dir = job["output_dir"]
+    common = {
+        "collection": job["collection"],
+        "bounds": job["bounds"],
+        "resolution": job["resolution"],
+        "date_range": job.get("date_range")
+    }
+    options = job.get("options") or {}
+    try:
+        if target == "heightmap":
+            os.makedirs(output_dir, exist_ok=True)
+            result = generate_heightmap(
+                output_path=os.path.join(output_dir, "heightmap.png"), **common, **options
+            )
+        elif target == "blender":
+            result = export_to_blender(output_dir=output_dir, **common, **options)
+        elif target == "unity":
+            result = export_to_unity(output_dir=output_dir, **common, **options)
+        elif target == "vrchat":
+            result = create_vrchat_terrain(output_dir=output_dir, **common, **options)
+        elif target == "lod":
+            result = create_lod_pyramid(output_dir=output_dir, **common, **options)
+        else:
+            result = {"error": f"未対応の出力形式です: {target}"}
+    except Exception as e:
+        result = {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+    
+    entry = {
+        "name": job["name"],
+        "bounds": job["bounds"],
+        "output_dir": output_dir,
+        "status": "failed" if "error" in result else "succeeded",
+        "elapsed_seconds": round(time.perf_counter() - start, 3)
+    }
+    if "error" in result:
+        entry["error"] = result["error"]
+        entry["traceback"] = result.get("traceback")
+    else:
+        for key in ("raster_id", "files", "metadata", "output_path", "raw_path", "shape", "height_range", "index_path"):
+            if result.get(key) is not None:
+                entry[key] = result[key]
+    return entry
+
+
+def _run_batch_export(
+    collection: str,
+    regions: List[Dict[str, Any]],
+    target: str,
+    resolution: float,
+    date_range: Optional[List[str]],
+    output_dir: str,
+    max_workers: Optional[int] = None,
+    options: Optional[Dict[str, Any]] = None,
+    shared_height_range: bool = True
+) -> Dict[str, Any]:
+    """
+    地域ごとのジョブをプロセスプールで実行し、進捗を標準エラーに出力して、
+    結果を1つのマニフェスト（batch_manifest.json）にまとめます。
+    
+    shared_height_rangeがTrueの場合は、先に全地域で共通の高さ範囲を求め、
+    全タイルをその範囲で量子化します（隣接タイルの継ぎ目で高さがずれないように）。
+    
+    ワーカープロセスはspawnで起動するため、スクリプトから呼び出す場合は
+    `if __name__ == "__main__":`の中で呼び出してください。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    options = dict(options or {})
+    height_range = None
+    if shared_height_range:
+        if options.get("height_range") is None:
+            print(f"[batch] 共通の高さ範囲を計算中（{len(regions)}地域）", file=sys.stderr, flush=True)
+            resolutions = resolution
+            if target == "vrchat":
+                # create_vrchat_terrainが実際に取得する解像度で求め、同じラスターを再利用させる
+                resolutions = [
+                    _plan_vrchat_resolution(
+                        region["bounds"],
+                        resolution,
+                        options.get("max_polygons", VRCHAT_DEFAULT_MAX_POLYGONS),
+                        options.get("texture_size", VRCHAT_DEFAULT_TEXTURE_SIZE)
+                    )["ppu"]
+                    for region in regions
+                ]
+            height_range = _region_height_range(
+                collection, [region["bounds"] for region in regions], resolutions, date_range
+            )
+            options["height_range"] = [height_range["min"], height_range["max"]]
+        else:
+            height_range = {"min": options["height_range"][0], "max": options["height_range"][1]}
+    jobs = [
+        {
+            "name": region["name"],
+            "bounds": region["bounds"],
+            "target": target,
+            "collection": collection,
+            "resolution": resolution,
+            "date_range": date_range,
+            "output_dir": os.path.join(output_dir, region["name"]),
+            "options": options
+        }
+        for region in regions
+    ]
+    workers = max(1, min(max_workers or BATCH_MAX_WORKERS, len(jobs)))
+    
+    start = time.perf_counter()
+    entries: Dict[str, Dict[str, Any]] = {}
+
+    def report(entry: Dict[str, Any]) -> None:
+        entries[entry["name"]] = entry
+        print(
+            f"[batch] {len(entries)}/{len(jobs)} {entry['name']}: {entry['status']} "
+            f"({entry['elapsed_seconds']:.1f}s)",
+            file=sys.stderr,
+            flush=True
+        )
+    
+    if workers == 1:
+        for job in jobs:
+            report(_batch_worker(job))
+    else:
+        # MCPサーバーではスレッド・HTTP接続プール・ロックを持ったまま呼ばれるため、
+        # forkではなくspawnで新しいプロセスを起動する（forkすると取得中のロックを引き継いでデッドロックしうる）
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_batch_worker_init
+        ) as pool:
+            futures = {pool.submit(_batch_worker, job): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    # ワーカープロセス自体が異常終了した場合
+                    entry = {
+                        "name": job["name"],
+                        "bounds": job["bounds"],
+                        "output_dir": job["output_dir"],
+                        "status": "failed",
+                        "elapsed_seconds": 0.0,
+                        "error": str(e)
+                    }
+                report(entry)
+    
+    # マニフェストは入力順に並べる
+    ordered = [entries[job["name"]] for job in jobs]
+    succeeded = sum(1 for entry in ordered if entry["status"] == "succeeded")
+    manifest = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "collection": collection,
+        "target": target,
+        "resolution": resolution,
+        "date_range": date_range,
+        "options": options,
+        "height_range": height_range,
+        "summary": {
+            "total": len(ordered),
+            "succeeded": succeeded,
+            "failed": len(ordered) - succeeded,
+            "workers": workers,
+            "elapsed_seconds": round(time.perf_counter() - start, 3)
+        },
+        "regions": ordered
+    }
+    manifest_path = os.path.join(output_dir, "batch_manifest.json")
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    manifest["manifest_path"] = manifest_path
+    return manifest
+
+
 @mcp.tool()
-def create_vrchat_terrain(
+async def compute_height_range(
     collection: str,
-    bounds: List[float],
+    bboxes: List[List[float]],
     resolution: float = 20.0,
-    max_polygons: int = 100000,
-    texture_size: int = 2048,
     date_range: Optional[List[str]] = None,
-    output_dir: Optional[str] = None
+    refresh: bool = False
 ) -> Dict[str, Any]:
     """
-    VRChat向けに最適化された地形データを生成します。
+    複数タイルに共通の高さ範囲（最小値・最大値）を計算します。
+    
+    結果をgenerate_heightmap・export_to_unity・create_vrchat_terrainなどのheight_rangeに
+    指定すると、別々に出力したタイルでも同じ高さスケールになります。地域ごとに保存され、
+    同じタイル構成での2回目以降は再計算しません。
     
     Args:
         collection: コレクション名
-        bounds: バウンディングボックス
-        resolution: 解像度
-        max_polygons: 最大ポリゴン数（VRChat制約対応）
-        texture_size: テクスチャサイズ（VRChat推奨: 2048以下）
+        bboxes: タイルのバウンディングボックスのリスト
+        resolution: 解像度（各タイルのエクスポートと同じ値）
         date_range: 日付範囲
-        output_dir: 出力ディレクトリ
+        refresh: Trueの場合、保存済みの値を使わずに再計算
     
     Returns:
-        最適化された地形データの情報
+        高さ範囲（height_range: [最小値, 最大値]）
     """
     try:
-        if not output_dir:
-            output_dir = str(TEMP_DIR / "vrchat_terrain")
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 高度データを取得
-        image_collection = je.ImageCollection(collection)
-        if date_range:
-            image_collection = image_collection.filter_date(date_range)
-        image_collection = image_collection.filter_resolution(resolution)
-        image_collection = image_collection.filter_bounds(bbox=bounds)
-        image_collection = image_collection.select("DSM")
-        
-        result = image_collection.get_images()
-        raster = result.raster
-        height_data = np.array(raster.img).astype(np.float32)
-        
-        # ポリゴン数制約に合わせて解像度を調整
-        current_polygons = height_data.shape[0] * height_data.shape[1] * 2
-        if current_polygons > max_polygons:
-            scale_factor = np.sqrt(max_polygons / current_polygons)
-            new_height = int(height_data.shape[0] * scale_factor)
-            new_width = int(height_data.shape[1] * scale_factor)
-            height_data = ndimage.zoom(height_data, (new_height / height_data.shape[0], new_width / height_data.shape[1]), order=1)
-        
-        # テクスチャサイズに合わせてリサイズ
-        height_min, height_max = np.nanmin(height_data), np.nanmax(height_data)
-        height_normalized = (height_data - height_min) / (height_max - height_min)
-        height_uint16 = (height_normalized * 65535).astype(np.uint16)
-        
-        # テクスチャをリサイズ
-        texture_image = Image.fromarray(height_uint16, mode='I;16')
-        texture_image = texture_image.resize((texture_size, texture_size), Image.Resampling.LANCZOS)
-        
-        # ファイル保存
-        heightmap_path = os.path.join(output_dir, "vrchat_heightmap.png")
-        texture_path = os.path.join(output_dir, "vrchat_texture.png")
-        
-        texture_image.save(heightmap_path)
-        texture_image.save(texture_path)
-        
-        # メタデータ
-        metadata = {
-            "width": int(height_data.shape[1]),
-            "height": int(height_data.shape[0]),
-            "texture_size": texture_size,
-            "estimated_polygons": int(height_data.shape[0] * height_data.shape[1] * 2),
-            "height_range": {
-                "min": float(height_min),
-                "max": float(height_max)
-            },
-            "bounds": bounds,
-            "optimization": {
-                "max_polygons": max_polygons,
-                "texture_size": texture_size
-            }
-        }
-        
-        metadata_path = os.path.join(output_dir, "vrchat_metadata.json")
-        with open(metadata_path, 'w', encoding='utf-8') as f:
-            json.dump(metadata, f, indent=2, ensure_ascii=False)
-        
+        result = await _run_blocking(_region_height_range, collection, bboxes, resolution, date_range, "DSM", refresh)
         return {
             "success": True,
-            "output_dir": output_dir,
-            "files": {
-                "heightmap": heightmap_path,
-                "texture": texture_path,
-                "metadata": metadata_path
-            },
-            "metadata": metadata,
-            "note": "VRChatのワールドサイズ制限（100MB）を考慮して最適化されています。BlenderまたはUnityでインポートして使用してください。"
+            "height_range": [result["min"], result["max"]],
+            "tile_count": result["tile_count"],
+            "cached": result["cached"]
         }
     except Exception as e:
         return {
@@ -813,73 +5221,55 @@ def create_vrchat_terrain(
 
 
 @mcp.tool()
-def export_texture_maps(
+async def export_batch(
     collection: str,
-    bounds: List[float],
+    bboxes: Optional[List[List[float]]] = None,
+    geojson_path: Optional[str] = None,
+    keywords: Optional[List[str]] = None,
+    target: str = "vrchat",
     resolution: float = 20.0,
     date_range: Optional[List[str]] = None,
-    output_dir: Optional[str] = None
+    output_dir: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    options: Optional[Dict[str, Any]] = None,
+    shared_height_range: bool = True
 ) -> Dict[str, Any]:
     """
-    衛星画像をテクスチャマップとしてエクスポートします（Diffuse, Normal等）。
+    複数の地域をまとめてエクスポートします（大きなワールドのタイル生成用）。
     
     Args:
         collection: コレクション名
-        bounds: バウンディングボックス
+        bboxes: バウンディングボックスのリスト [[min_lon, min_lat, max_lon, max_lat], ...]
+        geojson_path: 地域を定義するGeoJSON（FeatureCollection）ファイルのパス
+        keywords: GeoJSONのフィーチャーを絞り込むキーワード（select_featuresと同じ）
+        target: 出力形式（"heightmap", "blender", "unity", "vrchat", "lod"）
         resolution: 解像度
         date_range: 日付範囲
-        output_dir: 出力ディレクトリ
+        output_dir: 出力ディレクトリ（地域ごとにサブディレクトリを作成）
+        max_workers: 並列プロセス数（デフォルト: JAXA_BATCH_WORKERS）
+        options: 各エクスポートツールに渡す追加引数（例: {"max_polygons": 50000}）
+        shared_height_range: Trueの場合、全地域で共通の高さ範囲で量子化（タイル間の継ぎ目を防ぐ）
     
     Returns:
-        エクスポートされたテクスチャマップの情報
+        全地域の結果をまとめたマニフェスト
     """
     try:
+        if target not in _BATCH_TARGETS:
+            return {"error": f"targetは{', '.join(_BATCH_TARGETS)}のいずれかを指定してください: {target}"}
+        regions = await _run_blocking(_batch_regions, bboxes, geojson_path, keywords)
+        if not regions:
+            return {"error": "bboxesまたはgeojson_pathで地域を指定してください"}
         if not output_dir:
-            output_dir = str(TEMP_DIR / "texture_maps")
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 衛星画像を取得（複数のバンドがある場合は最初のバンドを使用）
-        image_collection = je.ImageCollection(collection)
-        if date_range:
-            image_collection = image_collection.filter_date(date_range)
-        image_collection = image_collection.filter_resolution(resolution)
-        image_collection = image_collection.filter_bounds(bbox=bounds)
-        
-        # 利用可能なバンドを取得
-        result = image_collection.get_images()
-        raster = result.raster
-        image_data = np.array(raster.img)
-        
-        # Diffuseマップ（基本テクスチャ）
-        if len(image_data.shape) == 2:
-            # グレースケールの場合、RGBに変換
-            diffuse_data = np.stack([image_data, image_data, image_data], axis=-1)
-        else:
-            diffuse_data = image_data
-        
-        # 正規化
-        diffuse_normalized = (diffuse_data - np.nanmin(diffuse_data)) / (np.nanmax(diffuse_data) - np.nanmin(diffuse_data))
-        diffuse_uint8 = (diffuse_normalized * 255).astype(np.uint8)
-        
-        diffuse_image = Image.fromarray(diffuse_uint8, mode='RGB')
-        diffuse_path = os.path.join(output_dir, "diffuse.png")
-        diffuse_image.save(diffuse_path)
-        
-        # Normalマップ（簡易版：高度データから生成）
-        height_data = image_data if len(image_data.shape) == 2 else np.mean(image_data, axis=2)
-        normal_map = _generate_normal_map(height_data)
-        normal_path = os.path.join(output_dir, "normal.png")
-        normal_image = Image.fromarray(normal_map, mode='RGB')
-        normal_image.save(normal_path)
+            output_dir = str(TEMP_DIR / "batch_export")
         
+        manifest = await _run_blocking(
+            _run_batch_export,
+            collection, regions, target, resolution, date_range, output_dir, max_workers, options,
+            shared_height_range
+        )
         return {
-            "success": True,
-            "output_dir": output_dir,
-            "files": {
-                "diffuse": diffuse_path,
-                "normal": normal_path
-            },
-            "note": "Normalマップは高度データから簡易的に生成されています。より高品質なNormalマップが必要な場合は、専用のツールを使用してください。"
+            "success": manifest["summary"]["failed"] == 0,
+            **manifest
         }
     except Exception as e:
         return {
@@ -888,31 +5278,52 @@ def export_texture_maps(
         }
 
 
-def _generate_normal_map(height_data: np.ndarray) -> np.ndarray:
-    """高度データからNormalマップを生成するヘルパー関数"""
-    # Sobelフィルタで勾配を計算
-    sobel_x = ndimage.sobel(height_data, axis=1)
-    sobel_y = ndimage.sobel(height_data, axis=0)
-    
-    # Normalベクトルを計算
-    normal_x = -sobel_x
-    normal_y = -sobel_y
-    normal_z = np.ones_like(height_data)
-    
-    # 正規化
-    magnitude = np.sqrt(normal_x**2 + normal_y**2 + normal_z**2)
-    normal_x /= magnitude
-    normal_y /= magnitude
-    normal_z /= magnitude
+# ============================================================================
+# キャッシュ管理ツール
+# ============================================================================
+
+@mcp.tool()
+def get_raster_cache_stats() -> Dict[str, Any]:
+    """
+    ラスター取得キャッシュの統計情報を返します。
     
-    # RGB形式に変換（0-255の範囲）
-    normal_map = np.stack([
-        ((normal_x + 1) * 127.5).astype(np.uint8),
-        ((normal_y + 1) * 127.5).astype(np.uint8),
-        ((normal_z + 1) * 127.5).astype(np.uint8)
-    ], axis=-1)
+    Returns:
+        エントリ数、合計サイズ、ヒット/ミス数、削除数、ヒット率、
+        同時実行の重複により省略した取得数（single_flight.deduplicated）、
+        HTTPリクエスト数・再試行されたリクエスト数・レート制限による待ち時間（http）
+    """
+    try:
+        stats = _RASTER_CACHE.stats()
+        stats["single_flight"] = _FETCH_SINGLE_FLIGHT.stats()
+        stats["raster_store"] = _RASTER_STORE.stats()
+        stats["http"] = _http_stats()
+        return stats
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+
+
+@mcp.tool()
+def clear_raster_cache() -> Dict[str, Any]:
+    """
+    ラスター取得キャッシュを全て削除します。
     
-    return normal_map
+    Returns:
+        削除したエントリ数
+    """
+    try:
+        removed = _RASTER_CACHE.clear()
+        return {
+            "success": True,
+            "removed_entries": removed
+        }
+    except Exception as e:
+        return {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
 
 
 # ============================================================================
@@ -23,11 +23,15 @@ try:
     sys.path.insert(0, str(current_dir))
     
     # MCPサーバーの関数を直接インポート
+    # Streamlitは操作のたびにスクリプトを再実行するため、読み込み済みのモジュールを再利用する
     import importlib.util
-    mcp_server_path = current_dir / "mcp_server.py"
-    spec = importlib.util.spec_from_file_location("mcp_server", mcp_server_path)
-    mcp_module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mcp_module)
+    mcp_module = sys.modules.get("mcp_server")
+    if mcp_module is None:
+        mcp_server_path = current_dir / "mcp_server.py"
+        spec = importlib.util.spec_from_file_location("mcp_server", mcp_server_path)
+        mcp_module = importlib.util.module_from_spec(spec)
+        sys.modules["mcp_server"] = mcp_module
+        spec.loader.exec_module(mcp_module)
     
     # 関数を取得（@mcp.tool()デコレータでラップされた関数を直接呼び出し可能）
     search_collections_id = mcp_module.search_collections_id
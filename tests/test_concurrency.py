@@ -0,0 +1,111 @@
+"""
+ツール呼び出しの並行実行のテスト
+
+_fetch_imagesを一定時間スリープする合成データ取得に置き換え、calc_spatial_statsを
+同時に呼び出して、取得がスレッドプールで並行に実行されること（イベントループが
+ブロックされないこと）を確認します（benchmarks.py concurrencyと同じ方法）。
+"""
+
+import asyncio
+import threading
+import time
+import types
+
+import numpy as np
+
+import mcp_server
+
+LATENCY = 0.2
+HEARTBEAT_INTERVAL = 0.01
+
+
+def install_sleeping_fetch(monkeypatch) -> list:
+    """_fetch_imagesをLATENCY秒スリープする合成データ取得に置き換え、各取得の(開始, 終了)を記録するリストを返す"""
+    spans = []
+    lock = threading.Lock()
+
+    def fetch(collection, band=None, dlim=None, ppu=None, bbox=None, geoj=None, use_cache=True):
+        start = time.perf_counter()
+        time.sleep(LATENCY)
+        with lock:
+            spans.append((start, time.perf_counter()))
+        bbox = bbox or [138.5, 35.2, 139.0, 35.5]
+        rows = np.linspace(0.0, 1000.0, 64, dtype=np.float32)
+        raster = types.SimpleNamespace(
+            # raster.imgの形状は[日付, 緯度, 経度, チャンネル]
+            img=np.add.outer(rows, rows)[np.newaxis, :, :, np.newaxis],
+            latlim=[[bbox[1], bbox[3]]],
+            lonlim=[[bbox[0], bbox[2]]]
+        )
+        # je.ImageProcessが参照する属性を揃える
+        return types.SimpleNamespace(
+            raster=raster,
+            cinfo=None,
+            proj_params=None,
+            _settings=None,
+            stac_collection=types.SimpleNamespace(query=collection),
+            stac_band=types.SimpleNamespace(query=band),
+            stac_date=types.SimpleNamespace(id=list(dlim or []))
+        )
+
+    monkeypatch.setattr(mcp_server, "_fetch_images", fetch)
+    return spans
+
+
+def peak_overlap(spans: list) -> int:
+    """同時に実行されていた取得の最大数"""
+    events = sorted([(start, 1) for start, _ in spans] + [(end, -1) for _, end in spans])
+    running = peak = 0
+    for _, delta in events:
+        running += delta
+        peak = max(peak, running)
+    return peak
+
+
+def run_concurrent_calls(calls: int) -> float:
+    """calc_spatial_statsをcalls件同時に呼び出し、その間のイベントループの最大の遅れ（秒）を返す"""
+
+    async def one_call(i: int) -> None:
+        bbox = [138.0 + i * 0.1, 35.0, 138.1 + i * 0.1, 35.1]
+        result = await mcp_server.calc_spatial_stats("synthetic", bounds=bbox)
+        assert "error" not in result, result.get("traceback")
+
+    async def heartbeat(done: asyncio.Event) -> float:
+        max_lag = 0.0
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            max_lag = max(max_lag, time.perf_counter() - start - HEARTBEAT_INTERVAL)
+        return max_lag
+
+    async def run() -> float:
+        done = asyncio.Event()
+        monitor = asyncio.create_task(heartbeat(done))
+        try:
+            await asyncio.gather(*(one_call(i) for i in range(calls)))
+        finally:
+            done.set()
+        return await monitor
+
+    return asyncio.run(run())
+
+
+def test_concurrent_tool_calls_overlap(monkeypatch):
+    spans = install_sleeping_fetch(monkeypatch)
+    calls = mcp_server.MCP_EXECUTOR_WORKERS * 2
+
+    max_lag = run_concurrent_calls(calls)
+
+    assert len(spans) == calls
+    assert peak_overlap(spans) == min(calls, mcp_server.MCP_EXECUTOR_WORKERS)
+    assert max_lag < LATENCY / 2
+
+
+def test_fewer_calls_than_workers_all_overlap(monkeypatch):
+    spans = install_sleeping_fetch(monkeypatch)
+    calls = max(1, mcp_server.MCP_EXECUTOR_WORKERS - 1)
+
+    max_lag = run_concurrent_calls(calls)
+
+    assert peak_overlap(spans) == min(calls, mcp_server.MCP_EXECUTOR_WORKERS)
+    assert max_lag < LATENCY / 2
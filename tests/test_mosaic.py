@@ -0,0 +1,69 @@
+"""
+並列タイル取得（_fetch_mosaic）のテスト
+
+部分範囲の取得結果が要求と異なる形状・位置で返された場合でも、返された範囲
+（raster.latlim/lonlim）に合わせて配置され、モザイクの継ぎ目がずれないことを確認します。
+"""
+
+import types
+
+import numpy as np
+
+import mcp_server
+
+PPU = 40.0
+BOUNDS = [138.0, 35.0, 138.5, 35.5]
+
+
+def heights_at(rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    """全体の格子（BOUNDSの北西の角が原点、ピクセル単位）の位置ごとに異なる合成の高さ"""
+    return (rows * 1000.0 + cols).astype(np.float32)
+
+
+def install_shifted_fetch(monkeypatch, extra_rows: int, extra_cols: int) -> None:
+    """要求より北にextra_rows行・西にextra_cols列広い範囲を返す_fetch_imagesに置き換える"""
+
+    def fetch(collection, band=None, dlim=None, ppu=None, bbox=None, geoj=None, use_cache=True):
+        north = bbox[3] + extra_rows / ppu
+        west = bbox[0] - extra_cols / ppu
+        row0 = int(round((BOUNDS[3] - north) * ppu))
+        col0 = int(round((west - BOUNDS[0]) * ppu))
+        n_rows = int(round((north - bbox[1]) * ppu))
+        n_cols = int(round((bbox[2] - west) * ppu))
+        grid_rows, grid_cols = np.mgrid[row0:row0 + n_rows, col0:col0 + n_cols]
+        raster = types.SimpleNamespace(
+            img=heights_at(grid_rows, grid_cols)[np.newaxis, :, :, np.newaxis],
+            latlim=[bbox[1], north],
+            lonlim=[west, bbox[2]]
+        )
+        return types.SimpleNamespace(raster=raster)
+
+    monkeypatch.setattr(mcp_server, "_fetch_images", fetch)
+
+
+def expected_mosaic() -> np.ndarray:
+    rows, cols = mcp_server._grid_shape(BOUNDS, PPU)
+    return heights_at(*np.mgrid[0:rows, 0:cols])
+
+
+def test_mosaic_matches_when_tiles_are_exact(monkeypatch):
+    install_shifted_fetch(monkeypatch, 0, 0)
+    mosaic = mcp_server._fetch_mosaic("synthetic", "DSM", None, PPU, BOUNDS, max_workers=2, tile_degrees=0.2)
+    assert np.array_equal(mosaic, expected_mosaic())
+
+
+def test_mosaic_places_shifted_tiles_by_returned_limits(monkeypatch, capsys):
+    install_shifted_fetch(monkeypatch, 3, 2)
+    mosaic = mcp_server._fetch_mosaic("synthetic", "DSM", None, PPU, BOUNDS, max_workers=2, tile_degrees=0.2)
+
+    assert np.array_equal(mosaic, expected_mosaic())
+    # 1ピクセルより大きいずれは警告される
+    assert "[fetch]" in capsys.readouterr().err
+
+
+def test_one_pixel_mismatch_is_not_reported(monkeypatch, capsys):
+    install_shifted_fetch(monkeypatch, 1, 0)
+    mosaic = mcp_server._fetch_mosaic("synthetic", "DSM", None, PPU, BOUNDS, max_workers=2, tile_degrees=0.2)
+
+    assert np.array_equal(mosaic, expected_mosaic())
+    assert "[fetch]" not in capsys.readouterr().err
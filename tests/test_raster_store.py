@@ -0,0 +1,60 @@
+"""
+取得済みラスター（_get_fetched_raster）のテスト
+
+欠損値の埋め方が異なる取得結果が、プロセス内・メモリマップ保存のどちらでも
+取り違えられないことを確認します。
+"""
+
+import types
+from collections import OrderedDict
+
+import numpy as np
+
+import mcp_server
+
+BOUNDS = [138.5, 35.2, 138.6, 35.3]
+
+
+def install_fetch_with_voids(monkeypatch, tmp_path) -> None:
+    """欠損値を含む合成データを返す_fetch_imagesと、空の保存先に置き換える"""
+    img = np.linspace(0.0, 100.0, 32 * 32, dtype=np.float32).reshape(32, 32)
+    img[8:16, 8:16] = np.nan
+
+    def fetch(collection, band=None, dlim=None, ppu=None, bbox=None, geoj=None, use_cache=True):
+        raster = types.SimpleNamespace(
+            img=img[np.newaxis, :, :, np.newaxis].copy(),
+            latlim=[[bbox[1], bbox[3]]],
+            lonlim=[[bbox[0], bbox[2]]]
+        )
+        return types.SimpleNamespace(raster=raster)
+
+    monkeypatch.setattr(mcp_server, "_fetch_images", fetch)
+    monkeypatch.setattr(mcp_server, "_RASTER_STORE", mcp_server._RasterStore(tmp_path, 1 << 30))
+    monkeypatch.setattr(mcp_server, "_FETCHED_RASTERS", OrderedDict())
+
+
+def test_fill_voids_flag_is_part_of_raster_id(monkeypatch, tmp_path):
+    install_fetch_with_voids(monkeypatch, tmp_path)
+    monkeypatch.setattr(mcp_server, "VOID_FILL_MODE", "inpaint")
+
+    filled = mcp_server._get_fetched_raster("synthetic", BOUNDS, 320.0)
+    unfilled = mcp_server._get_fetched_raster("synthetic", BOUNDS, 320.0, fill_voids=False)
+
+    assert filled.raster_id != unfilled.raster_id
+    assert not np.isnan(filled.data).any()
+    assert np.isnan(unfilled.data).any()
+
+
+def test_void_fill_mode_is_part_of_raster_id(monkeypatch, tmp_path):
+    install_fetch_with_voids(monkeypatch, tmp_path)
+    monkeypatch.setattr(mcp_server, "VOID_FILL_MODE", "none")
+    unfilled = mcp_server._get_fetched_raster("synthetic", BOUNDS, 320.0)
+
+    # 別のプロセス（プロセス内の記録なし）が、欠損値を埋める設定で同じ範囲を取得する場合
+    monkeypatch.setattr(mcp_server, "_FETCHED_RASTERS", OrderedDict())
+    monkeypatch.setattr(mcp_server, "VOID_FILL_MODE", "inpaint")
+    filled = mcp_server._get_fetched_raster("synthetic", BOUNDS, 320.0)
+
+    assert filled.raster_id != unfilled.raster_id
+    assert np.isnan(unfilled.data).any()
+    assert not np.isnan(filled.data).any()
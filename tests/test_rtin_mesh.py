@@ -0,0 +1,73 @@
+"""
+適応メッシュ（RTIN）のテスト
+
+257×257の合成地形で_build_rtin_meshを実行し、全格子点でメッシュと高さの差を直接計算して、
+三角形数の上限と誤差のしきい値（error_threshold）が守られていることを確認します。
+"""
+
+import numpy as np
+import pytest
+
+import mcp_server
+
+BOUNDS = [138.5, 35.2, 138.6, 35.3]
+
+
+def synthetic_heights(size: int = 257, seed: int = 0) -> np.ndarray:
+    """なだらかな起伏・鋭い尾根・ノイズを重ねた合成地形（メートル）"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / (size - 1)
+    heights = 300.0 * np.sin(3.0 * x) * np.cos(2.0 * y)
+    heights += 200.0 * np.clip(1.0 - np.abs(x - y) * 12.0, 0.0, None)
+    heights += rng.normal(0.0, 2.0, heights.shape)
+    return heights.astype(np.float32)
+
+
+def max_vertical_deviation(mesh: dict, grid: np.ndarray) -> float:
+    """全格子点で、その点を含む三角形の平面の高さと格子の高さの差の最大値（メートル）"""
+    n = mesh["grid_size"]
+    cols = np.rint(mesh["uvs"][:, 0] * (n - 1)).astype(np.int64)
+    rows = np.rint((1.0 - mesh["uvs"][:, 1]) * (n - 1)).astype(np.int64)
+    heights = mesh["positions"][:, 1].astype(np.float64)
+    covered = np.zeros((n, n), dtype=bool)
+    deviation = 0.0
+    for face in mesh["faces"]:
+        r, c, h = rows[face], cols[face], heights[face]
+        gr, gc = np.mgrid[r.min():r.max() + 1, c.min():c.max() + 1]
+        # 重心座標で三角形内（辺上を含む）の格子点を選び、平面の高さを補間
+        det = (r[1] - r[2]) * (c[0] - c[2]) + (c[2] - c[1]) * (r[0] - r[2])
+        w0 = ((r[1] - r[2]) * (gc - c[2]) + (c[2] - c[1]) * (gr - r[2])) / det
+        w1 = ((r[2] - r[0]) * (gc - c[2]) + (c[0] - c[2]) * (gr - r[2])) / det
+        w2 = 1.0 - w0 - w1
+        inside = (w0 >= -1e-9) & (w1 >= -1e-9) & (w2 >= -1e-9)
+        plane = w0 * h[0] + w1 * h[1] + w2 * h[2]
+        diff = np.abs(plane - grid[gr, gc])[inside]
+        deviation = max(deviation, float(diff.max()))
+        covered[gr[inside], gc[inside]] = True
+    assert covered.all(), "メッシュが覆っていない格子点があります"
+    return deviation
+
+
+@pytest.mark.parametrize("max_triangles", [500, 2000, 8000])
+def test_rtin_respects_triangle_budget_and_error_bound(max_triangles):
+    heights = synthetic_heights()
+    mesh = mcp_server._build_rtin_mesh(heights, BOUNDS, max_triangles)
+    grid = mcp_server._rtin_grid(heights).astype(np.float64)
+
+    assert mesh["triangle_count"] <= max_triangles
+    assert max_vertical_deviation(mesh, grid) <= mesh["error_threshold"] + 1e-3
+    assert "max_error_met" not in mesh
+
+
+@pytest.mark.parametrize("max_triangles, max_error, met", [(100000, 5.0, True), (200, 1.0, False)])
+def test_rtin_reports_max_error_met(max_triangles, max_error, met):
+    heights = synthetic_heights()
+    mesh = mcp_server._build_rtin_mesh(heights, BOUNDS, max_triangles, max_error=max_error)
+    grid = mcp_server._rtin_grid(heights).astype(np.float64)
+
+    assert mesh["max_error_met"] is met
+    assert mesh["triangle_count"] <= max_triangles
+    deviation = max_vertical_deviation(mesh, grid)
+    assert deviation <= mesh["error_threshold"] + 1e-3
+    if met:
+        assert deviation <= max_error + 1e-3
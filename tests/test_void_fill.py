@@ -0,0 +1,84 @@
+"""
+欠損値の補間（_fill_voids・_fill_voids_banded）のテスト
+
+タイルモードで帯ごとに埋めた結果が、全体を一度に埋めた結果とほぼ同じになり、
+帯の境界で途切れないことを確認します。
+"""
+
+import numpy as np
+import pytest
+
+import mcp_server
+
+ROWS, COLS = 512, 400
+BAND_ROWS = 64
+
+
+def synthetic_field(seed: int) -> tuple:
+    """起伏のある合成地形と、大小の円形の欠損（半径3〜60ピクセル）を入れたデータ"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:ROWS, 0:COLS]
+    truth = (500.0 + 80.0 * np.sin(y / 37.0) + 60.0 * np.cos(x / 53.0) + 20.0 * np.sin((x + y) / 11.0)).astype(np.float32)
+    data = truth.copy()
+    for _ in range(25):
+        cy, cx, r = rng.integers(0, ROWS), rng.integers(0, COLS), rng.integers(3, 60)
+        data[(y - cy) ** 2 + (x - cx) ** 2 < r * r] = np.nan
+    return truth, data
+
+
+def fill_banded(data: np.ndarray, halo=None) -> np.ndarray:
+    """BAND_ROWS行ずつの帯に分けて_fill_voids_bandedで埋める"""
+    filled = np.empty_like(data)
+    bands = (
+        (row_start, min(row_start + BAND_ROWS, len(data)), data[row_start:row_start + BAND_ROWS])
+        for row_start in range(0, len(data), BAND_ROWS)
+    )
+    for row_start, row_end, band in mcp_server._fill_voids_banded(bands, halo=halo):
+        filled[row_start:row_end] = band
+    return filled
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_banded_fill_matches_whole_array_fill(monkeypatch, seed):
+    monkeypatch.setattr(mcp_server, "VOID_FILL_MODE", "inpaint")
+    _, data = synthetic_field(seed)
+    whole = mcp_server._fill_voids(data)[0]
+
+    banded = fill_banded(data)
+
+    assert not np.isnan(banded).any()
+    # 既定ののりしろ（128行）では、全体で埋めた場合との差は0.5m以内
+    assert np.abs(banded - whole).max() < 0.5
+    # 有効な画素の値は変わらない
+    valid = ~np.isnan(data)
+    assert np.array_equal(banded[valid], data[valid])
+
+
+def test_banded_fill_is_continuous_across_band_edges(monkeypatch):
+    monkeypatch.setattr(mcp_server, "VOID_FILL_MODE", "inpaint")
+    _, data = synthetic_field(1)
+    whole = mcp_server._fill_voids(data)[0]
+
+    banded = fill_banded(data)
+
+    # 帯の境界をまたぐ差は、全体で埋めた場合の同じ位置の差とほぼ同じ
+    for edge in range(BAND_ROWS, ROWS, BAND_ROWS):
+        jump = np.abs(banded[edge] - banded[edge - 1])
+        whole_jump = np.abs(whole[edge] - whole[edge - 1])
+        assert np.all(jump <= whole_jump + 0.5)
+
+
+def test_larger_halo_converges_to_whole_array_fill(monkeypatch):
+    monkeypatch.setattr(mcp_server, "VOID_FILL_MODE", "inpaint")
+    _, data = synthetic_field(0)
+    whole = mcp_server._fill_voids(data)[0]
+
+    assert np.abs(fill_banded(data, halo=256) - whole).max() < 0.05
+
+
+def test_banded_fill_leaves_min_and_none_modes_to_quantization(monkeypatch):
+    _, data = synthetic_field(0)
+    for mode in ("min", "none"):
+        monkeypatch.setattr(mcp_server, "VOID_FILL_MODE", mode)
+        banded = fill_banded(data)
+        assert np.array_equal(np.isnan(banded), np.isnan(data))